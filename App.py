@@ -1,22 +1,61 @@
 # --- 1. استيراد المكتبات ---
 import os
-import pyodbc
+import logging
 import random
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+import hmac
+import shutil
+import time
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context, send_from_directory, g, has_request_context
 from dotenv import load_dotenv
 from functools import wraps
-import pandas as pd
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
 import datetime
+import uuid
+import click
+from analytics import (AnalyticsCache, employee_dimensions, employee_history, load_month_frame, month_analytics,
+                       month_deltas, recent_months)
+from archive import PayrollArchive
+from db_pool import ConnectionPool
+from identity import IdentityCache, lookup_identity
+from jobs import JobQueue, JobStore
+from listings import employee_page, filters_from, page_size_from, payslip_page
+from metrics import Metrics, PhaseTimer
+from normalize import normalize_otp, normalize_phone
+from otp_dispatch import OTPDispatcher, RateLimiter, parse_rate_limit, sender_from_spec
+from payroll_export import EXPORT_FORMATS, export_chunks, export_filename, month_rows
+from payroll_summary import empty_summary, month_stamp, month_summary, summary_dimensions, summary_months
+from payslip_cache import LRUCache, PayslipCache
+from payslip_layout import compiled_layout
+from payslip_pdf import generate_month_pdfs
+from payslip_queries import employee_months, employee_payslip
+from schema_cache import SchemaCache
+from snapshot import PayslipSnapshots
+from storage import backend_from_spec
+from session_store import StoreSessionInterface, store_from_spec
+from upload_pipeline import run_upload, upload_message
 #import firebase_admin
 #from firebase_admin import credentials, auth
 
 
 # --- 2. تهيئة التطبيق والإعدادات ---
 load_dotenv()
-app = Flask(__name__)
+# السجلات (تقارير الرفع، الأخطاء، ...) عبر logging إلى stderr فيجمعها gunicorn
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"),
+                    format="%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s")
+# INSTANCE_PATH: مجلد ملفات الحالة المحلية (الجلسات، ملفات الإصدار، اللقطات، الأرشيف، ...)
+# بدلاً من instance/ بجوار الكود، مثلاً لاختبارات الأداء أو لقرص دائم منفصل
+INSTANCE_PATH = os.getenv("INSTANCE_PATH")
+app = Flask(__name__, instance_path=os.path.abspath(INSTANCE_PATH) if INSTANCE_PATH else None)
 app.secret_key = os.getenv("SECRET_KEY")
 
+# الجلسات ورموز التحقق على الخادم في مخزن مشترك بين العمال، والكوكي يحمل رقم الجلسة فقط
+# (SESSION_STORE: sqlite أو sqlite:/dev/shm/sessions.db أو memory)
+kv_store = store_from_spec(os.getenv("SESSION_STORE"), os.path.join(app.instance_path, "sessions.db"))
+app.session_interface = StoreSessionInterface(kv_store, ttl=int(os.getenv("SESSION_TTL", str(8 * 3600))))
+OTP_TTL = int(os.getenv("OTP_TTL", "300"))  # صلاحية رمز التحقق بالثواني
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))  # بعدها يجب طلب رمز جديد
+
 
 #cred = credentials.Certificate("serviceAccountKey.json")
 #firebase_admin.initialize_app(cred)
@@ -32,18 +71,119 @@ connection_string = (
     f"SERVER={DB_SERVER};DATABASE={DB_NAME};UID={DB_USER};PWD={DB_PASSWORD};"
 )
 
+# قاعدة البيانات: SQL Server (الافتراضي) أو SQLite محلي للتطوير واختبارات الأداء
+# DB_BACKEND=sqlite أو DB_BACKEND=sqlite:/path/payroll.db
+backend = backend_from_spec(os.getenv("DB_BACKEND"), connection_string,
+                            os.path.join(app.instance_path, "payroll.db"))
+
+# قياسات الأداء لكل عامل تُجمع في ملف مشترك ويعرضها /metrics بصيغة Prometheus
+metrics = Metrics(os.getenv("METRICS_DB_PATH", os.path.join(app.instance_path, "metrics.db")),
+                  flush_interval=int(os.getenv("METRICS_FLUSH_INTERVAL", "5")),
+                  retention=int(os.getenv("METRICS_RETENTION_DAYS", "7")) * 86400)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # إن وُجد يُقبل من أداة الجمع بدلاً من جلسة المدير
+
+# تجمع اتصالات لكل عامل (worker) بدلاً من اتصال جديد مع كل طلب
+db_pool = ConnectionPool(
+    lambda: metrics.timed('db_connect_seconds', backend.connect),
+    min_size=int(os.getenv("DB_POOL_MIN", "1")),
+    max_size=int(os.getenv("DB_POOL_MAX", "5")),
+    idle_timeout=int(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+    checkout_timeout=int(os.getenv("DB_POOL_TIMEOUT", "10")),
+)
+
+# الملفات الأكبر من هذا الحجم تُقرأ على دفعات بدلاً من تحميلها كاملة في الذاكرة
+UPLOAD_STREAM_THRESHOLD = int(os.getenv("UPLOAD_STREAM_THRESHOLD_MB", "5")) * 1024 * 1024
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "5000"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(app.instance_path, "uploads"))
+# ملفات المعاينة التي لم يؤكد تطبيقها تحذف بعد هذه المدة (ساعات)
+UPLOAD_PREVIEW_TTL = int(os.getenv("UPLOAD_PREVIEW_TTL_HOURS", "24")) * 3600
+
+# أعمدة جدولي Employees و Payslips محفوظة في الذاكرة وتُبطل عند إضافة أعمدة جديدة
+schema_cache = SchemaCache(version_path=os.path.join(app.instance_path, "schema.version"))
+
+# قسائم الموظفين بعد معالجتها: LRU داخل كل عامل + ملف SQLite مشترك اختياري، وتُبطل عند رفع الشهر
+payslip_cache = PayslipCache(
+    max_entries=int(os.getenv("PAYSLIP_CACHE_SIZE", "10000")),
+    ttl=int(os.getenv("PAYSLIP_CACHE_TTL", "3600")),
+    version_dir=os.path.join(app.instance_path, "payslip_cache"),
+    shared_path=os.getenv("PAYSLIP_CACHE_DB") or None,
+)
+
+# رموز التحقق تُرسل في الخلفية عبر مزود قابل للتغيير (OTP_SENDER: console أو file:path أو module:Class)
+otp_dispatcher = OTPDispatcher(
+    sender_from_spec(os.getenv("OTP_SENDER", "console")),
+    workers=int(os.getenv("OTP_WORKERS", "2")),
+    max_queue=int(os.getenv("OTP_QUEUE_SIZE", "1000")),
+)
+# عدد طلبات الرمز المسموح لكل رقم موظف ولكل رقم هاتف ("5/300": خمسة كل 5 دقائق)
+otp_rate_limiter = RateLimiter(*parse_rate_limit(os.getenv("OTP_RATE_LIMIT", "5/300")), store=kv_store)
+
+# نتيجة التحقق من (رقم الموظف، الهاتف) مع الصلاحية، وتُبطل عند رفع شيت يعدل بيانات الموظفين
+identity_cache = IdentityCache(
+    max_entries=int(os.getenv("IDENTITY_CACHE_SIZE", "2000")),
+    ttl=int(os.getenv("IDENTITY_CACHE_TTL", "600")),
+    version_path=os.path.join(app.instance_path, "identity.version"),
+)
+
+# الأشهر المغلقة تُنقل من جدول Payslips إلى ملفات Parquet (flask archive-months) وتُقرأ منها.
+# الأرشفة تحذف الشهر من الجدول فلا تعمل إلا مع ARCHIVE_DIR صريح على تخزين دائم (قرص مُلحق
+# أو مجلد شبكة)؛ مجلد instance الافتراضي يُمسح مع كل إعادة تشغيل على Heroku
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR")
+payroll_archive = PayrollArchive(ARCHIVE_DIR or os.path.join(app.instance_path, "archive"))
+ARCHIVE_KEEP_MONTHS = int(os.getenv("ARCHIVE_KEEP_MONTHS", "12"))  # عدد الأشهر الأحدث التي تبقى في الجدول
+
+# الشهر المنشور يُقرأ في my_payslip_detail من ملف لقطة (mmap) مشترك بين العمال بدون قاعدة البيانات
+payslip_snapshots = PayslipSnapshots(os.getenv("SNAPSHOT_DIR", os.path.join(app.instance_path, "snapshots")))
+PUBLISH_AFTER_UPLOAD = os.getenv("PUBLISH_AFTER_UPLOAD", "1") == "1"
+# اللقطة تُستخدم فقط إذا طابقت بصمتها بصمة الشهر الحالية في قاعدة البيانات (لقطة من قاعدة أخرى
+# أو شهر تغير خارج الرفع تُتجاهل)؛ البصمة الحالية محفوظة في كل عامل لثوانٍ بدلاً من استعلام لكل قسيمة
+snapshot_stamps = LRUCache(max_entries=64, ttl=int(os.getenv("SNAPSHOT_STAMP_TTL", "5")))
+
+# تحليلات كل شهر (إجماليات، توزيع، بنود) محفوظة في كل عامل وتُبطل عند رفع الشهر
+analytics_cache = AnalyticsCache(
+    max_entries=int(os.getenv("ANALYTICS_CACHE_SIZE", "256")),
+    ttl=int(os.getenv("ANALYTICS_CACHE_TTL", "3600")),
+    version_dir=os.path.join(app.instance_path, "analytics_cache"),
+)
+
+# مهام الرفع تنفذ في الخلفية وحالتها محفوظة في ملف مشترك بين العمال
+job_store = JobStore(os.getenv("JOBS_DB_PATH", os.path.join(app.instance_path, "jobs.db")))
+upload_queue = JobQueue(job_store, max_workers=int(os.getenv("UPLOAD_WORKERS", "1")))
+
+# توليد قسائم PDF لشهر كامل: طابور منفصل حتى لا يؤخر مهام الرفع، والرسم نفسه في عمليات متوازية
+pdf_queue = JobQueue(job_store, max_workers=1)
+PDF_OUTPUT_DIR = os.getenv("PDF_OUTPUT_DIR", os.path.join(app.instance_path, "payslip_pdfs"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0")) or None  # الافتراضي: عدد المعالجات
+PDF_FONT_PATH = os.getenv("PAYSLIP_PDF_FONT")  # خط TTF يدعم العربية
+# مجلدات قسائم PDF المولدة من الموقع تحذف بعد هذه المدة (ساعات)
+PDF_OUTPUT_TTL = int(os.getenv("PDF_OUTPUT_TTL_HOURS", "24")) * 3600
+
 def get_connection():
+    # conn.close() تعيد الاتصال إلى التجمع ولا تغلقه فعليًا
+    # الاستعلامات على هذا الاتصال تُعد وتُقاس باسم المسار الحالي
     try:
-        return pyodbc.connect(connection_string)
+        conn = metrics.timed('db_checkout_seconds', db_pool.acquire)
+        return metrics.instrument(conn, request.endpoint if has_request_context() else 'background')
     except Exception as e:
-        print(f"Error connecting to database: {e}")
+        app.logger.error("Error connecting to database: %s", e)
         return None
 
+@contextmanager
+def db_connection():
+    # يضمن إرجاع الاتصال للتجمع حتى في حالة حدوث خطأ
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        if conn:
+            conn.close()
+
 # --- 4. Decorator للتحقق من تسجيل الدخول ---
 # هذا الكود سيحمي الصفحات الداخلية ويمنع الوصول إليها بدون تسجيل دخول
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        # الجلسة تُقرأ من المخزن على الخادم، فحذفها هناك يلغي الدخول فورًا
         if 'employee_id' not in session:
             flash("يرجى تسجيل الدخول أولاً للوصول لهذه الصفحة.", "error")
             return redirect(url_for('login'))
@@ -63,9 +203,6 @@ def login():
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # --- أضف سطر المراقبة هذا هنا ---
-        print(f"ADMIN CHECK: الحارس يرى أن الصلاحية هي: '{session.get('role')}'")
-        
         if session.get('role') != 'admin':
             flash("ليس لديك صلاحية للوصول لهذه الصفحة.", "error")
             return redirect(url_for('dashboard'))
@@ -81,88 +218,152 @@ def request_otp():
     phone_number_from_form = request.form.get("phone_number")
     
     # --- منطق توحيد رقم الهاتف (للمقارنة مع قاعدة البيانات) ---
-    phone_to_check = str(phone_number_from_form).strip()
-    if phone_to_check.startswith('0'):
-        phone_to_check = '+2' + phone_to_check
-    elif not phone_to_check.startswith('+20'):
-        phone_to_check = '+20' + phone_to_check
-    
-    conn = get_connection()
-    if not conn:
-        flash("خطأ في الاتصال بقاعدة البيانات.", "error")
+    phone_to_check = normalize_phone(phone_number_from_form)
+
+    # كل محاولة تُحسب (حتى الخاطئة) لمنع تخمين الأرقام وإغراق مزود الرسائل
+    if not otp_rate_limiter.hit(f"emp:{emp_id}", f"phone:{phone_to_check}"):
+        flash("تم تجاوز عدد المحاولات المسموح، يرجى المحاولة بعد قليل.", "error")
         return redirect(url_for('login'))
-        
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Employees WHERE EmployeeID = ? AND MobileNumber = ?", (emp_id, phone_to_check))
-        employee = cursor.fetchone()
 
+    # استعلام واحد (رقم الموظف والصلاحية) ولا اتصال بقاعدة البيانات إذا كانت النتيجة محفوظة
+    employee = identity_cache.get(emp_id, phone_to_check)
+    if employee is None:
+        with db_connection() as conn:
+            if not conn:
+                flash("خطأ في الاتصال بقاعدة البيانات.", "error")
+                return redirect(url_for('login'))
+            try:
+                employee = lookup_identity(conn, emp_id, phone_to_check)
+            except Exception as e:
+                flash(f"حدث خطأ: {e}", "error")
+                return redirect(url_for('login'))
         if employee:
-            otp = random.randint(100000, 999999)
-            session['otp'] = str(otp) 
-            session['otp_emp_id'] = emp_id
-            
-            # --- هذا هو الـ OTP التجريبي ---
-            print("\n===================================")
-            print(f"OTP for Employee {emp_id} is: {otp}")
-            print("===================================\n")
-            
-            flash("تم إرسال رمز التحقق (انظر الكونسول).", "success")
-            return redirect(url_for('verify_otp'))
-        else:
-            flash("كود الموظف أو رقم الموبايل غير صحيح.", "error")
+            identity_cache.set(emp_id, phone_to_check, employee)
+
+    if employee:
+        otp = random.randint(100000, 999999)
+        # الرمز محفوظ في المخزن بمدة صلاحية، والجلسة تحمل رقم محاولة الدخول فقط
+        # (الصلاحية محفوظة معه حتى لا يحتاج verify_otp إلى قاعدة البيانات)
+        login_id = uuid.uuid4().hex
+        kv_store.set(f"otp:{login_id}", {'emp_id': emp_id, 'role': employee['role'], 'code': str(otp)}, ttl=OTP_TTL)
+        session['otp_login'] = login_id
+
+        # الإرسال في الخلفية: الصفحة لا تنتظر مزود الرسائل
+        if not otp_dispatcher.submit(emp_id, phone_to_check, otp):
+            flash("خدمة إرسال الرسائل مشغولة حاليًا، يرجى المحاولة بعد قليل.", "error")
             return redirect(url_for('login'))
-    except Exception as e:
-        flash(f"حدث خطأ: {e}", "error")
+
+        flash("تم إرسال رمز التحقق إلى رقم الموبايل المسجل.", "success")
+        return redirect(url_for('verify_otp'))
+    else:
+        flash("كود الموظف أو رقم الموبايل غير صحيح.", "error")
         return redirect(url_for('login'))
 
 @app.route("/verify_otp", methods=["GET", "POST"])
 def verify_otp():
-    if 'otp_emp_id' not in session:
+    login_id = session.get('otp_login')
+    if not login_id:
+        return redirect(url_for('login'))
+    otp_record = kv_store.get(f"otp:{login_id}")
+    if otp_record is None:
+        session.pop('otp_login', None)
+        flash("انتهت صلاحية رمز التحقق، يرجى طلب رمز جديد.", "error")
         return redirect(url_for('login'))
 
     if request.method == 'POST':
-        user_otp = request.form.get('otp')
-        if user_otp == session.get('otp'):
-            emp_id = session.pop('otp_emp_id', None)
-            session.pop('otp', None)
+        # compare_digest يرفض النصوص غير ASCII، لذلك تُوحد الأرقام العربية وتُقارن البايتات
+        user_otp = normalize_otp(request.form.get('otp'))
+        if hmac.compare_digest(user_otp.encode(), otp_record['code'].encode()):
+            emp_id = otp_record['emp_id']
+            kv_store.delete(f"otp:{login_id}")
+            kv_store.delete(f"otp_attempts:{login_id}")
+            session.pop('otp_login', None)
+            # رقم جلسة جديد بعد الدخول حتى لا يُستخدم رقم جلسة معروف مسبقًا
+            session.regenerate()
             session['employee_id'] = emp_id
-            
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT Role FROM Employees WHERE EmployeeID = ?", (emp_id,))
-            user_role = cursor.fetchone()
-            conn.close()
-            
-            session['role'] = user_role.Role.lower() if user_role and user_role.Role else 'employee'
+            session['role'] = otp_record.get('role') or 'employee'
 
             return redirect(url_for('dashboard'))
+        elif kv_store.incr(f"otp_attempts:{login_id}", OTP_TTL) >= OTP_MAX_ATTEMPTS:
+            # عدد المحاولات مشترك بين العمال، وبعد الحد يُلغى الرمز
+            kv_store.delete(f"otp:{login_id}")
+            kv_store.delete(f"otp_attempts:{login_id}")
+            session.pop('otp_login', None)
+            flash("تم تجاوز عدد محاولات إدخال الرمز، يرجى طلب رمز جديد.", "error")
+            return redirect(url_for('login'))
         else:
             flash("رمز التحقق غير صحيح.", "error")
     
     return render_template('verify_otp.html')
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    metrics.start_request()
+
+@app.after_request
+def record_request(response):
+    if 'request_started' in g:
+        endpoint = request.endpoint or 'not_found'
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - g.request_started,
+                        endpoint=endpoint, method=request.method, status=response.status_code)
+        metrics.observe('db_queries_per_request', metrics.request_queries(), endpoint=endpoint)
+        metrics.flush()
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # مجموع قياسات كل العمال (زمن الطلبات، الاتصال بقاعدة البيانات، الاستعلامات، مراحل الرفع)
+    # مقارنة البايتات: compare_digest يرفض النصوص غير ASCII (ترويسة عشوائية تصبح 403 وليس 500)
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not (METRICS_TOKEN and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())) and session.get('role') != 'admin':
+        return Response("forbidden\n", status=403, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/pool_stats')
+@login_required
+@admin_required
+def pool_stats():
+    # إحصائيات تجمع الاتصالات الخاص بهذا العامل (worker)
+    return jsonify(db_pool.stats())
+
+@app.route('/otp_stats')
+@login_required
+@admin_required
+def otp_stats():
+    # طول طابور الإرسال وزمن التوصيل (لهذا العامل فقط)
+    stats = otp_dispatcher.stats()
+    stats['rate_limited'] = otp_rate_limiter.rejected
+    stats['identity_cache'] = identity_cache.stats()
+    return jsonify(stats)
+
 @app.route('/employees')
 @login_required  # يجب أن يكون مسجل دخوله
 @admin_required  # يجب أن يكون مديرًا
 def employees():
     employees_list = []
-    conn = get_connection()
-    if not conn:
-        flash("خطأ في الاتصال بقاعدة البيانات.", "error")
-    else:
-        try:
-            cursor = conn.cursor()
-            # جلب البيانات الأساسية للموظفين
-            cursor.execute("SELECT EmployeeID, EmployeeName, NationalID, MobileNumber, Role FROM Employees")
-            # تحويل النتائج إلى شكل يمكن استخدامه في HTML
-            columns = [column[0] for column in cursor.description]
-            employees_list = [dict(zip(columns, row)) for row in cursor.fetchall()]
-            conn.close()
-        except Exception as e:
-            flash(f"حدث خطأ أثناء جلب بيانات الموظفين: {e}", "error")
-            
+    next_cursor = None
+    filters = filters_from(request.args)
+    page_size = page_size_from(request.args.get('page_size'))
+    with db_connection() as conn:
+        if not conn:
+            flash("خطأ في الاتصال بقاعدة البيانات.", "error")
+        else:
+            try:
+                # جلب صفحة واحدة من الموظفين (بحث وتصفية حسب الإدارة ومركز التكلفة)
+                page = employee_page(conn, schema_cache.column_set(conn, 'Employees'), filters,
+                                     request.args.get('cursor'), page_size)
+                employees_list = page['items']
+                next_cursor = page['next_cursor']
+            except Exception as e:
+                flash(f"حدث خطأ أثناء جلب بيانات الموظفين: {e}", "error")
+
+    if request.args.get('format') == 'json':
+        return jsonify({'items': employees_list, 'next_cursor': next_cursor,
+                        'page_size': page_size, 'filters': filters})
     # إرسال قائمة الموظفين إلى صفحة HTML جديدة اسمها employees.html
-    return render_template('employees.html', employees=employees_list)
+    return render_template('employees.html', employees=employees_list, next_cursor=next_cursor,
+                           filters=filters, page_size=page_size)
 
 
 
@@ -171,31 +372,15 @@ def employees():
 @admin_required
 def payslips_overview():
     payslip_data = {}
-    conn = get_connection()
-    if not conn:
-        flash("خطأ في الاتصال بقاعدة البيانات.", "error")
-    else:
-        try:
-            cursor = conn.cursor()
-            query = "SELECT DISTINCT PayYear, PayMonth FROM Payslips ORDER BY PayYear DESC, PayMonth DESC"
-            cursor.execute(query)
-            
-            for row in cursor.fetchall():
-                year = row.PayYear
-                month = row.PayMonth
-
-                # --- هذا هو التعديل الهام ---
-                # إذا كانت السنة أو الشهر فارغًا في قاعدة البيانات، تجاهل هذا السجل تمامًا
-                if not year or not month:
-                    continue  # انتقل إلى السجل التالي في قاعدة البيانات
-
-                if year not in payslip_data:
-                    payslip_data[year] = []
-                payslip_data[year].append(month)
-            
-            conn.close()
-        except Exception as e:
-            flash(f"حدث خطأ أثناء جلب بيانات الرواتب: {e}", "error")
+    with db_connection() as conn:
+        if not conn:
+            flash("خطأ في الاتصال بقاعدة البيانات.", "error")
+        else:
+            try:
+                # الأشهر من جدول الملخص (صف لكل شهر) بدلاً من DISTINCT على كل الرواتب
+                payslip_data = summary_months(conn)
+            except Exception as e:
+                flash(f"حدث خطأ أثناء جلب بيانات الرواتب: {e}", "error")
             
     return render_template('payslips_overview.html', payslip_data=payslip_data)
 
@@ -205,74 +390,146 @@ def payslips_overview():
 def payslip_details(year, month):
     summary = {}
     payslips_list = []
+    next_cursor = None
+    filters = filters_from(request.args)
+    page_size = page_size_from(request.args.get('page_size'))
+    with db_connection() as conn:
+        if not conn:
+            flash("خطأ في الاتصال بقاعدة البيانات.", "error")
+        else:
+            try:
+                # --- الاستعلام الأول: جلب الإجماليات من الملخص المحسوب عند الرفع ---
+                # (الأشهر القديمة يحسب الترحيل ملخصها، وصفحة العرض لا تكتب في قاعدة البيانات)
+                summary = month_summary(conn, year, month) or empty_summary(year, month)
+
+                # --- الاستعلام الثاني: جلب صفحة واحدة من قائمة الرواتب المفصلة ---
+                # الشهر المؤرشف يُقرأ من ملفه بنفس شكل الصفحة
+                page_source = payroll_archive.payslip_page if payroll_archive.has_month(year, month) else payslip_page
+                page = page_source(conn, year, month, schema_cache.column_set(conn, 'Employees'),
+                                   filters, request.args.get('cursor'), page_size)
+                payslips_list = page['items']
+                next_cursor = page['next_cursor']
+            except Exception as e:
+                if request.args.get('format') == 'json':
+                    return jsonify({'error': str(e)}), 500
+                flash(f"حدث خطأ أثناء جلب تفاصيل الرواتب: {e}", "error")
+                return redirect(url_for('payslips_overview'))
+
+    if request.args.get('format') == 'json':
+        return jsonify({'summary': summary, 'items': payslips_list, 'next_cursor': next_cursor,
+                        'page_size': page_size, 'filters': filters})
+    # pdf_job: مهمة توليد قسائم PDF الجارية لتتابعها الصفحة عبر pdf_job_status (static/job_status.js)
+    pdf_job = request.args.get('pdf_job')
+    pdf_job_status_url = url_for('pdf_job_status', job_id=pdf_job) if pdf_job else None
+    return render_template('payslip_details.html', summary=summary, payslips=payslips_list,
+                           next_cursor=next_cursor, filters=filters, page_size=page_size,
+                           pdf_job_status_url=pdf_job_status_url)
+
+def request_employee_dimensions(conn):
+    # جدول الموظفين يُقرأ مرة واحدة لكل طلب مهما كان عدد الأشهر غير المحفوظة (صفحة المقارنة)
+    if 'employee_dimensions' not in g:
+        g.employee_dimensions = employee_dimensions(conn, schema_cache.column_set(conn, 'Employees'))
+    return g.employee_dimensions
+
+def cached_month_analytics(conn, year, month):
+    result = analytics_cache.get(year, month)
+    if result is None:
+        frame, components, dims = load_month_frame(
+            conn, payroll_archive, year, month,
+            schema_cache.column_set(conn, 'Payslips'), request_employee_dimensions(conn),
+        )
+        result = month_analytics(frame, year, month, components, dims)
+        if result is not None:
+            analytics_cache.set(year, month, result)
+    return result
+
+@app.route('/analytics/<int:year>/<month>')
+@login_required
+@admin_required
+def month_analytics_view(year, month):
+    # إجماليات الشهر، التوزيع حسب الإدارة وكود مركز التكلفة، وكل بند من بنود الراتب
+    with db_connection() as conn:
+        if not conn:
+            return jsonify({'error': 'database connection failed'}), 503
+        try:
+            result = cached_month_analytics(conn, year, month)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    if result is None:
+        return jsonify({'error': 'month not found'}), 404
+    return jsonify(result)
+
+@app.route('/analytics/trend')
+@login_required
+@admin_required
+def analytics_trend():
+    # الفرق عن الشهر السابق لآخر months شهرًا (نتيجة كل شهر من الذاكرة المؤقتة)
+    count = request.args.get('months', 12, type=int)
+    with db_connection() as conn:
+        if not conn:
+            return jsonify({'error': 'database connection failed'}), 503
+        try:
+            months = [cached_month_analytics(conn, year, month) for year, month in recent_months(conn, count)]
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    return jsonify({'months': month_deltas([m for m in months if m])})
+
+@app.route('/analytics/employees/<employee_id>')
+@login_required
+@admin_required
+def employee_analytics(employee_id):
+    # تاريخ رواتب الموظف في كل الأشهر (الحية والمؤرشفة) مع التغير في الصافي
+    with db_connection() as conn:
+        if not conn:
+            return jsonify({'error': 'database connection failed'}), 503
+        try:
+            result = employee_history(conn, payroll_archive, employee_id, schema_cache.column_set(conn, 'Payslips'))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    if result is None:
+        return jsonify({'error': 'employee not found'}), 404
+    return jsonify(result)
+
+@app.route('/payslips/<int:year>/<month>/export')
+@login_required
+@admin_required
+def export_payslips(year, month):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        flash("صيغة التصدير غير مدعومة.", "error")
+        return redirect(url_for('payslip_details', year=year, month=month))
+
+    # الاتصال يؤخذ قبل بدء الاستجابة حتى يظهر خطأ الاتصال كرسالة عادية،
+    # ويعود للتجمع بعد انتهاء إرسال آخر صف (أو انقطاع العميل)، أو فورًا إذا كان الشهر مؤرشفًا
     conn = get_connection()
     if not conn:
         flash("خطأ في الاتصال بقاعدة البيانات.", "error")
+        return redirect(url_for('payslip_details', year=year, month=month))
+    try:
+        columns = schema_cache.columns(conn, 'Payslips')
+    except Exception as e:
+        conn.close()
+        flash(f"حدث خطأ أثناء تصدير الرواتب: {e}", "error")
+        return redirect(url_for('payslip_details', year=year, month=month))
+
+    if payroll_archive.has_month(year, month):
+        # الشهر المؤرشف يُقرأ من ملف Parquet فلا داعي لحجز اتصال طوال مدة التنزيل
+        conn.close()
+        conn = None
+        rows = payroll_archive.month_rows(year, month, columns)
     else:
+        rows = month_rows(conn, year, month, columns)
+
+    def generate():
         try:
-            cursor = conn.cursor()
-            
-            # --- الاستعلام الأول: جلب الإجماليات ---
-            summary_query = """
-                SELECT 
-                    COUNT(EmployeeID) AS TotalEmployees, 
-                    SUM(NetSalary) AS TotalNetSalary
-                FROM Payslips 
-                WHERE PayYear = ? AND PayMonth = ?
-            """
-            cursor.execute(summary_query, year, month)
-            summary_row = cursor.fetchone()
-            if summary_row:
-                summary = {
-                    'year': year,
-                    'month': month,
-                    'total_employees': summary_row.TotalEmployees,
-                    'total_net_salary': summary_row.TotalNetSalary
-                }
-
-            # --- الاستعلام الثاني: جلب قائمة الرواتب المفصلة ---
-            details_query = """
-                SELECT EmployeeName, EmployeeID, BasicSalary, TotalEntitlements, TotalDeductions, NetSalary 
-                FROM Payslips 
-                WHERE PayYear = ? AND PayMonth = ?
-                ORDER BY EmployeeName
-            """
-            cursor.execute(details_query, year, month)
-            columns = [column[0] for column in cursor.description]
-            payslips_list = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            yield from export_chunks(fmt, columns, rows)
+        finally:
+            if conn:
+                conn.close()
 
-            conn.close()
-        except Exception as e:
-            flash(f"حدث خطأ أثناء جلب تفاصيل الرواتب: {e}", "error")
-            return redirect(url_for('payslips_overview'))
-
-    return render_template('payslip_details.html', summary=summary, payslips=payslips_list)
-
-
-# --- خريطة لترجمة أسماء الأعمدة من العربي في الإكسل إلى الإنجليزي في قاعدة البيانات ---
-COLUMN_MAPPING = {
-    'رقم الموظف': 'EmployeeID', 'الاسم': 'EmployeeName', 'الرقم القومي': 'NationalID',
-    'الوظيفة': 'JobTitle', 'كود مركز التكلفة': 'CostCenterCode', 'مركز التكلفة': 'CostCenterName',
-    'الإدارة': 'Department', 'رقم الموبايل': 'MobileNumber', 'مرتب أساسي': 'BasicSalary',
-    'بدل تمثيل': 'RepresentationAllowance', 'بدل إنتقال': 'TransportationAllowance',
-    'بدل ترقية': 'PromotionAllowance', 'بدل سيارة': 'CarAllowance', 'بدل نول': 'NolAllowance',
-    'بدل انتاج': 'ProductionAllowance', 'علاوات خاصة': 'SpecialAllowances',
-    'بدل طبيعة': 'NatureOfWorkAllowance', 'بدل غذاء': 'FoodAllowance', 'غلاء معيشة': 'CostOfLiving',
-    'جهد': 'EffortAllowance', 'بدل إنتظام': 'RegularityAllowance', 'اجمالي بدلات': 'TotalAllowances',
-    'إضافي': 'Overtime', 'صافي الحوافز': 'NetIncentives', 'بدل الباركود': 'BarcodeAllowance',
-    'بدل جودة': 'QualityAllowance', 'حافز النسيج': 'FabricIncentive', 'حافز استثنائ': 'ExceptionalIncentive',
-    'حافز إداري': 'AdministrativeIncentive', 'حافز عمليات': 'OperationsIncentive', 'بدل سكن': 'HousingAllowance',
-    'استحقاقات إخري': 'OtherEntitlements', 'عمولة': 'Commission', 'حافز انتاج': 'ProductionIncentive',
-    'الإسترداد': 'Reimbursement', 'حافز كفاءة': 'EfficiencyIncentive', 'بدل ملبس': 'ClothingAllowance',
-    'مكافئة': 'Bonus', 'إجمالى الاستحفافات': 'TotalEntitlements',
-    'حصة الموظف من التامينات': 'EmployeeInsuranceShare', 'مدة تامينات سابقة': 'PreviousInsurancePeriod',
-    'كسب عمل': 'WorkEarnings', 'غياب': 'AbsenceDeduction', 'جزاء راتب': 'SalaryPenalty',
-    'سلفة': 'AdvancePayment', 'غرامة': 'FineDeduction', 'كهرباء': 'ElectricityDeduction',
-    'تليفون': 'PhoneDeduction', 'مياه': 'WaterDeduction', 'فرق ايام': 'DaysDifferenceDeduction',
-    'خصومات اخري': 'OtherDeductions', 'كارت بريميوم': 'PremiumCardDeduction',
-    'ص.ت.الشهداء': 'MartyrsFundDeduction', 'خزانه': 'TreasuryDeduction',
-    'إجمالى الاستقطاعات': 'TotalDeductions', 'الصافي': 'NetSalary'
-}
+    filename = export_filename(year, month, fmt)
+    return Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
 
 @app.route('/upload', methods=['GET', 'POST'])
@@ -291,228 +548,287 @@ def upload_payslips():
         try:
             pay_year = int(request.form.get('pay_year'))
             pay_month = request.form.get('pay_month')
-            
-            df = pd.read_excel(file, header=0, dtype=str).fillna('')
-            
-            # 1. ترجمة الأعمدة المعروفة وتجهيز الجديدة
-            original_excel_cols = df.columns.tolist()
-            final_col_names = {}
-            for col in original_excel_cols:
-                if col in COLUMN_MAPPING:
-                    final_col_names[col] = COLUMN_MAPPING[col]
-                else:
-                    safe_col_name = col.strip().replace(' ', '_')
-                    final_col_names[col] = safe_col_name
-            df.rename(columns=final_col_names, inplace=True)
-            
-            conn = get_connection()
-            cursor = conn.cursor()
-
-            # 2. المزامنة الديناميكية لهيكل قاعدة البيانات
-            cursor.execute("SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'Employees'")
-            db_employee_columns = {row.COLUMN_NAME for row in cursor.fetchall()}
-            cursor.execute("SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'Payslips'")
-            db_payslip_columns = {row.COLUMN_NAME for row in cursor.fetchall()}
-            
-            employee_base_cols = ['EmployeeID', 'EmployeeName', 'NationalID', 'JobTitle', 'CostCenterCode', 'CostCenterName', 'Department', 'MobileNumber', 'Role']
-
-            for col_name in df.columns:
-                is_employee_col = any(emp_col in col_name for emp_col in employee_base_cols)
-                if is_employee_col and col_name not in db_employee_columns:
-                    cursor.execute(f"ALTER TABLE Employees ADD [{col_name}] NVARCHAR(255) NULL")
-                elif not is_employee_col and col_name not in db_payslip_columns:
-                    cursor.execute(f"ALTER TABLE Payslips ADD [{col_name}] NVARCHAR(MAX) NULL")
-            
-            conn.commit()
-
-            # تحديث قوائم الأعمدة بعد أي إضافة محتملة
-            cursor.execute("SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'Employees'")
-            db_employee_columns = {row.COLUMN_NAME for row in cursor.fetchall()}
-            cursor.execute("SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'Payslips'")
-            db_payslip_columns = {row.COLUMN_NAME for row in cursor.fetchall()}
-
-            # 3. إدخال البيانات بعد التأكد من مزامنة الهيكل
-            cursor.execute("DELETE FROM Payslips WHERE PayYear = ? AND PayMonth = ?", (pay_year, pay_month))
-            processed_count = 0
-            for index, row in df.iterrows():
-                employee_id = row.get('EmployeeID')
-                if not employee_id: continue
-
-                # --- بداية التعديل: توحيد صيغة رقم الهاتف إجباريًا ---
-                if 'MobileNumber' in row and row['MobileNumber']:
-                    phone = str(row['MobileNumber']).strip()
-                    if phone.startswith('0'):
-                        # تحويل 010... إلى +2010...
-                        phone = '+2' + phone
-                    elif not phone.startswith('+20'):
-                        # إضافة +20 إذا لم تكن موجودة
-                        phone = '+20' + phone
-                    # تحديث القيمة في الصف ليتم حفظها بالشكل الصحيح
-                    row['MobileNumber'] = phone
-                # --- نهاية التعديل ---
-
-                # تحديث أو إضافة الموظف
-                cursor.execute("SELECT EmployeeID FROM Employees WHERE EmployeeID = ?", employee_id)
-                exists = cursor.fetchone()
-                employee_data = {k: v for k, v in row.items() if k in db_employee_columns and v != ''}
-                if exists:
-                    if len(employee_data) > 1:
-                        update_data = employee_data.copy()
-                        del update_data['EmployeeID']
-                        set_clause = ", ".join([f"[{key}] = ?" for key in update_data.keys()])
-                        values = list(update_data.values()) + [employee_id]
-                        query = f"UPDATE Employees SET {set_clause} WHERE EmployeeID = ?"
-                        cursor.execute(query, values)
-                else:
-                    if 'Role' not in employee_data: employee_data['Role'] = 'employee'
-                    cols = ", ".join([f"[{key}]" for key in employee_data.keys()])
-                    placeholders = ", ".join(['?'] * len(employee_data))
-                    query = f"INSERT INTO Employees ({cols}) VALUES ({placeholders})"
-                    cursor.execute(query, list(employee_data.values()))
-
-                # إضافة الراتب
-                payslip_data = {k: v for k, v in row.items() if k in db_payslip_columns and v != ''}
-                payslip_data['PayYear'] = pay_year
-                payslip_data['PayMonth'] = pay_month
-                cols = ", ".join([f"[{key}]" for key in payslip_data.keys()])
-                placeholders = ", ".join(['?'] * len(payslip_data))
-                query = f"INSERT INTO Payslips ({cols}) VALUES ({placeholders})"
-                cursor.execute(query, list(payslip_data.values()))
-                
-                processed_count += 1
-
-            conn.commit()
-            conn.close()
-            flash(f"✅ تمت معالجة ورفع بيانات {processed_count} موظفًا بنجاح!", "success")
-
+            if payroll_archive.has_month(pay_year, pay_month):
+                # الرفع يكتب في الجدول الحي بينما القراءة من الأرشيف: يجب استرجاع الشهر أولاً
+                flash("هذا الشهر مؤرشف، يرجى استرجاعه (flask restore-month) قبل رفعه مرة أخرى.", "error")
+                return redirect(request.url)
+
+            # وضع القراءة المتدفقة: بطلب صريح من النموذج أو تلقائيًا للملفات الكبيرة
+            file.seek(0, os.SEEK_END)
+            stream_mode = request.form.get('stream') == '1' or file.tell() > UPLOAD_STREAM_THRESHOLD
+            file.seek(0)
+
+            # حفظ الملف ثم معالجته في مهمة خلفية حتى لا ينشغل العامل طوال مدة الرفع
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+            prune_uploads()
+            path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{secure_filename(file.filename) or 'payslips.xlsx'}")
+            file.save(path)
+            # الرفع التزايدي يبدأ بمعاينة الفروق، والتطبيق الفعلي بعد التأكيد (upload_apply)
+            incremental = request.form.get('incremental') == '1'
+            job_id = upload_queue.submit('upload', run_upload_job, {
+                'path': path, 'filename': file.filename, 'pay_year': pay_year,
+                'pay_month': pay_month, 'stream': stream_mode,
+                'dry_run': request.form.get('dry_run') == '1',
+                'incremental': incremental, 'preview': incremental,
+            })
         except Exception as e:
-            print(f"AN ERROR OCCURRED: {e}")
+            app.logger.exception("Upload failed: %s", e)
             flash(f"❌ حدث خطأ فادح أثناء معالجة الملف: {e}", "error")
             return redirect(request.url)
 
-        return redirect(url_for('payslips_overview'))
+        flash("⏳ تم استلام الملف وجاري معالجته في الخلفية.", "success")
+        return redirect(url_for('upload_payslips', job=job_id))
 
     current_year = datetime.datetime.now().year
-    return render_template('upload_payslips.html', current_year=current_year)# --- مسارات (Routes) خاصة بالموظف ---
+    # job: رقم مهمة الرفع الجارية؛ الصفحة تسأل upload_job_status عنها عبر static/job_status.js
+    # (<div data-job-status-url="{{ job_status_url }}">)
+    job_id = request.args.get('job')
+    job_status_url = url_for('upload_job_status', job_id=job_id) if job_id else None
+    return render_template('upload_payslips.html', current_year=current_year,
+                           job_id=job_id, job_status_url=job_status_url)
+
+def prune_uploads():
+    # حذف ملفات المعاينات القديمة التي لم يؤكد أحد تطبيقها
+    now = datetime.datetime.now().timestamp()
+    for name in os.listdir(UPLOAD_DIR):
+        path = os.path.join(UPLOAD_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > UPLOAD_PREVIEW_TTL:
+                os.remove(path)
+        except OSError:
+            pass
+
+def publish_month(year, month):
+    # لقطة الشهر من الجدول الحي أو من الأرشيف بأعمدة القسيمة الحالية
+    with db_pool.connection() as conn:
+        # البصمة قبل الصفوف: رفع يكتمل بينهما يجعل اللقطة غير مطابقة فتُتجاهل بدلاً من أن تُقرأ
+        stamp = month_stamp(conn, year, month)
+        # أعمدة القسيمة فقط، مثل استعلام صفحة التفاصيل
+        columns = compiled_layout(schema_cache.columns(conn, 'Payslips')).detail_columns
+        if payroll_archive.has_month(year, month):
+            rows = payroll_archive.month_rows(year, month, columns)
+        else:
+            rows = month_rows(conn, year, month, columns)
+        report = payslip_snapshots.publish(year, month, columns, rows,
+                                           schema_cache.typed_columns(conn, 'Payslips', 'decimal'), stamp)
+    if not report['payslips']:
+        # شهر فارغ: لا داعي للقطة
+        payslip_snapshots.unpublish(year, month)
+    return report
+
+def run_upload_job(job):
+    params = job.params
+    report = None
+    # زمن كل مرحلة (قراءة الملف، مزامنة الهيكل، التحميل، ...) يسجل في upload_phase_seconds
+    progress = PhaseTimer(metrics, 'upload_phase_seconds', job.progress)
+    try:
+        report = run_upload(db_pool, schema_cache, params['path'], params['pay_year'], params['pay_month'],
+                            stream_mode=params['stream'], batch_size=UPLOAD_BATCH_SIZE,
+                            dry_run=params.get('dry_run', False), progress=progress,
+                            incremental=params.get('incremental', False), preview=params.get('preview', False))
+    finally:
+        progress.finish()
+        # ملف المعاينة يبقى حتى يؤكد المدير تطبيق التغييرات
+        if not (report and report.get('preview')):
+            os.remove(params['path'])
+    if not report.get('dry_run') and not report.get('preview'):
+        # الشهر استُبدل في قاعدة البيانات: القسائم المحفوظة له لم تعد صالحة
+        payslip_cache.invalidate_month(params['pay_year'], params['pay_month'])
+        analytics_cache.invalidate_month(params['pay_year'], params['pay_month'])
+        # اللقطة القديمة تُحذف أولاً (القراءة من قاعدة البيانات) ثم يُعاد نشر الشهر
+        payslip_snapshots.unpublish(params['pay_year'], params['pay_month'])
+        snapshot_stamps.delete_prefix(f"{params['pay_year']}|{params['pay_month']}|")
+        if PUBLISH_AFTER_UPLOAD:
+            try:
+                report['published'] = publish_month(params['pay_year'], params['pay_month'])
+            except Exception:
+                app.logger.exception("Publishing %s/%s after upload failed", params['pay_year'], params['pay_month'])
+        if report.get('employees_inserted') or report.get('employees_updated'):
+            # الهاتف أو الصلاحية ربما تغيرت، وكذلك الإدارة ومركز التكلفة في التحليلات
+            identity_cache.invalidate()
+            analytics_cache.invalidate()
+    app.logger.info("Upload report: %s", report)
+    job.set_message(upload_message(report))
+    return report
+
+@app.route('/upload/jobs')
+@login_required
+@admin_required
+def upload_jobs():
+    return jsonify(job_store.recent(kind='upload'))
+
+@app.route('/upload/jobs/<job_id>')
+@login_required
+@admin_required
+def upload_job_status(job_id):
+    # حالة مهمة الرفع: المرحلة، الصفوف المعالجة، الصفوف في الثانية
+    job = job_store.get(job_id)
+    if not job or job['kind'] != 'upload':
+        return jsonify({'error': 'job not found'}), 404
+    params = job.pop('params', None) or {}
+    if job['status'] == 'done' and params.get('preview'):
+        job['apply_url'] = url_for('upload_apply', job_id=job_id)
+    return jsonify(job)
+
+@app.route('/upload/jobs/<job_id>/apply', methods=['POST'])
+@login_required
+@admin_required
+def upload_apply(job_id):
+    # تطبيق رفع تزايدي بعد مراجعة ملخص الفروق في مهمة المعاينة
+    job = job_store.get(job_id)
+    if not job or job['kind'] != 'upload' or job['status'] != 'done' or not job['params'].get('preview'):
+        flash("لا توجد معاينة صالحة لتطبيقها.", "error")
+        return redirect(url_for('upload_payslips'))
+    params = dict(job['params'], preview=False)
+    if not os.path.exists(params['path']):
+        flash("انتهت صلاحية المعاينة، يرجى رفع الملف مرة أخرى.", "error")
+        return redirect(url_for('upload_payslips'))
+    new_job_id = upload_queue.submit('upload', run_upload_job, params)
+    flash("⏳ جاري تطبيق التغييرات في الخلفية.", "success")
+    return redirect(url_for('upload_payslips', job=new_job_id))
+
+@app.route('/payslips/<int:year>/<month>/publish', methods=['POST'])
+@login_required
+@admin_required
+def publish_payslips(year, month):
+    # unpublish=1: حذف اللقطة والعودة للقراءة من قاعدة البيانات
+    if request.form.get('unpublish') == '1':
+        payslip_snapshots.unpublish(year, month)
+        flash("تم إلغاء نشر الشهر.", "success")
+        return redirect(url_for('payslip_details', year=year, month=month))
+    try:
+        report = publish_month(year, month)
+        flash(f"✅ تم نشر {report['payslips']} قسيمة للشهر.", "success")
+    except Exception as e:
+        app.logger.exception("Publishing %s/%s failed", year, month)
+        flash(f"حدث خطأ أثناء نشر الشهر: {e}", "error")
+    return redirect(url_for('payslip_details', year=year, month=month))
+
+@app.route('/payslips/<int:year>/<month>/pdf', methods=['POST'])
+@login_required
+@admin_required
+def generate_payslip_pdfs(year, month):
+    if payroll_archive.has_month(year, month):
+        flash("هذا الشهر مؤرشف، يرجى استرجاعه قبل توليد القسائم.", "error")
+        return redirect(url_for('payslip_details', year=year, month=month))
+    prune_pdf_outputs()
+    # by_department=1: ملف zip لكل إدارة بدلاً من ملف واحد للشهر
+    job_id = pdf_queue.submit('pdf', run_pdf_job, {
+        'pay_year': year, 'pay_month': month,
+        'by_department': request.form.get('by_department') == '1',
+    })
+    flash("⏳ جاري توليد قسائم الرواتب PDF في الخلفية.", "success")
+    return redirect(url_for('payslip_details', year=year, month=month, pdf_job=job_id))
+
+def prune_pdf_outputs():
+    # حذف مجلدات مهام PDF القديمة (مجلدات أمر payslip-pdfs يديرها من شغله)، عدا المهام التي لم تنته بعد
+    if not os.path.isdir(PDF_OUTPUT_DIR):
+        return
+    now = datetime.datetime.now().timestamp()
+    for name in os.listdir(PDF_OUTPUT_DIR):
+        path = os.path.join(PDF_OUTPUT_DIR, name)
+        job = job_store.get(name)
+        if not job or job['kind'] != 'pdf' or job['status'] in ('queued', 'running'):
+            continue
+        try:
+            if now - os.path.getmtime(path) > PDF_OUTPUT_TTL:
+                shutil.rmtree(path)
+        except OSError:
+            pass
+
+def run_pdf_job(job):
+    params = job.params
+    output_dir = os.path.join(PDF_OUTPUT_DIR, job.id)
+    with db_pool.connection() as conn:
+        report = generate_month_pdfs(
+            conn, params['pay_year'], params['pay_month'],
+            schema_cache.columns(conn, 'Payslips'), schema_cache.column_set(conn, 'Employees'),
+            output_dir, by_department=params['by_department'], workers=PDF_WORKERS,
+            font_path=PDF_FONT_PATH, progress=job.progress,
+            money_columns=schema_cache.typed_columns(conn, 'Payslips', 'decimal'),
+        )
+    app.logger.info("PDF report: %s", report)
+    job.set_message(f"✅ تم توليد {report['payslips']} قسيمة في {report['seconds']} ثانية "
+                    f"({report['payslips_per_sec']} قسيمة/ثانية).")
+    return report
+
+@app.route('/payslips/pdf_jobs/<job_id>')
+@login_required
+@admin_required
+def pdf_job_status(job_id):
+    job = job_store.get(job_id)
+    if not job or job['kind'] != 'pdf':
+        return jsonify({'error': 'job not found'}), 404
+    if job['status'] == 'done' and job['result']:
+        job['downloads'] = [url_for('download_payslip_pdfs', job_id=job_id, filename=name)
+                            for name in job['result']['files']]
+    return jsonify(job)
+
+@app.route('/payslips/pdf_jobs/<job_id>/<path:filename>')
+@login_required
+@admin_required
+def download_payslip_pdfs(job_id, filename):
+    job = job_store.get(job_id)
+    if not job or job['kind'] != 'pdf' or job['status'] != 'done':
+        return jsonify({'error': 'job not found'}), 404
+    return send_from_directory(os.path.join(PDF_OUTPUT_DIR, job['id']), filename, as_attachment=True)
+
+# --- مسارات (Routes) خاصة بالموظف ---
 
 @app.route('/my_payslips')
 @login_required
 def my_payslips():
     employee_id = session.get('employee_id')
+    payslip_data = payslip_cache.get_months(employee_id)
+    if payslip_data is not None:
+        return render_template('my_payslips.html', payslip_data=payslip_data)
+
     payslip_data = {}
-    conn = get_connection()
-    if not conn:
-        flash("خطأ في الاتصال بقاعدة البيانات.", "error")
-    else:
-        try:
-            cursor = conn.cursor()
-            query = """
-                SELECT DISTINCT PayYear, PayMonth 
-                FROM Payslips 
-                WHERE EmployeeID = ? 
-                ORDER BY PayYear DESC, PayMonth DESC
-            """
-            cursor.execute(query, employee_id)
-            
-            for row in cursor.fetchall():
-                year = row.PayYear
-                month = row.PayMonth
-
-                # --- هذا هو التعديل الهام ---
-                # إذا كانت السنة أو الشهر فارغًا في قاعدة البيانات، تجاهل هذا السجل تمامًا
-                if not year or not month:
-                    continue  # انتقل إلى السجل التالي
-
-                if year not in payslip_data:
-                    payslip_data[year] = []
-                payslip_data[year].append(month)
-            
-            conn.close()
-        except Exception as e:
-            flash(f"حدث خطأ أثناء جلب بيانات رواتبك: {e}", "error")
+    with db_connection() as conn:
+        if not conn:
+            flash("خطأ في الاتصال بقاعدة البيانات.", "error")
+        else:
+            try:
+                payslip_data = employee_months(conn, employee_id, payroll_archive.employee_months(employee_id))
+                payslip_cache.set_months(employee_id, payslip_data)
+            except Exception as e:
+                flash(f"حدث خطأ أثناء جلب بيانات رواتبك: {e}", "error")
             
     return render_template('my_payslips.html', payslip_data=payslip_data)
 
-# --- دالة مساعدة لتنظيم بيانات الراتب (الإصدار النهائي مع الحساب التلقائي) ---
-def process_payslip_data(raw_data):
-    non_salary_cols = [
-        'PayslipID', 'EmployeeID', 'EmployeeName', 'NationalID', 'Role', 'JobTitle',
-        'CostCenterCode', 'CostCenterName', 'Department', 'MobileNumber', 'PayMonth', 'PayYear',
-        'TotalAllowances', 'TotalEntitlements', 'TotalDeductions', 'NetSalary', # سنتجاهل الصافي من الملف
-        'PreviousInsurancePeriod'
-    ]
-    
-    arabic_map = {v: k for k, v in COLUMN_MAPPING.items()}
-
-    # --- بداية التعديل الهام ---
-    
-    # 1. جلب الإجماليات وتحويلها إلى أرقام بشكل آمن
-    total_entitlements = float(raw_data.get('TotalEntitlements', 0) or 0)
-    total_deductions = float(raw_data.get('TotalDeductions', 0) or 0)
-    
-    # 2. حساب صافي المرتب الصحيح
-    calculated_net_salary = total_entitlements + total_deductions
-    
-    # 3. تحديث البيانات الخام بالقيمة الصحيحة
-    raw_data['NetSalary'] = calculated_net_salary
-
-    payslip = {
-        'raw_data': raw_data, # الآن تحتوي على الصافي الصحيح
-        'entitlements': {},
-        'deductions': {},
-        'totals': {
-            'إجمالي الاستحقاقات': total_entitlements,
-            'إجمالي الاستقطاعات': total_deductions
-        }
-    }
-    # --- نهاية التعديل الهام ---
-
-    for db_col_name, value in raw_data.items():
-        if db_col_name in non_salary_cols:
-            continue
-        
-        try:
-            numeric_value = float(value)
-            if numeric_value > 0:
-                arabic_name = arabic_map.get(db_col_name, db_col_name)
-                payslip['entitlements'][arabic_name] = numeric_value
-            elif numeric_value < 0:
-                arabic_name = arabic_map.get(db_col_name, db_col_name)
-                # نعرض الاستقطاعات كأرقام موجبة لتجنب علامة السالب المزدوجة
-                payslip['deductions'][arabic_name] = abs(numeric_value) 
-        except (ValueError, TypeError):
-            continue
-            
-    return payslip
+def snapshot_is_current(snapshot, year, month):
+    # لقطة بلا بصمة (قديمة) أو ببصمة مختلفة عن قاعدة البيانات: القراءة من قاعدة البيانات
+    key = f"{year}|{month}|"
+    stamp = snapshot_stamps.get(key)
+    if stamp is None:
+        with db_connection() as conn:
+            if not conn:
+                return False
+            stamp = month_stamp(conn, year, month)
+        if stamp is None:
+            return False
+        snapshot_stamps.set(key, stamp)
+    return snapshot.stamp == stamp
 
 # --- مسار عرض تفاصيل راتب الموظف ---
 @app.route('/my_payslips/<int:year>/<month>')
 @login_required
 def my_payslip_detail(year, month):
     employee_id = session.get('employee_id')
-    payslip_details = None
-    
-    conn = get_connection()
-    if not conn:
-        flash("خطأ في الاتصال بقاعدة البيانات.", "error")
-    else:
-        try:
-            cursor = conn.cursor()
-            query = "SELECT * FROM Payslips WHERE EmployeeID = ? AND PayYear = ? AND PayMonth = ?"
-            cursor.execute(query, employee_id, year, month)
-            
-            # تحويل الصف إلى قاموس (dictionary)
-            columns = [column[0] for column in cursor.description]
-            raw_data = cursor.fetchone()
-            
-            if raw_data:
-                raw_data_dict = dict(zip(columns, raw_data))
-                # معالجة البيانات باستخدام الدالة المساعدة
-                payslip_details = process_payslip_data(raw_data_dict)
-            
-            conn.close()
-        except Exception as e:
-            flash(f"حدث خطأ أثناء جلب تفاصيل راتبك: {e}", "error")
+    payslip_details = payslip_cache.get_payslip(employee_id, year, month)
+    if payslip_details:
+        return render_template('my_payslip_detail.html', payslip=payslip_details)
+
+    with payslip_snapshots.reading(year, month) as snapshot:
+        from_snapshot = snapshot is not None and snapshot_is_current(snapshot, year, month)
+        if from_snapshot:
+            # الشهر منشور: القسيمة من ملف اللقطة بأعمدتها المحفوظة، بدون استعلام القسيمة
+            raw_data_dict = snapshot.get(employee_id)
+            if raw_data_dict:
+                payslip_details = compiled_layout(snapshot.columns, snapshot.money_columns).process(raw_data_dict)
+                payslip_cache.set_payslip(employee_id, year, month, payslip_details)
+    if not from_snapshot:
+        payslip_details = payslip_from_db(employee_id, year, month)
 
     if not payslip_details:
         flash("لم يتم العثور على بيانات راتب لهذا الشهر.", "error")
@@ -520,6 +836,30 @@ def my_payslip_detail(year, month):
 
     return render_template('my_payslip_detail.html', payslip=payslip_details)
 
+def payslip_from_db(employee_id, year, month):
+    payslip_details = None
+    with db_connection() as conn:
+        if not conn:
+            flash("خطأ في الاتصال بقاعدة البيانات.", "error")
+        else:
+            try:
+                # تصنيف الأعمدة المحسوب مسبقًا لقائمة الأعمدة الحالية (من الذاكرة المؤقتة)
+                layout = compiled_layout(schema_cache.columns(conn, 'Payslips'),
+                                         schema_cache.typed_columns(conn, 'Payslips', 'decimal'))
+                # الأعمدة التي تعرضها القسيمة فقط (بدون PayslipID والصافي المحسوب)
+                columns = layout.detail_columns
+                if payroll_archive.has_month(year, month):
+                    raw_data_dict = payroll_archive.employee_payslip(employee_id, year, month, columns)
+                else:
+                    raw_data_dict = employee_payslip(conn, employee_id, year, month, columns)
+            
+                if raw_data_dict:
+                    payslip_details = layout.process(raw_data_dict)
+                    payslip_cache.set_payslip(employee_id, year, month, payslip_details)
+            except Exception as e:
+                flash(f"حدث خطأ أثناء جلب تفاصيل راتبك: {e}", "error")
+    return payslip_details
+
 
 @app.route('/complaints')
 @login_required
@@ -529,7 +869,9 @@ def complaints():
 
 @app.route('/logout')
 def logout():
+    # حذف الجلسة من المخزن: رقم الجلسة القديم لم يعد صالحًا حتى لو بقي في المتصفح
     session.clear()
+    session.regenerate()
     flash("تم تسجيل الخروج بنجاح.", "success")
     return redirect(url_for('login'))
 
@@ -538,10 +880,84 @@ def logout():
 @app.route('/')
 @login_required
 def dashboard():
-    print(f"DEBUG: دور المستخدم الحالي في الجلسة هو: '{session.get('role')}'") 
     return render_template('dashboard.html')
     
 
+@app.cli.command('migrate')
+def migrate_command():
+    # تنفيذ ترحيلات قاعدة البيانات المعلقة (الفهارس وغيرها)
+    with db_pool.connection() as conn:
+        applied = backend.migrate(conn)
+    if applied:
+        # قد تكون الترحيلات غيرت أنواع الأعمدة: إبطال ذاكرة الهيكل في كل العمال
+        schema_cache.invalidate()
+    click.echo(f"Applied migrations: {applied or 'none'}")
+
+@app.cli.command('archive-months')
+@click.option('--keep', type=int, default=None, help='عدد الأشهر الأحدث التي تبقى في الجدول')
+@click.option('--year', type=int, default=None)
+@click.option('--month', default=None)
+def archive_months_command(keep, year, month):
+    # نقل الأشهر المغلقة (أو شهر محدد) من جدول Payslips إلى ملفات Parquet
+    if not ARCHIVE_DIR:
+        raise click.ClickException(
+            "ARCHIVE_DIR is not set. Archiving deletes months from the Payslips table, so the archive "
+            "must live on durable storage (a mounted volume or network share), not the app's instance folder."
+        )
+    with db_pool.connection() as conn:
+        if year and month:
+            periods = [(year, month)]
+        else:
+            periods = payroll_archive.closed_months(conn, ARCHIVE_KEEP_MONTHS if keep is None else keep)
+        dimensions = summary_dimensions(schema_cache.column_set(conn, 'Employees'))
+        for pay_year, pay_month in periods:
+            report = payroll_archive.archive_month(conn, pay_year, pay_month, dimensions)
+            payslip_cache.invalidate_month(pay_year, pay_month)
+            click.echo(f"Archived {pay_year}/{pay_month}: {report}")
+    if not periods:
+        click.echo("No closed months to archive")
+
+@app.cli.command('restore-month')
+@click.argument('year', type=int)
+@click.argument('month')
+def restore_month_command(year, month):
+    # إعادة شهر مؤرشف إلى جدول Payslips (قبل إعادة رفعه مثلاً)
+    with db_pool.connection() as conn:
+        report = payroll_archive.restore_month(conn, year, month, schema_cache.column_set(conn, 'Payslips'))
+    payslip_cache.invalidate_month(year, month)
+    click.echo(f"Restored {year}/{month}: {report['rows']} payslips")
+
+@app.cli.command('publish-month')
+@click.argument('year', type=int)
+@click.argument('month')
+@click.option('--unpublish', is_flag=True, help='حذف اللقطة والعودة للقراءة من قاعدة البيانات')
+def publish_month_command(year, month, unpublish):
+    # لقطة الشهر للقراءة السريعة يوم الصرف (تُنشر تلقائيًا بعد الرفع إن كان PUBLISH_AFTER_UPLOAD=1)
+    if unpublish:
+        click.echo(f"Unpublished {year}/{month}: {payslip_snapshots.unpublish(year, month)}")
+        return
+    report = publish_month(year, month)
+    click.echo(f"Published {year}/{month}: {report['payslips']} payslips, {report['bytes']} bytes")
+
+@app.cli.command('payslip-pdfs')
+@click.argument('year', type=int)
+@click.argument('month')
+@click.option('--output', default=None, help='مجلد الإخراج')
+@click.option('--by-department', is_flag=True, help='ملف zip لكل إدارة')
+@click.option('--workers', type=int, default=None)
+def payslip_pdfs_command(year, month, output, by_department, workers):
+    # توليد قسائم الشهر مباشرة من سطر الأوامر (بدون طابور المهام)
+    output = output or os.path.join(PDF_OUTPUT_DIR, f"{year}_{month}")
+    with db_pool.connection() as conn:
+        report = generate_month_pdfs(
+            conn, year, month, schema_cache.columns(conn, 'Payslips'),
+            schema_cache.column_set(conn, 'Employees'), output, by_department=by_department,
+            workers=workers or PDF_WORKERS, font_path=PDF_FONT_PATH,
+            money_columns=schema_cache.typed_columns(conn, 'Payslips', 'decimal'),
+        )
+    click.echo(f"Rendered {report['payslips']} payslips in {report['seconds']}s "
+          f"({report['payslips_per_sec']}/s, {report['workers']} workers) -> {output}: {report['files']}")
+
 # --- 7. تشغيل التطبيق ---
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,214 @@
+# --- تحليلات الرواتب للمدير ---
+# أعمدة المبالغ للشهر تُحمّل مرة واحدة في DataFrame (مع الإدارة ومركز التكلفة من جدول
+# الموظفين) وكل التجميعات تُحسب عليه بعمليات pandas/NumPy على الأعمدة كاملة: الإجماليات،
+# التوزيع حسب الإدارة ومركز التكلفة، وكل بند من بنود COLUMN_MAPPING. نتيجة كل شهر تُحفظ في
+# AnalyticsCache فلا يُعاد مسح جدول Payslips مع كل فتح للوحة، والمقارنة بين الأشهر تُبنى من
+# نتائج الأشهر المحفوظة.
+import numpy as np
+import pandas as pd
+
+from archive import period_key
+from payroll_columns import COLUMN_MAPPING, is_money_column
+from payroll_export import export_header, month_rows
+from payroll_summary import summary_months
+from payslip_cache import LRUCache, VersionFile
+from storage import quote_ident
+
+# البعد في جدول الموظفين -> مفتاحه في النتيجة (التوزيع حسب بيانات الموظف الحالية)
+ANALYTICS_DIMENSIONS = {'Department': 'by_department', 'CostCenterCode': 'by_cost_center_code'}
+TOTAL_COLUMNS = ['BasicSalary', 'TotalEntitlements', 'TotalDeductions', 'NetSalary']
+# كل بنود الراتب المعروفة (المبالغ) بترتيب الشيت
+COMPONENT_COLUMNS = [c for c in dict.fromkeys(COLUMN_MAPPING.values()) if is_money_column(c)]
+MAX_TREND_MONTHS = 60
+
+
+def _money(value):
+    return None if value is None or pd.isna(value) else round(float(value), 2)
+
+
+def _numeric(df, columns):
+    # تحويل كل أعمدة المبالغ دفعة واحدة (Decimal أو نص أو أرقام) إلى float، والفارغ NaN
+    return df[columns].apply(pd.to_numeric, errors='coerce').astype(np.float64)
+
+
+def employee_dimensions(conn, employee_columns):
+    # أبعاد كل الموظفين (الإدارة، كود مركز التكلفة): تُحمّل مرة واحدة لكل طلب وتُمرر لكل شهر
+    dims = [d for d in ANALYTICS_DIMENSIONS if d in employee_columns]
+    if not dims:
+        return pd.DataFrame(columns=['EmployeeID']), dims
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT EmployeeID, {', '.join(quote_ident(d) for d in dims)} FROM Employees")
+    frame = pd.DataFrame([tuple(row) for row in cursor.fetchall()], columns=['EmployeeID'] + dims)
+    frame['EmployeeID'] = frame['EmployeeID'].astype(str)
+    return frame, dims
+
+
+def load_month_frame(conn, archive, year, month, payslip_columns, dimensions):
+    # صف لكل موظف: أعمدة المبالغ (float) + أبعاد الموظف؛ الشهر المؤرشف من ملفه
+    # dimensions: نتيجة employee_dimensions
+    components = [c for c in COMPONENT_COLUMNS if c in payslip_columns]
+    columns = ['EmployeeID'] + components
+    if archive is not None and archive.has_month(year, month):
+        rows = archive.month_rows(year, month, columns)
+    else:
+        rows = month_rows(conn, year, month, columns)
+    df = pd.DataFrame([tuple(row) for row in rows], columns=columns)
+    values = _numeric(df, components)
+    values.insert(0, 'EmployeeID', df['EmployeeID'].astype(str))
+    dimensions, dims = dimensions
+    frame = values.merge(dimensions, on='EmployeeID', how='left')
+    for dim in dims:
+        frame[dim] = frame[dim].fillna('').astype(str)
+    return frame, components, dims
+
+
+def month_analytics(frame, year, month, components, dims):
+    if frame.empty:
+        return None
+    money = frame[components]
+    sums = money.sum()
+    result = {
+        'year': year,
+        'month': month,
+        'headcount': int(frame['EmployeeID'].nunique()),
+        'totals': {c: _money(sums[c]) for c in TOTAL_COLUMNS if c in sums},
+    }
+
+    net = 'NetSalary' if 'NetSalary' in components else None
+    for dim, key in ANALYTICS_DIMENSIONS.items():
+        if dim not in dims:
+            continue
+        grouped = frame.groupby(dim, sort=False)
+        table = grouped[[c for c in TOTAL_COLUMNS if c in components]].sum()
+        table['headcount'] = grouped['EmployeeID'].nunique()
+        if net:
+            table = table.sort_values(net, ascending=False)
+        result[key] = [
+            {'name': name, 'headcount': int(row['headcount']),
+             'totals': {c: _money(row[c]) for c in TOTAL_COLUMNS if c in row}}
+            for name, row in table.iterrows()
+        ]
+
+    # لكل بند: الإجمالي، عدد الموظفين الذين يستحقونه، المتوسط بينهم، ونسبته من الصافي
+    paid = (money.notna() & (money != 0)).sum()
+    net_total = sums[net] if net else 0
+    result['components'] = [
+        {'column': c, 'label': export_header(c), 'total': _money(sums[c]), 'employees': int(paid[c]),
+         'average': _money(sums[c] / paid[c]) if paid[c] else None,
+         'share_of_net': round(float(sums[c] / net_total), 4) if net_total else None}
+        for c in components if paid[c]
+    ]
+    return result
+
+
+def month_deltas(months):
+    # months: نتائج month_analytics مرتبة من الأقدم للأحدث؛ الفرق والنسبة عن الشهر السابق
+    # لعدد الموظفين والإجماليات وكل بند، محسوبة على جدول (شهر × عمود) مرة واحدة
+    if not months:
+        return []
+    totals = pd.DataFrame([dict(m['totals'], headcount=m['headcount']) for m in months], dtype=np.float64)
+    components = pd.DataFrame([{c['column']: c['total'] for c in m['components']} for m in months],
+                              dtype=np.float64)
+    change = totals.diff()
+    pct = totals.pct_change(fill_method=None).replace([np.inf, -np.inf], np.nan)
+    component_change = components.fillna(0).diff()
+    trend = []
+    for i, m in enumerate(months):
+        entry = {'year': m['year'], 'month': m['month'], 'headcount': m['headcount'], 'totals': m['totals']}
+        if i:
+            entry['change'] = {c: _money(change.at[i, c]) for c in totals.columns}
+            entry['change_pct'] = {c: None if pd.isna(pct.at[i, c]) else round(float(pct.at[i, c]), 4)
+                                   for c in totals.columns}
+            # البنود التي تغيرت فعلاً، الأكبر أثرًا أولاً
+            moved = component_change.iloc[i]
+            moved = moved[moved != 0]
+            moved = moved.reindex(moved.abs().sort_values(ascending=False).index)
+            entry['component_change'] = [{'column': c, 'label': export_header(c), 'change': _money(v)}
+                                         for c, v in moved.items()]
+        trend.append(entry)
+    return trend
+
+
+def recent_months(conn, count):
+    # آخر count شهرًا لها ملخص (تشمل الأشهر المؤرشفة) من الأقدم للأحدث
+    periods = [(year, month) for year, months in summary_months(conn).items() for month in months]
+    periods.sort(key=lambda p: period_key(*p))
+    return periods[-max(1, min(count, MAX_TREND_MONTHS)):]
+
+
+def employee_history(conn, archive, employee_id, payslip_columns):
+    # كل أشهر الموظف (الحية والمؤرشفة) في جدول واحد: البنود لكل شهر والتغير في الصافي
+    components = [c for c in COMPONENT_COLUMNS if c in payslip_columns]
+    # بدون أعمدة بنود (جدول لم تُضف له أعمدة المبالغ بعد) تبقى الأشهر وحدها
+    select_list = ", ".join(['PayYear', 'PayMonth'] + [quote_ident(c) for c in components])
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {select_list} FROM Payslips WHERE EmployeeID = ?", (employee_id,))
+    rows = [tuple(row) for row in cursor.fetchall()]
+    if archive is not None:
+        for year, month in archive.employee_months(employee_id):
+            record = archive.employee_payslip(employee_id, year, month, components)
+            if record:
+                rows.append((year, month) + tuple(record[c] for c in components))
+    if not rows:
+        return None
+
+    df = pd.DataFrame(rows, columns=['PayYear', 'PayMonth'] + components)
+    df['_order'] = [period_key(y, m) for y, m in zip(df['PayYear'], df['PayMonth'])]
+    df = df.sort_values('_order').reset_index(drop=True)
+    values = _numeric(df, components)
+    net = values['NetSalary'] if 'NetSalary' in values else pd.Series(np.nan, index=values.index)
+    net_change = net.diff()
+    active = values.columns[(values.notna() & (values != 0)).any()]
+
+    history = []
+    for i in range(len(df)):
+        row = values.iloc[i]
+        history.append({
+            'year': int(df.at[i, 'PayYear']),
+            'month': str(df.at[i, 'PayMonth']),
+            'totals': {c: _money(row[c]) for c in TOTAL_COLUMNS if c in row},
+            'net_change': _money(net_change.iat[i]),
+            'components': {c: _money(row[c]) for c in active if not pd.isna(row[c]) and row[c] != 0},
+        })
+    return {
+        'employee_id': str(employee_id),
+        'months': history,
+        'average_net': _money(net.mean()),
+        'labels': {c: export_header(c) for c in active},
+    }
+
+
+class AnalyticsCache:
+    # نتيجة كل شهر في LRU داخل كل عامل؛ رفع الشهر يغير ملف إصداره (وتعديل بيانات الموظفين
+    # يغير الإصدار العام لأن التوزيع حسب الإدارة يعتمد عليها) فتُهمل النتيجة في كل العمال
+    GLOBAL_VERSION = "all"
+
+    def __init__(self, max_entries=256, ttl=3600, version_dir=None):
+        self.local = LRUCache(max_entries, ttl)
+        self.version_dir = version_dir
+
+    def _version(self, name):
+        return VersionFile.named(self.version_dir, name).version()
+
+    def _touch(self, name):
+        VersionFile.named(self.version_dir, name).touch()
+
+    def _key(self, year, month):
+        return f"{year}|{month}|{self._version(f'{year}_{month}')}|{self._version(self.GLOBAL_VERSION)}"
+
+    def get(self, year, month):
+        return self.local.get(self._key(year, month))
+
+    def set(self, year, month, result):
+        self.local.set(self._key(year, month), result)
+
+    def invalidate_month(self, year, month):
+        self._touch(f"{year}_{month}")
+        self.local.delete_prefix(f"{year}|{month}|")
+
+    def invalidate(self):
+        self._touch(self.GLOBAL_VERSION)
+        self.local.delete_prefix("")
+
+    def stats(self):
+        return {'entries': len(self.local), 'hits': self.local.hits, 'misses': self.local.misses}
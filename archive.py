@@ -0,0 +1,334 @@
+# --- أرشيف الأشهر المغلقة (Parquet) ---
+# جدول Payslips يكبر كل شهر بقوة العمل كاملة، والأشهر القديمة نادرًا ما تُقرأ. الأرشفة تنقل
+# الشهر المغلق إلى ملف Parquet مضغوط (مرتب برقم الموظف على مجموعات صفوف صغيرة) وتحذفه من
+# الجدول الحي، مع فهرس SQLite صغير: الأشهر المؤرشفة وأشهر كل موظف.
+# صفحات الموظف وصفحة المدير والتصدير تقرأ الشهر المؤرشف من ملفه بنفس شكل نتيجة الاستعلام،
+# وملخص الشهر (PayrollMonthSummary) يبقى في قاعدة البيانات كما هو.
+# الملفات هي النسخة الوحيدة من الشهر بعد حذفه من الجدول: مجلد الأرشيف يجب أن يكون على
+# تخزين دائم (قرص مُلحق أو مجلد شبكة)، وليس نظام ملفات مؤقت مثل مجلد التطبيق على Heroku.
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from contextlib import closing
+
+from listings import DEFAULT_PAGE_SIZE, FILTER_COLUMNS, PAYSLIP_LIST_COLUMNS, decode_cursor, encode_cursor
+from payroll_summary import month_summary, refresh_month_summary
+from payslip_cache import LRUCache, VersionFile
+from storage import dialect_of, quote_ident
+
+ARCHIVE_ROW_GROUP_SIZE = 2000  # قراءة قسيمة موظف واحد تفك مجموعة صفوف واحدة فقط
+ARCHIVE_COMPRESSION = 'zstd'
+RESTORE_BATCH_SIZE = 1000
+PAGE_CACHE_MONTHS = 4  # أشهر مؤرشفة تبقى قائمتها المرتبة في ذاكرة كل عامل
+# أعمدة لا تُنقل للأرشيف: رقم الصف يولده الجدول عند الاسترجاع
+SKIPPED_COLUMNS = {'PayslipID'}
+
+
+def period_key(year, month):
+    # ترتيب الأشهر: الأرقام رقميًا ('2' قبل '10')، وغيرها نصيًا
+    month = str(month)
+    return int(year), int(month) if month.isdigit() else 0, month
+
+
+def _file_name(year, month):
+    return f"payslips_{int(year)}_{re.sub(r'[^0-9A-Za-z_-]', '_', str(month))}.parquet"
+
+
+def _table_digest(table):
+    # بصمة محتوى الجدول عمودًا عمودًا: نفس القيم تعطي نفس البصمة مهما كان تقسيم مجموعات الصفوف
+    digest = hashlib.sha256()
+    for name in table.column_names:
+        digest.update(name.encode('utf-8'))
+        digest.update(repr(table.column(name).to_pylist()).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _arrow_safe(df):
+    # أعمدة object بأنواع مختلطة (نص وأرقام في SQLite مثلاً) تُحفظ كنص بدلاً من رفض الملف
+    import pyarrow as pa
+
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[col] = df[col].map(lambda v: v if v is None else str(v))
+    return df
+
+
+class PayrollArchive:
+    def __init__(self, directory, version_path=None):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.db")
+        self.version_file = VersionFile(version_path or os.path.join(directory, "archive.version"))
+        self._lock = threading.Lock()
+        self._months = None
+        self._months_version = None
+        self._file_columns = {}
+        self._listings = LRUCache(PAGE_CACHE_MONTHS, ttl=3600)
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS ArchivedMonths (
+                    PayYear INTEGER NOT NULL,
+                    PayMonth TEXT NOT NULL,
+                    File TEXT NOT NULL,
+                    Rows INTEGER NOT NULL,
+                    Bytes INTEGER NOT NULL,
+                    ArchivedAt REAL NOT NULL,
+                    PRIMARY KEY (PayYear, PayMonth)
+                )
+            """)
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS ArchivedEmployees (
+                    EmployeeID TEXT NOT NULL,
+                    PayYear INTEGER NOT NULL,
+                    PayMonth TEXT NOT NULL,
+                    PRIMARY KEY (EmployeeID, PayYear, PayMonth)
+                )
+            """)
+            db.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    # --- الأشهر المؤرشفة (محفوظة في كل عامل وتُبطل عبر ملف الإصدار) ---
+    def months(self):
+        # {(السنة، الشهر): اسم الملف}
+        version = self.version_file.version()
+        with self._lock:
+            if self._months is None or self._months_version != version:
+                with closing(self._connect()) as db:
+                    rows = db.execute("SELECT PayYear, PayMonth, File FROM ArchivedMonths").fetchall()
+                self._months = {(year, month): name for year, month, name in rows}
+                self._months_version = version
+            return self._months
+
+    def has_month(self, year, month):
+        return (int(year), str(month)) in self.months()
+
+    def _path(self, year, month):
+        return os.path.join(self.directory, self.months()[(int(year), str(month))])
+
+    def _columns(self, path):
+        # أعمدة كل ملف (الأعمدة التي أضيفت للجدول بعد أرشفته تُرجع فارغة)
+        columns = self._file_columns.get(path)
+        if columns is None:
+            import pyarrow.parquet as pq
+
+            columns = self._file_columns[path] = set(pq.ParquetFile(path).schema_arrow.names)
+        return columns
+
+    def archived_months(self):
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT PayYear, PayMonth, File, Rows, Bytes, ArchivedAt FROM ArchivedMonths"
+            ).fetchall()
+        rows.sort(key=lambda r: period_key(r[0], r[1]), reverse=True)
+        return [{'year': r[0], 'month': r[1], 'file': r[2], 'rows': r[3], 'bytes': r[4], 'archived_at': r[5]}
+                for r in rows]
+
+    # --- القراءة ---
+    def employee_months(self, employee_id):
+        # [(السنة، الشهر)] من الأحدث للأقدم، بنفس شكل صفوف employee_months
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT PayYear, PayMonth FROM ArchivedEmployees WHERE EmployeeID = ?", (str(employee_id),)
+            ).fetchall()
+        return sorted(rows, key=lambda r: period_key(*r), reverse=True)
+
+    def employee_payslip(self, employee_id, year, month, columns):
+        import pyarrow.parquet as pq
+
+        path = self._path(year, month)
+        present = [c for c in columns if c in self._columns(path)]
+        # الفلتر على EmployeeID يتخطى مجموعات الصفوف التي لا تحتويه (الملف مرتب به)
+        table = pq.read_table(path, columns=present, filters=[('EmployeeID', '==', str(employee_id))])
+        if not table.num_rows:
+            return None
+        record = table.slice(0, 1).to_pylist()[0]
+        return {c: record.get(c) for c in columns}
+
+    def month_rows(self, year, month, columns, batch_size=RESTORE_BATCH_SIZE):
+        # مولّد صفوف الشهر مرتبة برقم الموظف، مجموعة صفوف بعد الأخرى (مثل month_rows)
+        import pyarrow.parquet as pq
+
+        path = self._path(year, month)
+        present = [c for c in columns if c in self._columns(path)]
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=present):
+            for record in batch.to_pylist():
+                yield tuple(record.get(c) for c in columns)
+
+    def _listing(self, year, month):
+        # قائمة الشهر (أعمدة القائمة فقط) مرتبة بالاسم ثم رقم الموظف، تُقرأ من الملف مرة واحدة
+        # لكل إصدار للأرشيف بدلاً من قراءة الملف وترتيبه مع كل صفحة
+        key = f"{self.version_file.version()}|{int(year)}|{month}"
+        listing = self._listings.get(key)
+        if listing is None:
+            import pyarrow.parquet as pq
+
+            path = self._path(year, month)
+            present = [c for c in PAYSLIP_LIST_COLUMNS if c in self._columns(path)]
+            rows = [{c: record.get(c) for c in PAYSLIP_LIST_COLUMNS}
+                    for record in pq.read_table(path, columns=present).to_pylist()]
+            rows.sort(key=lambda r: (r['EmployeeName'] or '', r['EmployeeID']))
+            listing = (rows, [(r['EmployeeName'] or '', r['EmployeeID']) for r in rows])
+            self._listings.set(key, listing)
+        return listing
+
+    def payslip_page(self, conn, year, month, employee_columns, filters=None, cursor_token=None,
+                     page_size=DEFAULT_PAGE_SIZE):
+        # نفس نتيجة listings.payslip_page: قائمة الشهر المرتبة من _listing تُصفى في الذاكرة،
+        # وفلاتر الإدارة/مركز التكلفة من جدول الموظفين الحي
+        filters = filters or {}
+        rows, keys = self._listing(year, month)
+        after = decode_cursor(cursor_token)
+        if after:
+            after = (after[0], str(after[1]))
+            # الصفوف مرتبة: الصفحة التالية تبدأ بعد المؤشر مباشرة (بحث ثنائي)
+            start = bisect_right(keys, after)
+            rows = rows[start:]
+
+        clauses, params = [], []
+        for key, column in FILTER_COLUMNS.items():
+            if filters.get(key) and column in employee_columns:
+                clauses.append(f"[{column}] = ?")
+                params.append(filters[key])
+        if clauses:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT EmployeeID FROM Employees WHERE {' AND '.join(clauses)}", params)
+            allowed = {str(row[0]) for row in cursor.fetchall()}
+            rows = [r for r in rows if r['EmployeeID'] in allowed]
+        if filters.get('q'):
+            q = filters['q']
+            rows = [r for r in rows if q in (r['EmployeeName'] or '') or r['EmployeeID'].startswith(q)]
+
+        items = [dict(r) for r in rows[:page_size + 1]]
+        next_cursor = None
+        if len(items) > page_size:
+            items = items[:page_size]
+            next_cursor = encode_cursor(items[-1]['EmployeeName'] or '', items[-1]['EmployeeID'])
+        return {'items': items, 'next_cursor': next_cursor, 'page_size': page_size}
+
+    # --- الأرشفة والاسترجاع ---
+    def closed_months(self, conn, keep):
+        # كل الأشهر الحية ما عدا أحدث keep شهرًا
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT PayYear, PayMonth FROM Payslips WHERE PayYear IS NOT NULL AND PayMonth IS NOT NULL")
+        periods = sorted(((row[0], row[1]) for row in cursor.fetchall()), key=lambda p: period_key(*p), reverse=True)
+        return periods[keep:]
+
+    def archive_month(self, conn, year, month, dimensions):
+        # يُكتب الملف أولاً ثم يُقرأ من القرص ويُطابق بالصفوف، ثم الفهرس، ولا تُحذف الصفوف من الجدول إلا بعدها
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        year, month = int(year), str(month)
+        if self.has_month(year, month):
+            raise ValueError(f"الشهر {year}/{month} مؤرشف بالفعل")
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM Payslips WHERE PayYear = ? AND PayMonth = ? ORDER BY EmployeeID", (year, month))
+        names = [d[0] for d in cursor.description]
+        rows = [tuple(row) for row in cursor.fetchall()]
+        if not rows:
+            return None
+        # dtype=object حتى تبقى الأرقام الصحيحة مع القيم الفارغة أرقامًا صحيحة (وليس float)
+        df = pd.DataFrame(rows, columns=names, dtype=object)
+        df = df.drop(columns=[c for c in SKIPPED_COLUMNS if c in df.columns])
+        df['EmployeeID'] = df['EmployeeID'].astype(str)
+        df = _arrow_safe(df.sort_values('EmployeeID', kind='stable'))
+
+        name = _file_name(year, month)
+        path = os.path.join(self.directory, name)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, f"{path}.tmp", compression=ARCHIVE_COMPRESSION, row_group_size=ARCHIVE_ROW_GROUP_SIZE)
+        with open(f"{path}.tmp", 'rb') as f:
+            os.fsync(f.fileno())
+        self._verify_file(f"{path}.tmp", year, month, len(rows), _table_digest(table))
+        os.replace(f"{path}.tmp", path)
+        size = os.path.getsize(path)
+
+        with closing(self._connect()) as db:
+            db.execute(
+                "INSERT INTO ArchivedMonths (PayYear, PayMonth, File, Rows, Bytes, ArchivedAt) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (year, month, name, len(df), size, time.time())
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO ArchivedEmployees (EmployeeID, PayYear, PayMonth) VALUES (?, ?, ?)",
+                [(employee_id, year, month) for employee_id in df['EmployeeID'].unique()]
+            )
+            db.commit()
+        self.version_file.touch()
+
+        try:
+            # الملخص يبقى في قاعدة البيانات لصفحات المدير، فيُحسب قبل الحذف إن لم يكن محفوظًا
+            if month_summary(conn, year, month) is None:
+                refresh_month_summary(cursor, year, month, dimensions)
+            cursor.execute("DELETE FROM Payslips WHERE PayYear = ? AND PayMonth = ?", (year, month))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            self._forget(year, month, name)
+            raise
+        return {'year': year, 'month': month, 'rows': len(df), 'bytes': size, 'file': name}
+
+    def _verify_file(self, path, year, month, expected_rows, expected_digest):
+        # قراءة الملف المكتوب من القرص: عدد الصفوف وبصمة المحتوى يطابقان صفوف الجدول قبل الحذف
+        import pyarrow.parquet as pq
+
+        try:
+            written = pq.read_table(path)
+            matches = written.num_rows == expected_rows and _table_digest(written) == expected_digest
+        except Exception:
+            matches = False
+        if not matches:
+            os.remove(path)
+            raise ValueError(f"ملف أرشيف الشهر {year}/{month} لا يطابق صفوف الجدول، لم يُحذف الشهر من الجدول")
+
+    def restore_month(self, conn, year, month, payslip_columns):
+        # إعادة الشهر إلى الجدول الحي (مثلاً قبل إعادة رفعه) ثم حذفه من الأرشيف
+        import pyarrow.parquet as pq
+
+        year, month = int(year), str(month)
+        name = self.months()[(year, month)]
+        path = os.path.join(self.directory, name)
+        columns = [c for c in pq.ParquetFile(path).schema_arrow.names if c in payslip_columns]
+        query = (f"INSERT INTO Payslips ({', '.join(quote_ident(c) for c in columns)}) "
+                 f"VALUES ({', '.join('?' * len(columns))})")
+        cursor = conn.cursor()
+        if dialect_of(conn).fast_executemany:
+            cursor.fast_executemany = True
+        restored = 0
+        try:
+            cursor.execute("DELETE FROM Payslips WHERE PayYear = ? AND PayMonth = ?", (year, month))
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=RESTORE_BATCH_SIZE, columns=columns):
+                values = [tuple(record[c] for c in columns) for record in batch.to_pylist()]
+                cursor.executemany(query, values)
+                restored += len(values)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self._forget(year, month, name)
+        return {'year': year, 'month': month, 'rows': restored}
+
+    def _forget(self, year, month, name):
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM ArchivedEmployees WHERE PayYear = ? AND PayMonth = ?", (year, month))
+            db.execute("DELETE FROM ArchivedMonths WHERE PayYear = ? AND PayMonth = ?", (year, month))
+            db.commit()
+        self.version_file.touch()
+        path = os.path.join(self.directory, name)
+        self._file_columns.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,77 @@
+# --- قياس أداء توحيد بيانات الشيت: المرور صفًا صفًا مقابل العمليات على الأعمدة ---
+# التشغيل: python benchmarks/bench_normalize.py [عدد الصفوف]
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normalize import prepare_upload_frame, to_db_values
+from payroll_columns import COLUMN_MAPPING, EMPLOYEE_BASE_COLS, partition_columns
+
+
+def make_sheet(rows, seed=0):
+    # شيت صناعي بنفس رؤوس الأعمدة العربية وقيم نصية كما يقرأها pd.read_excel(dtype=str)
+    rng = np.random.default_rng(seed)
+    data = {}
+    for arabic, english in COLUMN_MAPPING.items():
+        if english == 'EmployeeID':
+            data[arabic] = np.arange(1, rows + 1).astype(str)
+        elif english == 'MobileNumber':
+            prefixes = rng.choice(['010', '+2011', '12', ''], size=rows)
+            data[arabic] = np.char.add(prefixes.astype(str), rng.integers(10000000, 99999999, rows).astype(str))
+        elif english in EMPLOYEE_BASE_COLS:
+            data[arabic] = np.char.add('value-', rng.integers(0, 500, rows).astype(str))
+        else:
+            amounts = rng.integers(-2000, 5000, rows).astype(str)
+            data[arabic] = np.where(rng.random(rows) < 0.4, '', amounts)
+    return pd.DataFrame(data)
+
+
+def legacy(df, employee_columns, payslip_columns):
+    # المنطق القديم داخل upload_payslips: iterrows + توحيد الهاتف + فلترة القيم الفارغة لكل صف
+    df = df.rename(columns={c: COLUMN_MAPPING.get(c, c.strip().replace(' ', '_')) for c in df.columns})
+    out = []
+    for _, row in df.iterrows():
+        if not row.get('EmployeeID'):
+            continue
+        if 'MobileNumber' in row and row['MobileNumber']:
+            phone = str(row['MobileNumber']).strip()
+            if phone.startswith('0'):
+                phone = '+2' + phone
+            elif not phone.startswith('+20'):
+                phone = '+20' + phone
+            row['MobileNumber'] = phone
+        employee_data = {k: v for k, v in row.items() if k in employee_columns and v != ''}
+        payslip_data = {k: v for k, v in row.items() if k in payslip_columns and v != ''}
+        out.append((employee_data, payslip_data))
+    return out
+
+
+def vectorized(df, employee_columns, payslip_columns):
+    df = prepare_upload_frame(df)
+    employee_cols, payslip_cols = partition_columns(df.columns, employee_columns, payslip_columns)
+    return to_db_values(df, employee_cols), to_db_values(df, payslip_cols)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    sheet = make_sheet(rows)
+    employee_columns = set(EMPLOYEE_BASE_COLS)
+    payslip_columns = set(COLUMN_MAPPING.values())
+
+    legacy_time = timed(legacy, sheet, employee_columns, payslip_columns)
+    vector_time = min(timed(vectorized, sheet, employee_columns, payslip_columns) for _ in range(3))
+    print(f"rows={rows} columns={sheet.shape[1]}")
+    print(f"legacy iterrows : {legacy_time:8.3f}s  ({rows / legacy_time:,.0f} rows/s)")
+    print(f"vectorized      : {vector_time:8.3f}s  ({rows / vector_time:,.0f} rows/s)")
+    print(f"speedup         : {legacy_time / vector_time:8.1f}x")
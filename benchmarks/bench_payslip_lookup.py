@@ -0,0 +1,60 @@
+# --- قياس زمن استعلامات صفحات الموظف مقابل حجم جدول الرواتب، بفهرس وبدونه ---
+# يستخدم SQLite محليًا كبديل لـ SQL Server حتى يعمل بدون خادم قاعدة بيانات.
+# التشغيل: python benchmarks/bench_payslip_lookup.py [عدد الموظفين] [أعداد الأشهر...]
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payroll_columns import COLUMN_MAPPING
+from payslip_layout import PayslipLayout
+from payslip_queries import employee_months, employee_payslip
+
+COLUMNS = ['PayslipID'] + list(dict.fromkeys(COLUMN_MAPPING.values())) + ['PayYear', 'PayMonth']
+LOOKUPS = 200
+
+
+def build_table(conn, employees, months):
+    cols = ", ".join(f"[{c}] {'INTEGER PRIMARY KEY' if c == 'PayslipID' else 'TEXT'}" for c in COLUMNS)
+    conn.execute("DROP TABLE IF EXISTS Payslips")
+    conn.execute(f"CREATE TABLE Payslips ({cols})")
+    data_cols = [c for c in COLUMNS if c != 'PayslipID']
+    insert = f"INSERT INTO Payslips ({', '.join(f'[{c}]' for c in data_cols)}) VALUES ({', '.join('?' * len(data_cols))})"
+    for m in range(months):
+        year, month = 2020 + m // 12, str(m % 12 + 1)
+        rows = []
+        for emp in range(1, employees + 1):
+            row = {c: str(random.randint(-500, 5000)) for c in data_cols}
+            row.update(EmployeeID=str(emp), PayYear=year, PayMonth=month, EmployeeName=f"employee {emp}")
+            rows.append([row[c] for c in data_cols])
+        conn.executemany(insert, rows)
+    conn.commit()
+
+
+def time_lookups(conn, employees, months):
+    detail_columns = PayslipLayout(COLUMNS).detail_columns
+    started = time.perf_counter()
+    for _ in range(LOOKUPS):
+        emp = str(random.randint(1, employees))
+        m = random.randrange(months)
+        employee_months(conn, emp)
+        employee_payslip(conn, emp, 2020 + m // 12, str(m % 12 + 1), detail_columns)
+    return (time.perf_counter() - started) / LOOKUPS * 1000
+
+
+if __name__ == '__main__':
+    employees = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    month_counts = [int(a) for a in sys.argv[2:]] or [3, 12, 36]
+    random.seed(0)
+    print(f"{'rows':>10} {'no index (ms)':>15} {'indexed (ms)':>14}")
+    for months in month_counts:
+        conn = sqlite3.connect(':memory:')
+        build_table(conn, employees, months)
+        no_index = time_lookups(conn, employees, months)
+        conn.execute("CREATE INDEX IX_Payslips_Employee_Period ON Payslips (EmployeeID, PayYear, PayMonth)")
+        indexed = time_lookups(conn, employees, months)
+        print(f"{employees * months:>10} {no_index:>15.3f} {indexed:>14.3f}")
+        conn.close()
@@ -0,0 +1,342 @@
+# --- اختبار تحميل لبوابة قسائم الرواتب ---
+# يملأ قاعدة SQLite محلية (DB_BACKEND=sqlite، انظر storage.py) بعدد موظفين × أشهر من
+# بيانات صناعية، ثم يشغل تطبيق Flask نفسه عبر test client بعدة مستخدمين متوازيين:
+# تسجيل الدخول (request_otp ثم verify_otp)، رواتبي، تفاصيل راتب، صفحة الشهر للمدير، ورفع شيت .xlsx.
+# يطبع p50/p95/p99 والإنتاجية لكل سيناريو ويقارنها بخط أساس محفوظ.
+# التشغيل: python benchmarks/load_test.py --employees 2000 --months 6 --users 8 [--save-baseline]
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from payroll_columns import COLUMN_MAPPING, EMPLOYEE_BASE_COLS, is_money_column
+from schema_sync import SchemaPlan, apply_plan
+from storage import SQLiteBackend
+
+PAYSLIP_COLUMNS = list(dict.fromkeys(COLUMN_MAPPING.values()))
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "load_test.json")
+SCENARIOS = ['login', 'my_payslips', 'my_payslip_detail', 'payslip_details', 'upload']
+DEPARTMENTS = ['الإنتاج', 'الصيانة', 'المخازن', 'الحسابات', 'الموارد البشرية']
+ADMIN_ID = '1'
+
+
+def phone_of(emp):
+    return f"+2010{emp:08d}"
+
+
+def periods(months):
+    return [(2024 + m // 12, str(m % 12 + 1)) for m in range(months)]
+
+
+def fake_value(col, emp, rng):
+    if col == 'EmployeeID':
+        return str(emp)
+    if col == 'EmployeeName':
+        return f"موظف {emp}"
+    if col == 'MobileNumber':
+        return phone_of(emp)
+    if col == 'Department':
+        return DEPARTMENTS[emp % len(DEPARTMENTS)]
+    if col == 'CostCenterName':
+        return f"مركز {emp % 20}"
+    if col == 'Role':
+        return 'admin' if str(emp) == ADMIN_ID else 'employee'
+    if col in EMPLOYEE_BASE_COLS or col == 'PreviousInsurancePeriod':
+        return f"{col}-{emp % 50}"
+    if not is_money_column(col) or rng.random() < 0.4:
+        return None
+    return rng.randint(-500, 5000) if 'Deduction' in col or 'Share' in col else rng.randint(0, 5000)
+
+
+def seed(path, employees, months, rng):
+    # الواجهة الخلفية تنشئ الجداول الأساسية، وباقي أعمدة الشيت تضاف كما تضيفها مزامنة الهيكل
+    backend = SQLiteBackend(path)
+    conn = backend.connect()
+    cursor = conn.cursor()
+    existing = {name for _, name, _ in backend.dialect.table_columns(cursor, ['Payslips'])}
+    additions = [c for c in PAYSLIP_COLUMNS if c not in existing]
+    apply_plan(conn, SchemaPlan((), additions, [c for c in additions if is_money_column(c)], backend.dialect))
+
+    emp_cols = EMPLOYEE_BASE_COLS
+    cursor.executemany(
+        f"INSERT INTO Employees ({', '.join(f'[{c}]' for c in emp_cols)}) VALUES ({', '.join('?' * len(emp_cols))})",
+        [[fake_value(c, emp, rng) for c in emp_cols] for emp in range(1, employees + 1)]
+    )
+    pay_cols = PAYSLIP_COLUMNS + ['PayYear', 'PayMonth']
+    insert = f"INSERT INTO Payslips ({', '.join(f'[{c}]' for c in pay_cols)}) VALUES ({', '.join('?' * len(pay_cols))})"
+    for year, month in periods(months):
+        cursor.executemany(insert, [[fake_value(c, emp, rng) for c in PAYSLIP_COLUMNS] + [year, month]
+                                    for emp in range(1, employees + 1)])
+
+    # ملخصات الأشهر كما يحسبها الرفع
+    from payroll_summary import refresh_month_summary
+    for year, month in periods(months):
+        refresh_month_summary(cursor, year, month, ['Department', 'CostCenterName'])
+    conn.commit()
+    conn.close()
+
+
+def make_sheet(path, employees, rng):
+    # شيت بنفس رؤوس الأعمدة العربية التي يرفعها قسم الرواتب
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    headers = list(COLUMN_MAPPING)
+    sheet.append(headers)
+    for emp in range(1, employees + 1):
+        row = [fake_value(COLUMN_MAPPING[h], emp, rng) for h in headers]
+        sheet.append(['' if v is None else str(v) for v in row])
+    workbook.save(path)
+
+
+def load_app(workdir, db_path, cold):
+    # كل ملفات الحالة المحلية داخل مجلد مؤقت (لا شيء يُكتب في instance/ الخاص بالتطبيق الحقيقي،
+    # مثل لقطة شهر صناعي تظهر بعدها بدلاً من قاعدة البيانات)، والرموز تُكتب في ملف بدلاً من الكونسول.
+    # المسارات تُحدد صراحة حتى لا يوجهها ملف .env إلى ملفات التطبيق الحقيقية
+    os.environ.update({
+        'SECRET_KEY': 'load-test',
+        'INSTANCE_PATH': os.path.join(workdir, 'instance'),
+        'DB_BACKEND': f"sqlite:{db_path}",
+        'DB_POOL_MAX': '8',
+        'SESSION_STORE': f"sqlite:{os.path.join(workdir, 'sessions.db')}",
+        'JOBS_DB_PATH': os.path.join(workdir, 'jobs.db'),
+        'METRICS_DB_PATH': os.path.join(workdir, 'metrics.db'),
+        'UPLOAD_DIR': os.path.join(workdir, 'uploads'),
+        'SNAPSHOT_DIR': os.path.join(workdir, 'snapshots'),
+        'ARCHIVE_DIR': os.path.join(workdir, 'archive'),
+        'PDF_OUTPUT_DIR': os.path.join(workdir, 'payslip_pdfs'),
+        'PAYSLIP_CACHE_DB': '',
+        'OTP_SENDER': f"file:{os.path.join(workdir, 'otp.log')}",
+        'OTP_RATE_LIMIT': '1000000/60',
+    })
+    if cold:
+        # بدون الذاكرة المؤقتة: كل طلب يصل إلى قاعدة البيانات
+        os.environ.update({'PAYSLIP_CACHE_SIZE': '0', 'IDENTITY_CACHE_SIZE': '0'})
+
+    import App
+    from jinja2 import ChoiceLoader, FunctionLoader
+
+    # القوالب غير موجودة في المستودع؟ قالب فارغ بدلاً منها حتى يُقاس عمل المسار نفسه
+    App.app.jinja_env.loader = ChoiceLoader([App.app.jinja_env.loader, FunctionLoader(lambda name: "")])
+    return App
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.wall = {}
+
+    def record(self, name, seconds, ok=True):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def timed(self, name, call, expect):
+        started = time.perf_counter()
+        try:
+            response = call()
+            ok = expect(response)
+        except Exception as e:
+            print(f"{name}: {e}")
+            response, ok = None, False
+        self.record(name, time.perf_counter() - started, ok)
+        return response
+
+
+def percentile(values, p):
+    # nearest-rank
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))]
+
+
+def login(App, recorder, emp):
+    client = App.app.test_client()
+    response = recorder.timed(
+        'request_otp',
+        lambda: client.post('/request_otp', data={'emp_id': str(emp), 'phone_number': phone_of(emp)}),
+        lambda r: r.status_code == 302 and r.headers['Location'].endswith('/verify_otp'),
+    )
+    if response is None:
+        return None
+    with client.session_transaction() as s:
+        login_id = s.get('otp_login')
+    record = App.kv_store.get(f"otp:{login_id}") if login_id else None
+    if not record:
+        return None
+    recorder.timed(
+        'verify_otp',
+        lambda: client.post('/verify_otp', data={'otp': record['code']}),
+        lambda r: r.status_code == 302 and r.headers['Location'] == '/',
+    )
+    return client
+
+
+def run_phase(recorder, name, users, requests, work):
+    # requests طلب موزعة على users thread، وزمن المرحلة كاملة لحساب الإنتاجية
+    per_user = max(1, requests // users)
+    threads = [threading.Thread(target=lambda i=i: [work(i, n) for n in range(per_user)]) for i in range(users)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    recorder.wall[name] = time.perf_counter() - started
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="payslip_load_")
+    db_path = os.path.join(workdir, "payroll.db")
+    started = time.perf_counter()
+    seed(db_path, args.employees, args.months, rng)
+    print(f"seeded {args.employees} employees × {args.months} months in {time.perf_counter() - started:.1f}s ({workdir})")
+
+    App = load_app(workdir, db_path, args.cold)
+    recorder = Recorder()
+    months = periods(args.months)
+    clients = {}
+    scenarios = args.scenarios
+
+    if 'login' in scenarios or set(scenarios) & {'my_payslips', 'my_payslip_detail'}:
+        def do_login(user, n):
+            started = time.perf_counter()
+            client = login(App, recorder, rng.randint(1, args.employees))
+            recorder.record('login', time.perf_counter() - started, client is not None)
+            if client is not None:
+                clients[user] = client
+        run_phase(recorder, 'login', args.users, args.requests, do_login)
+
+    if 'my_payslips' in scenarios:
+        run_phase(recorder, 'my_payslips', args.users, args.requests, lambda user, n: recorder.timed(
+            'my_payslips', lambda: clients[user].get('/my_payslips'), lambda r: r.status_code == 200))
+
+    if 'my_payslip_detail' in scenarios:
+        def detail(user, n):
+            year, month = rng.choice(months)
+            recorder.timed('my_payslip_detail', lambda: clients[user].get(f'/my_payslips/{year}/{month}'),
+                           lambda r: r.status_code == 200)
+        run_phase(recorder, 'my_payslip_detail', args.users, args.requests, detail)
+
+    admin = login(App, Recorder(), int(ADMIN_ID))
+    if 'payslip_details' in scenarios:
+        def details(user, n):
+            year, month = rng.choice(months)
+            recorder.timed('payslip_details', lambda: admin.get(f'/payslips/{year}/{month}'),
+                           lambda r: r.status_code == 200)
+        run_phase(recorder, 'payslip_details', args.users, args.requests, details)
+
+    if 'upload' in scenarios:
+        sheet = os.path.join(workdir, "sheet.xlsx")
+        make_sheet(sheet, args.upload_rows, rng)
+        year, month = months[-1]
+        for _ in range(args.uploads):
+            def post():
+                with open(sheet, 'rb') as f:
+                    return admin.post('/upload', data={
+                        'payslip_file': (f, 'payslips.xlsx'), 'pay_year': str(year), 'pay_month': month,
+                        'dry_run': '1' if args.dry_run_upload else '',
+                    }, content_type='multipart/form-data')
+            started = time.perf_counter()
+            response = recorder.timed('upload', post, lambda r: r.status_code == 302 and 'job=' in r.headers['Location'])
+            job_id = response.headers['Location'].split('job=')[-1] if response is not None else None
+            job = None
+            while job_id:
+                job = App.job_store.get(job_id)
+                if job['status'] in ('done', 'failed'):
+                    break
+                time.sleep(0.05)
+            # زمن الرفع كاملاً حتى تنتهي المهمة الخلفية
+            recorder.record('upload_job', time.perf_counter() - started, bool(job) and job['status'] == 'done')
+            if job and job['status'] != 'done':
+                print(f"upload job {job['status']}: {job.get('message')}")
+        recorder.wall['upload'] = sum(recorder.latencies.get('upload', []))
+
+    return summarize(recorder)
+
+
+def summarize(recorder):
+    results = {}
+    for name, values in recorder.latencies.items():
+        if not values:
+            continue
+        wall = recorder.wall.get(name)
+        results[name] = {
+            'requests': len(values),
+            'errors': recorder.errors.get(name, 0),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'rps': round(len(values) / wall, 1) if wall else None,
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # تراجع: p95 أبطأ أو إنتاجية أقل من خط الأساس بأكثر من النسبة المسموحة
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if current['rps'] and base.get('rps') and current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: {current['rps']} req/s < baseline {base['rps']} req/s")
+    return regressions
+
+
+def print_table(results, baseline):
+    print(f"{'scenario':<20} {'n':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'base p95':>9}")
+    for name, r in results.items():
+        base = baseline.get(name, {}).get('p95_ms', '')
+        print(f"{name:<20} {r['requests']:>6} {r['errors']:>5} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} "
+              f"{r['rps'] if r['rps'] is not None else '':>8} {base:>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Payslip portal load test")
+    parser.add_argument('--employees', type=int, default=2000)
+    parser.add_argument('--months', type=int, default=6)
+    parser.add_argument('--users', type=int, default=8, help="concurrent virtual users (threads)")
+    parser.add_argument('--requests', type=int, default=400, help="requests per scenario")
+    parser.add_argument('--scenarios', nargs='+', default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument('--upload-rows', type=int, default=2000)
+    parser.add_argument('--uploads', type=int, default=3)
+    parser.add_argument('--dry-run-upload', action='store_true',
+                        help="only read the sheet and plan schema changes instead of the full ingest")
+    parser.add_argument('--cold', action='store_true', help="disable payslip and identity caches")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before failing (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run(args)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    else:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
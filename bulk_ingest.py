@@ -0,0 +1,304 @@
+# --- محرك الإدخال المجمّع (Bulk Ingest) لبيانات الرواتب ---
+# بدلاً من 3 استعلامات لكل موظف (SELECT ثم UPDATE/INSERT ثم INSERT للراتب)
+# يتم رفع الشيت كاملاً إلى جدول مؤقت دفعة واحدة، ثم تنفيذ التحديث والإضافة
+# كعمليات على مستوى المجموعة (set-based) داخل قاعدة البيانات.
+import hashlib
+import time
+from contextlib import contextmanager
+
+from normalize import normalize_money_columns, to_db_values
+from payroll_columns import MONEY_TYPE, partition_columns
+from storage import dialect_of, quote_ident
+
+# جداول مؤقتة لكل اتصال (#PayrollStaging في SQL Server و temp.PayrollStaging في SQLite)
+STAGING_TABLE = "PayrollStaging"
+DIFF_TABLE = "PayrollDiff"
+STAGE_BATCH_SIZE = 1000
+STAGING_MAX_LENGTH = 4000  # أقصى طول لقيمة في الجدول المؤقت (staging_text_type)
+DIFF_SAMPLE_SIZE = 20  # عدد أرقام الموظفين المعروضة لكل نوع تغيير في ملخص المعاينة
+DIFF_CHANGES = {'insert': 'inserted', 'update': 'updated', 'delete': 'deleted'}
+
+
+@contextmanager
+def phase(report, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        report['timings'][name] = round(time.perf_counter() - started, 4)
+
+
+def new_report():
+    return {
+        'rows': 0,
+        'employees_inserted': 0,
+        'employees_updated': 0,
+        'payslips_deleted': 0,
+        'payslips_inserted': 0,
+        'timings': {},
+    }
+
+
+def _row_hash(values):
+    # بصمة الصف: القيم بترتيب أسماء الأعمدة (حتى لا يغير ترتيب أعمدة الشيت البصمة)
+    text = "\x1f".join("\x00" if v is None else str(v) for v in values)
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+def _tables(cursor):
+    dialect = dialect_of(cursor)
+    return dialect, dialect.temp_table(STAGING_TABLE), dialect.temp_table(DIFF_TABLE)
+
+
+def _create_staging(cursor, columns):
+    dialect = dialect_of(cursor)
+    # نص بطول محدد (القيم الأطول تُرفض قبل الرفع في _check_lengths)
+    cols_ddl = ", ".join(f"{quote_ident(c)} {dialect.staging_text_type} NULL" for c in columns)
+    cursor.execute(dialect.drop_temp_table(STAGING_TABLE))
+    cursor.execute(dialect.create_temp_table(
+        STAGING_TABLE, f"RowNo INT NOT NULL PRIMARY KEY, RowHash BINARY(32) NOT NULL, {cols_ddl}"
+    ))
+
+
+def _check_lengths(df, columns):
+    # رفض الشيت الذي به قيمة أطول من أعمدة الجدول المؤقت بدلاً من خطأ قص أثناء الإدخال
+    lengths = df[columns].apply(lambda col: col.astype(str).str.len()).max()
+    too_long = [c for c in columns if lengths.get(c, 0) > STAGING_MAX_LENGTH]
+    if too_long:
+        raise ValueError(f"العمود '{too_long[0]}' يحتوي على قيمة أطول من {STAGING_MAX_LENGTH} حرف")
+
+
+def _stage_batch(cursor, df, columns, last_row_no):
+    dialect, staging, _ = _tables(cursor)
+    insert_cols = ", ".join(["RowNo", "RowHash"] + [quote_ident(c) for c in columns])
+    placeholders = ", ".join(["?"] * (len(columns) + 2))
+    query = f"INSERT INTO {staging} ({insert_cols}) VALUES ({placeholders})"
+
+    _check_lengths(df, columns)
+    # الخلايا الفارغة تُرفع كـ NULL (نفس سلوك تجاهل القيم الفارغة سابقًا)
+    values = to_db_values(df, columns)
+    hash_order = sorted(range(len(columns)), key=lambda i: columns[i])
+    if dialect.fast_executemany:
+        cursor.fast_executemany = True
+    batch = []
+    row_no = last_row_no
+    for row in values.itertuples(index=False, name=None):
+        row_no += 1
+        batch.append((row_no, _row_hash(row[i] for i in hash_order)) + row)
+        if len(batch) >= STAGE_BATCH_SIZE:
+            cursor.executemany(query, batch)
+            batch = []
+    if batch:
+        cursor.executemany(query, batch)
+    return row_no
+
+
+def _changed_only(changed, diff_table):
+    # في الوضع التزايدي تقتصر العمليات على الموظفين الجدد والمعدلين في جدول الفروق
+    if not changed:
+        return ""
+    return f" AND s.EmployeeID IN (SELECT EmployeeID FROM {diff_table} WHERE Change IN ('insert', 'update'))"
+
+
+def _upsert_employees(cursor, columns, report, changed=False):
+    dialect, staging, diff_table = _tables(cursor)
+    latest = (
+        f"WITH s AS (SELECT *, ROW_NUMBER() OVER (PARTITION BY EmployeeID ORDER BY RowNo DESC) AS rn "
+        f"FROM {staging})"
+    )
+    update_cols = [c for c in columns if c != 'EmployeeID']
+    if update_cols:
+        # القيم الفارغة في الشيت لا تمسح البيانات الموجودة
+        assignments = [(quote_ident(c), f"COALESCE(s.{quote_ident(c)}, e.{quote_ident(c)})") for c in update_cols]
+        cursor.execute(f"{latest} " + dialect.update_join(
+            "Employees", "e", assignments, "s", "e.EmployeeID = s.EmployeeID",
+            f"s.rn = 1{_changed_only(changed, diff_table)}"
+        ))
+        report['employees_updated'] = dialect.affected_rows(cursor)
+
+    insert_cols = [quote_ident(c) for c in columns]
+    select_cols = [f"s.{quote_ident(c)}" for c in columns]
+    if 'Role' in columns:
+        select_cols[columns.index('Role')] = "COALESCE(s.[Role], 'employee')"
+    else:
+        insert_cols.append("[Role]")
+        select_cols.append("'employee'")
+    cursor.execute(
+        f"{latest} INSERT INTO Employees ({', '.join(insert_cols)}) "
+        f"SELECT {', '.join(select_cols)} FROM s WHERE s.rn = 1 "
+        f"AND NOT EXISTS (SELECT 1 FROM Employees e WHERE e.EmployeeID = s.EmployeeID){_changed_only(changed, diff_table)}"
+    )
+    report['employees_inserted'] = dialect.affected_rows(cursor)
+
+
+def _insert_payslips(cursor, columns, pay_year, pay_month, report, money_columns=frozenset(), changed=False):
+    dialect, staging, diff_table = _tables(cursor)
+    if changed:
+        # حذف صفوف الموظفين المعدلين والمحذوفين فقط، ثم إدخال الجديد والمعدل
+        cursor.execute(
+            f"DELETE FROM Payslips WHERE PayYear = ? AND PayMonth = ? "
+            f"AND EmployeeID IN (SELECT EmployeeID FROM {diff_table} WHERE Change IN ('update', 'delete'))",
+            (pay_year, pay_month)
+        )
+    else:
+        cursor.execute("DELETE FROM Payslips WHERE PayYear = ? AND PayMonth = ?", (pay_year, pay_month))
+    report['payslips_deleted'] = dialect.affected_rows(cursor)
+
+    insert_cols = ", ".join([quote_ident(c) for c in columns] + ["[PayYear]", "[PayMonth]"])
+    # أعمدة المبالغ تتحول من نص الجدول المؤقت إلى DECIMAL هنا (القيم تم التحقق منها أثناء الرفع)
+    select_cols = ", ".join(
+        [f"CAST({quote_ident(c)} AS {MONEY_TYPE})" if c in money_columns else quote_ident(c) for c in columns]
+        + ["?", "?"]
+    )
+    cursor.execute(
+        f"INSERT INTO Payslips ({insert_cols}) SELECT {select_cols} FROM {staging} s "
+        f"WHERE 1 = 1{_changed_only(changed, diff_table)} ORDER BY RowNo",
+        (pay_year, pay_month)
+    )
+    report['payslips_inserted'] = dialect.affected_rows(cursor)
+
+
+def _store_row_hashes(cursor, pay_year, pay_month, changed=False):
+    # بصمات صفوف الشهر تُحفظ مع كل رفع (كامل أو تزايدي) لتقارن بها الرفعات التالية
+    _, staging, diff_table = _tables(cursor)
+    period = (pay_year, pay_month)
+    if changed:
+        cursor.execute(
+            f"DELETE FROM PayslipRowHashes WHERE PayYear = ? AND PayMonth = ? "
+            f"AND EmployeeID IN (SELECT EmployeeID FROM {diff_table})",
+            period
+        )
+    else:
+        cursor.execute("DELETE FROM PayslipRowHashes WHERE PayYear = ? AND PayMonth = ?", period)
+    cursor.execute(
+        f"WITH s AS (SELECT EmployeeID, RowHash, ROW_NUMBER() OVER (PARTITION BY EmployeeID ORDER BY RowNo DESC) AS rn "
+        f"FROM {staging}) "
+        f"INSERT INTO PayslipRowHashes (PayYear, PayMonth, EmployeeID, RowHash) "
+        f"SELECT ?, ?, s.EmployeeID, s.RowHash FROM s WHERE s.rn = 1{_changed_only(changed, diff_table)}",
+        period
+    )
+
+
+def _duplicate_employees(cursor):
+    _, staging, _ = _tables(cursor)
+    cursor.execute(f"SELECT COUNT(*) - COUNT(DISTINCT EmployeeID) FROM {staging}")
+    return cursor.fetchone()[0]
+
+
+def _compute_diff(cursor, pay_year, pay_month):
+    # مقارنة بصمات صفوف الشيت ببصمات الشهر المحفوظة: موظف جديد، أو معدل (بصمة مختلفة
+    # أو غير محفوظة لشهر رُفع قبل وجود البصمات)، أو محذوف (موجود في الشهر وليس في الشيت)
+    dialect, staging, diff_table = _tables(cursor)
+    period = (pay_year, pay_month)
+    cursor.execute(dialect.drop_temp_table(DIFF_TABLE))
+    cursor.execute(dialect.create_temp_table(DIFF_TABLE, "EmployeeID NVARCHAR(4000) NOT NULL, Change NVARCHAR(10) NOT NULL"))
+    # الجدد والمعدلون من جهة الشيت، ثم المحذوفون من جهة الشهر المحفوظ
+    # (بدلاً من FULL OUTER JOIN غير المدعوم في إصدارات SQLite القديمة)
+    cursor.execute(f"""
+        INSERT INTO {diff_table} (EmployeeID, Change)
+        SELECT s.EmployeeID, CASE WHEN p.EmployeeID IS NULL THEN 'insert' ELSE 'update' END
+        FROM {staging} s
+        LEFT JOIN (SELECT DISTINCT EmployeeID FROM Payslips WHERE PayYear = ? AND PayMonth = ?) p
+            ON p.EmployeeID = s.EmployeeID
+        LEFT JOIN PayslipRowHashes h
+            ON h.PayYear = ? AND h.PayMonth = ? AND h.EmployeeID = s.EmployeeID
+        WHERE p.EmployeeID IS NULL OR h.RowHash IS NULL OR h.RowHash <> s.RowHash
+    """, period + period)
+    cursor.execute(f"""
+        INSERT INTO {diff_table} (EmployeeID, Change)
+        SELECT DISTINCT p.EmployeeID, 'delete'
+        FROM Payslips p
+        WHERE p.PayYear = ? AND p.PayMonth = ?
+            AND NOT EXISTS (SELECT 1 FROM {staging} s WHERE s.EmployeeID = p.EmployeeID)
+    """, period)
+
+    diff = {'inserted': 0, 'updated': 0, 'deleted': 0, 'samples': {}}
+    cursor.execute(f"SELECT Change, COUNT(*) FROM {diff_table} GROUP BY Change")
+    for change, count in cursor.fetchall():
+        diff[DIFF_CHANGES[change]] = count
+    for change in DIFF_CHANGES:
+        cursor.execute(
+            f"SELECT {dialect.top(DIFF_SAMPLE_SIZE)}EmployeeID FROM {diff_table} WHERE Change = ? "
+            f"ORDER BY EmployeeID{dialect.limit(DIFF_SAMPLE_SIZE)}",
+            (change,)
+        )
+        diff['samples'][change] = [row[0] for row in cursor.fetchall()]
+    cursor.execute(f"SELECT COUNT(DISTINCT EmployeeID) FROM {staging}")
+    diff['unchanged'] = cursor.fetchone()[0] - diff['inserted'] - diff['updated']
+    return diff
+
+
+def _no_progress(phase=None, rows_processed=None):
+    pass
+
+
+def ingest_batches(conn, columns, batches, pay_year, pay_month, employee_columns, payslip_columns,
+                   report=None, progress=None, money_columns=frozenset(), incremental=False, preview=False):
+    # batches: دفعات DataFrame بنفس الأعمدة المترجمة (columns) وقيم نصية ('' للخلايا الفارغة)
+    # تُرفع كل دفعة للجدول المؤقت ثم تُنفذ عمليات الموظفين والرواتب مرة واحدة في النهاية
+    # لا يتم الـ commit هنا: المسؤولية على المستدعي حتى تبقى العملية كلها معاملة واحدة
+    # progress(phase=..., rows_processed=...) للإبلاغ عن التقدم (مثلاً لمهمة خلفية)
+    # money_columns: أعمدة الرواتب من نوع DECIMAL؛ قيمها تُنظف ويُتحقق أنها أرقام قبل الرفع
+    # incremental: تطبيق الفروق فقط (موظفون جدد/معدلون/محذوفون) حسب بصمات الصفوف
+    # preview: حساب الفروق فقط في report['diff'] بدون أي تعديل على الجداول
+    report = report if report is not None else new_report()
+    progress = progress or _no_progress
+    if 'EmployeeID' not in columns:
+        raise ValueError("عمود رقم الموظف غير موجود في الملف")
+
+    employee_cols, payslip_cols = partition_columns(columns, employee_columns, payslip_columns)
+    staged_cols = list(dict.fromkeys(['EmployeeID'] + employee_cols + payslip_cols))
+    money_cols = [c for c in payslip_cols if c in money_columns]
+
+    cursor = conn.cursor()
+    try:
+        with phase(report, 'stage'):
+            progress(phase='stage', rows_processed=0)
+            _create_staging(cursor, staged_cols)
+            row_no = 0
+            for df in batches:
+                df = df[df['EmployeeID'] != '']
+                df = normalize_money_columns(df, money_cols)
+                row_no = _stage_batch(cursor, df, staged_cols, row_no)
+                progress(rows_processed=row_no)
+            report['rows'] = row_no
+
+        changed = False
+        if incremental or preview:
+            with phase(report, 'diff'):
+                progress(phase='diff')
+                report['diff'] = _compute_diff(cursor, pay_year, pay_month)
+                duplicates = _duplicate_employees(cursor)
+                # رقم موظف مكرر في الشيت: المقارنة بالموظف لا تكفي فيُستبدل الشهر كاملاً
+                if duplicates:
+                    report['diff']['duplicates'] = duplicates
+                changed = incremental and not duplicates
+            report['incremental'] = changed
+            if preview:
+                return report
+
+        with phase(report, 'employees_upsert'):
+            progress(phase='employees_upsert', rows_processed=row_no)
+            _upsert_employees(cursor, [c for c in staged_cols if c in employee_cols], report, changed)
+        with phase(report, 'payslips_insert'):
+            progress(phase='payslips_insert')
+            _insert_payslips(cursor, [c for c in staged_cols if c in payslip_cols], pay_year, pay_month, report,
+                             frozenset(money_cols), changed)
+            _store_row_hashes(cursor, pay_year, pay_month, changed)
+    finally:
+        for table in (DIFF_TABLE, STAGING_TABLE):
+            try:
+                cursor.execute(dialect_of(cursor).drop_temp_table(table))
+            except Exception:
+                pass
+    return report
+
+
+def ingest_month(conn, df, pay_year, pay_month, employee_columns, payslip_columns,
+                 report=None, progress=None, batch_size=None, money_columns=frozenset(),
+                 incremental=False, preview=False):
+    batch_size = batch_size or len(df) or 1
+    batches = (df.iloc[i:i + batch_size] for i in range(0, len(df), batch_size))
+    return ingest_batches(conn, list(df.columns), batches, pay_year, pay_month,
+                          employee_columns, payslip_columns, report, progress, money_columns,
+                          incremental, preview)
@@ -0,0 +1,222 @@
+# --- تجمع اتصالات قاعدة البيانات (Connection Pool) ---
+# كل عامل (worker) في gunicorn يحتفظ بتجمع خاص به من الاتصالات المفتوحة
+# بدلاً من فتح اتصال جديد (TCP + TLS + تسجيل دخول) مع كل طلب.
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    # غلاف حول الاتصال الحقيقي: close() تعيد الاتصال إلى التجمع بدلاً من إغلاقه
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise AttributeError(f"connection already returned to pool: {name}")
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw)
+
+    def discard(self):
+        # يستخدم عند فساد الاتصال: يغلق فعليًا ولا يعود للتجمع
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._discard(raw)
+
+
+class ConnectionPool:
+    def __init__(self, factory, min_size=1, max_size=5, idle_timeout=300,
+                 checkout_timeout=10, health_check_after=5, health_check_sql="SELECT 1"):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("invalid pool size")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.health_check_sql = health_check_sql
+
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = []          # [(raw, وقت الإرجاع)] - آخر عنصر هو الأحدث
+        self._size = 0           # عدد الاتصالات المفتوحة (مستخدمة + خاملة)
+        self._stats = {
+            'created': 0, 'closed': 0, 'checkouts': 0, 'waits': 0,
+            'timeouts': 0, 'failed_health_checks': 0, 'evicted_idle': 0,
+            'connect_errors': 0, 'peak_in_use': 0,
+        }
+
+    def _check_fork(self):
+        # بعد fork في gunicorn لا يجوز مشاركة اتصالات العملية الأم
+        if self._pid != os.getpid():
+            with self._cond:
+                if self._pid != os.getpid():
+                    self._reset_state()
+
+    # --- فتح وإغلاق الاتصالات الفعلية ---
+    def _open(self):
+        try:
+            raw = self.factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._stats['connect_errors'] += 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return raw
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _discard(self, raw):
+        self._close_raw(raw)
+        with self._cond:
+            self._size -= 1
+            self._stats['closed'] += 1
+            self._cond.notify()
+
+    def _healthy(self, raw):
+        try:
+            cursor = raw.cursor()
+            cursor.execute(self.health_check_sql)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle_locked(self, now):
+        # إغلاق الاتصالات الخاملة لفترة طويلة مع الإبقاء على الحد الأدنى
+        expired = []
+        while self._idle and self._size > self.min_size:
+            raw, returned_at = self._idle[0]
+            if now - returned_at < self.idle_timeout:
+                break
+            self._idle.pop(0)
+            self._size -= 1
+            self._stats['closed'] += 1
+            self._stats['evicted_idle'] += 1
+            expired.append(raw)
+        return expired
+
+    # --- الحجز والإرجاع ---
+    def acquire(self):
+        self._check_fork()
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            raw = None
+            need_new = False
+            with self._cond:
+                expired = self._evict_idle_locked(time.monotonic())
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f"no database connection available within {self.checkout_timeout}s")
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                if self._idle:
+                    raw, returned_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    need_new = True
+            for old in expired:
+                self._close_raw(old)
+
+            if need_new:
+                raw = self._open()
+            elif time.monotonic() - returned_at >= self.health_check_after and not self._healthy(raw):
+                with self._cond:
+                    self._stats['failed_health_checks'] += 1
+                self._discard(raw)
+                continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+                in_use = self._size - len(self._idle)
+                self._stats['peak_in_use'] = max(self._stats['peak_in_use'], in_use)
+            return PooledConnection(self, raw)
+
+    def _release(self, raw):
+        if self._pid != os.getpid():
+            self._close_raw(raw)
+            return
+        try:
+            # التراجع عن أي معاملة لم تكتمل حتى يستلم الطلب التالي اتصالاً نظيفًا
+            raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+        with self._cond:
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            if conn.raw is not None and not self._healthy(conn.raw):
+                conn.discard()
+            raise
+        finally:
+            conn.close()
+
+    def prefill(self):
+        # فتح الحد الأدنى من الاتصالات مسبقًا
+        conns = [self.acquire() for _ in range(self.min_size)]
+        for conn in conns:
+            conn.close()
+
+    def prune(self):
+        with self._cond:
+            expired = self._evict_idle_locked(time.monotonic())
+        for raw in expired:
+            self._close_raw(raw)
+        return len(expired)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._stats['closed'] += len(idle)
+        for raw, _ in idle:
+            self._close_raw(raw)
+
+    def stats(self):
+        self._check_fork()
+        with self._cond:
+            data = dict(self._stats)
+            data.update({
+                'pid': self._pid,
+                'open': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        return data
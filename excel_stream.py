@@ -0,0 +1,71 @@
+# --- قراءة ملفات الإكسل الكبيرة على دفعات (Streaming) ---
+# بدلاً من pd.read_excel الذي يحمّل الشيت كاملاً في الذاكرة، يتم المرور على الصفوف
+# بوضع القراءة فقط في openpyxl وإخراج دفعات ثابتة الحجم، فتبقى الذاكرة محدودة
+# مهما كان حجم الشيت.
+import openpyxl
+import pandas as pd
+
+from normalize import normalize_frame
+from payroll_columns import translate_header
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _cell_to_str(value):
+    # نفس تحويل pd.read_excel(dtype=str): الأرقام الصحيحة بدون .0 والفارغ يصبح ''
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class ExcelBatchReader:
+    def __init__(self, file, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        sheet = self._workbook.active
+        # عدد الصفوف حسب أبعاد الشيت المسجلة في الملف (تقريبي لبعض البرامج)
+        self.total_rows = max(sheet.max_row - 1, 0) if sheet.max_row else None
+        self._rows = sheet.iter_rows(values_only=True)
+        header = next(self._rows, None) or ()
+        # ترجمة رؤوس الأعمدة مرة واحدة فقط عبر COLUMN_MAPPING
+        self._keep = [i for i, h in enumerate(header) if h is not None and str(h).strip()]
+        self.columns = [translate_header(header[i]) for i in self._keep]
+        self._batches = self._read_batches()
+        self._first = None
+
+    def _frame(self, rows):
+        df = pd.DataFrame(rows, columns=self.columns, dtype=object)
+        return normalize_frame(df)
+
+    def peek(self):
+        # الدفعة الأولى بدون استهلاكها (مثلاً للتحقق من المبالغ قبل تعديل هيكل الجداول)
+        if self._first is None:
+            self._first = next(self._batches, None)
+        return self._first
+
+    def __iter__(self):
+        if self._first is not None:
+            first, self._first = self._first, None
+            yield first
+        yield from self._batches
+
+    def _read_batches(self):
+        try:
+            rows = []
+            for raw in self._rows:
+                values = [_cell_to_str(raw[i]) if i < len(raw) else '' for i in self._keep]
+                if not any(values):
+                    continue
+                rows.append(values)
+                if len(rows) >= self.batch_size:
+                    yield self._frame(rows)
+                    rows = []
+            if rows:
+                yield self._frame(rows)
+        finally:
+            self.close()
+
+    def close(self):
+        self._workbook.close()
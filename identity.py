@@ -0,0 +1,45 @@
+# --- التحقق من هوية الموظف عند تسجيل الدخول ---
+# استعلام واحد ضيق يرجع رقم الموظف والصلاحية ورقم الهاتف، ونتيجته تُحفظ في LRU صغير داخل
+# كل عامل بمفتاح (EmployeeID، الهاتف). رفع شيت يعدل جدول Employees يغير وقت تعديل ملف
+# الإصدار فتُهمل النتائج القديمة في كل العمال (مثل PayslipCache).
+from payslip_cache import LRUCache, VersionFile
+
+
+def lookup_identity(conn, employee_id, phone):
+    # None إذا لم يتطابق رقم الموظف مع رقم الهاتف المسجل
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT EmployeeID, Role, MobileNumber FROM Employees WHERE EmployeeID = ? AND MobileNumber = ?",
+        (employee_id, phone)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {
+        'employee_id': str(row[0]),
+        'role': row[1].lower() if row[1] else 'employee',
+        'phone': row[2],
+    }
+
+
+class IdentityCache:
+    # النتائج غير الموجودة لا تُحفظ: الموظف الجديد يظهر فورًا، وتخمين الأرقام يحده RateLimiter
+    def __init__(self, max_entries=2000, ttl=600, version_path=None):
+        self.local = LRUCache(max_entries, ttl)
+        self.version_file = VersionFile(version_path)
+
+    def _key(self, employee_id, phone):
+        return f"{self.version_file.version()}|{employee_id}|{phone}"
+
+    def get(self, employee_id, phone):
+        return self.local.get(self._key(employee_id, phone))
+
+    def set(self, employee_id, phone, identity):
+        self.local.set(self._key(employee_id, phone), identity)
+
+    def invalidate(self):
+        self.local.delete_prefix("")
+        self.version_file.touch()
+
+    def stats(self):
+        return {'entries': len(self.local), 'hits': self.local.hits, 'misses': self.local.misses}
@@ -0,0 +1,199 @@
+# --- طابور المهام الخلفية (Background Jobs) ---
+# المهام الطويلة (مثل رفع شيت الرواتب) تنفذ في مجموعة threads داخل كل عامل
+# بينما تُحفظ حالتها في جدول Jobs داخل ملف SQLite محلي مشترك بين كل عمال gunicorn،
+# فيستطيع أي عامل الرد على طلب متابعة الحالة.
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_WRITE_INTERVAL = 0.5  # ثانية: أقل فترة بين كتابتين لتقدم نفس المهمة
+
+
+def _now():
+    return time.time()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+
+
+class JobStore:
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS Jobs (
+                    JobID TEXT PRIMARY KEY,
+                    Kind TEXT NOT NULL,
+                    Status TEXT NOT NULL,
+                    Phase TEXT,
+                    RowsProcessed INTEGER NOT NULL DEFAULT 0,
+                    RowsTotal INTEGER,
+                    WorkerPid INTEGER,
+                    Message TEXT,
+                    Params TEXT,
+                    Result TEXT,
+                    CreatedAt REAL NOT NULL,
+                    StartedAt REAL,
+                    UpdatedAt REAL,
+                    FinishedAt REAL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS IX_Jobs_Kind_CreatedAt ON Jobs (Kind, CreatedAt)")
+            db.commit()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _execute(self, query, params=()):
+        with closing(self._connect()) as db:
+            db.execute(query, params)
+            db.commit()
+
+    def create(self, kind, params=None):
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO Jobs (JobID, Kind, Status, Phase, Params, CreatedAt, UpdatedAt) VALUES (?, ?, 'queued', 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(params or {}, default=str), _now(), _now())
+        )
+        return job_id
+
+    def update(self, job_id, **fields):
+        columns = {
+            'status': 'Status', 'phase': 'Phase', 'rows_processed': 'RowsProcessed',
+            'rows_total': 'RowsTotal', 'worker_pid': 'WorkerPid', 'message': 'Message',
+            'started_at': 'StartedAt', 'finished_at': 'FinishedAt',
+        }
+        values = {columns[k]: v for k, v in fields.items() if k in columns}
+        if 'result' in fields:
+            values['Result'] = json.dumps(fields['result'], default=str)
+        values['UpdatedAt'] = _now()
+        set_clause = ", ".join(f"{col} = ?" for col in values)
+        self._execute(f"UPDATE Jobs SET {set_clause} WHERE JobID = ?", list(values.values()) + [job_id])
+
+    def _to_dict(self, row):
+        job = {
+            'id': row['JobID'],
+            'kind': row['Kind'],
+            'status': row['Status'],
+            'phase': row['Phase'],
+            'rows_processed': row['RowsProcessed'],
+            'rows_total': row['RowsTotal'],
+            'message': row['Message'],
+            'params': json.loads(row['Params']) if row['Params'] else {},
+            'result': json.loads(row['Result']) if row['Result'] else None,
+            'created_at': row['CreatedAt'],
+            'started_at': row['StartedAt'],
+            'finished_at': row['FinishedAt'],
+        }
+        # عامل توقف (إعادة تشغيل أو انهيار) بينما المهمة قيد التنفيذ
+        if job['status'] == 'running' and row['WorkerPid'] and not _pid_alive(row['WorkerPid']):
+            job['status'] = 'failed'
+            job['message'] = job['message'] or 'worker process exited before the job finished'
+
+        end = job['finished_at'] or _now()
+        elapsed = end - job['started_at'] if job['started_at'] else 0
+        job['elapsed'] = round(elapsed, 2)
+        job['rows_per_sec'] = round(job['rows_processed'] / elapsed, 1) if elapsed > 0 else 0
+        return job
+
+    def get(self, job_id):
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT * FROM Jobs WHERE JobID = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, kind=None, limit=20):
+        query = "SELECT * FROM Jobs"
+        params = []
+        if kind:
+            query += " WHERE Kind = ?"
+            params.append(kind)
+        query += " ORDER BY CreatedAt DESC LIMIT ?"
+        params.append(limit)
+        with closing(self._connect()) as db:
+            rows = db.execute(query, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+
+class Job:
+    # المقبض الذي تستلمه دالة المهمة للإبلاغ عن المرحلة والتقدم
+    def __init__(self, store, job_id, params):
+        self.store = store
+        self.id = job_id
+        self.params = params
+        self._pending = {}
+        self._last_write = 0.0
+
+    def progress(self, phase=None, rows_processed=None, rows_total=None):
+        # تغيير المرحلة يكتب فورًا، أما عداد الصفوف فيكتب كل PROGRESS_WRITE_INTERVAL على الأكثر
+        force = phase is not None or rows_total is not None
+        if phase is not None:
+            self._pending['phase'] = phase
+        if rows_processed is not None:
+            self._pending['rows_processed'] = rows_processed
+        if rows_total is not None:
+            self._pending['rows_total'] = rows_total
+        if force or time.monotonic() - self._last_write >= PROGRESS_WRITE_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.store.update(self.id, **self._pending)
+            self._pending = {}
+            self._last_write = time.monotonic()
+
+    def set_message(self, message):
+        self.store.update(self.id, message=message)
+
+
+class JobQueue:
+    def __init__(self, store, max_workers=2):
+        self.store = store
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # ينشأ بعد fork داخل كل عامل وليس في العملية الأم
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, kind, fn, params=None):
+        params = params or {}
+        job_id = self.store.create(kind, params)
+        self._get_executor().submit(self._run, Job(self.store, job_id, params), fn)
+        return job_id
+
+    def _run(self, job, fn):
+        self.store.update(job.id, status='running', phase='started', started_at=_now(), worker_pid=os.getpid())
+        try:
+            result = fn(job)
+            job.flush()
+        except Exception as e:
+            logger.exception("Job %s failed", job.id)
+            self.store.update(job.id, status='failed', message=str(e), finished_at=_now())
+        else:
+            self.store.update(job.id, status='done', phase='done', result=result, finished_at=_now())
@@ -0,0 +1,109 @@
+# --- قوائم المدير مقسمة على صفحات (Keyset Pagination) ---
+# بدلاً من fetchall لكل موظفي الشهر، تُجلب صفحة واحدة مرتبة بالاسم ثم رقم الموظف،
+# والصفحة التالية تبدأ بعد آخر (اسم، رقم) في الصفحة الحالية، فيبقى زمن الاستعلام
+# وذاكرة العامل ثابتين مهما زاد عدد الموظفين.
+import base64
+import json
+
+from storage import dialect_of
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# اسم المعامل في الرابط -> العمود في جدول الموظفين
+FILTER_COLUMNS = {'department': 'Department', 'cost_center': 'CostCenterName'}
+
+PAYSLIP_LIST_COLUMNS = ['EmployeeName', 'EmployeeID', 'BasicSalary', 'TotalEntitlements', 'TotalDeductions', 'NetSalary']
+EMPLOYEE_LIST_COLUMNS = ['EmployeeID', 'EmployeeName', 'NationalID', 'MobileNumber', 'Role']
+
+
+def encode_cursor(name, employee_id):
+    raw = json.dumps([name, employee_id], default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        name, employee_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return name, employee_id
+    except (ValueError, TypeError):
+        return None
+
+
+def page_size_from(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def filters_from(args):
+    filters = {key: args.get(key, '').strip() for key in FILTER_COLUMNS}
+    filters['q'] = args.get('q', '').strip()
+    return {key: value for key, value in filters.items() if value}
+
+
+def _where(name_col, id_col, employee_alias, filters, after, employee_columns):
+    clauses, params = [], []
+    for key, column in FILTER_COLUMNS.items():
+        if filters.get(key) and column in employee_columns:
+            clauses.append(f"{employee_alias}.[{column}] = ?")
+            params.append(filters[key])
+    if filters.get('q'):
+        clauses.append(f"({name_col} LIKE ? OR CAST({id_col} AS NVARCHAR(50)) LIKE ?)")
+        params += [f"%{filters['q']}%", f"{filters['q']}%"]
+    if after:
+        clauses.append(f"(COALESCE({name_col}, '') > ? OR (COALESCE({name_col}, '') = ? AND {id_col} > ?))")
+        params += [after[0], after[0], after[1]]
+    return clauses, params
+
+
+def _page(cursor, page_size):
+    columns = [d[0] for d in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchmany(page_size + 1)]
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['EmployeeName'] or '', last['EmployeeID'])
+    return {'items': rows, 'next_cursor': next_cursor, 'page_size': page_size}
+
+
+def payslip_page(conn, pay_year, pay_month, employee_columns, filters=None, cursor_token=None,
+                 page_size=DEFAULT_PAGE_SIZE):
+    filters = filters or {}
+    clauses, params = _where('p.EmployeeName', 'p.EmployeeID', 'e', filters,
+                             decode_cursor(cursor_token), employee_columns)
+    select_list = ", ".join(f"p.[{c}]" for c in PAYSLIP_LIST_COLUMNS)
+    where = " AND ".join(["p.PayYear = ?", "p.PayMonth = ?"] + clauses)
+    dialect = dialect_of(conn)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT {dialect.top(page_size + 1)}{select_list}
+        FROM Payslips p
+        LEFT JOIN Employees e ON e.EmployeeID = p.EmployeeID
+        WHERE {where}
+        ORDER BY COALESCE(p.EmployeeName, ''), p.EmployeeID{dialect.limit(page_size + 1)}
+    """, [pay_year, pay_month] + params)
+    return _page(cursor, page_size)
+
+
+def employee_page(conn, employee_columns, filters=None, cursor_token=None, page_size=DEFAULT_PAGE_SIZE):
+    filters = filters or {}
+    clauses, params = _where('e.EmployeeName', 'e.EmployeeID', 'e', filters,
+                             decode_cursor(cursor_token), employee_columns)
+    columns = EMPLOYEE_LIST_COLUMNS + [c for c in FILTER_COLUMNS.values() if c in employee_columns]
+    select_list = ", ".join(f"e.[{c}]" for c in columns)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    dialect = dialect_of(conn)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT {dialect.top(page_size + 1)}{select_list}
+        FROM Employees e
+        {where}
+        ORDER BY COALESCE(e.EmployeeName, ''), e.EmployeeID{dialect.limit(page_size + 1)}
+    """, params)
+    return _page(cursor, page_size)
@@ -0,0 +1,311 @@
+# --- قياس زمن الطلبات واستعلامات قاعدة البيانات (Prometheus) ---
+# كل عامل يجمع القياسات في الذاكرة (histograms) ويكتب نسخة منها كل بضع ثوانٍ
+# في ملف SQLite مشترك، ومسار /metrics يجمع نسخ كل العمال بصيغة Prometheus النصية.
+# صفوف العمال الذين لم يكتبوا منذ مدة الاحتفاظ تُدمج في صف واحد لكل سلسلة (rollup)
+# فلا يكبر الجدول مع كل إعادة تشغيل للعمال، وتبقى العدادات تراكمية.
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# الاسم: (النوع، الوصف، حدود الفئات)؛ كل القياسات حاليًا histograms
+METRICS = {
+    'http_request_duration_seconds': ('histogram', "Request latency by endpoint", DEFAULT_BUCKETS),
+    'db_connect_seconds': ('histogram', "Time to open a new database connection", DEFAULT_BUCKETS),
+    'db_checkout_seconds': ('histogram', "Time to get a connection from the pool", DEFAULT_BUCKETS),
+    'db_query_duration_seconds': ('histogram', "Query execute time by endpoint", DEFAULT_BUCKETS),
+    'db_queries_per_request': ('histogram', "Queries executed per request", COUNT_BUCKETS),
+    'upload_phase_seconds': ('histogram', "Upload job time per phase", DEFAULT_BUCKETS),
+}
+ROLLUP_WORKER = 'rollup'  # صف العمال المتوقفين المدموجين
+DEFAULT_RETENTION = 7 * 86400
+
+
+def _label_key(labels):
+    return json.dumps(sorted(labels.items()), ensure_ascii=False)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _add_series(entry, buckets, total, count):
+    # entry: [buckets, sum, count] أو None
+    if entry is None:
+        return [list(buckets), total, count]
+    entry[0] = [a + b for a, b in zip(entry[0], buckets)]
+    entry[1] += total
+    entry[2] += count
+    return entry
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    def __init__(self, path, flush_interval=5, retention=DEFAULT_RETENTION):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.retention = retention  # ثوانٍ بدون كتابة قبل دمج صفوف العامل في rollup
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._reset()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS Metrics (
+                    Worker TEXT NOT NULL,
+                    Name TEXT NOT NULL,
+                    Labels TEXT NOT NULL,
+                    Buckets TEXT NOT NULL,
+                    Total REAL NOT NULL,
+                    Count INTEGER NOT NULL,
+                    UpdatedAt REAL NOT NULL,
+                    PRIMARY KEY (Worker, Name, Labels)
+                )
+            """)
+            db.commit()
+
+    def _reset(self):
+        # القياسات خاصة بكل عامل: بعد fork يبدأ العامل من الصفر باسم جديد
+        self._pid = os.getpid()
+        self._worker = f"{self._pid}-{uuid.uuid4().hex[:8]}"
+        self._series = {}  # (name, label_key) -> [buckets, sum, count]
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._written = {}  # ما كتبه العامل في آخر flush (ليُطرح إن دُمجت صفوفه)
+        self._written_at = time.time()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    # --- التسجيل ---
+    def observe(self, name, value, **labels):
+        self._check_fork()
+        buckets = METRICS[name][2]
+        with self._lock:
+            series = self._series.get((name, _label_key(labels)))
+            if series is None:
+                series = self._series[(name, _label_key(labels))] = [[0] * len(buckets), 0.0, 0]
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+            self._dirty = True
+
+    def timed(self, name, func, *args, **labels):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # --- الكتابة في الملف المشترك ---
+    def flush(self, force=False):
+        self._check_fork()
+        now = time.monotonic()
+        if not self._dirty or (not force and now - self._last_flush < self.flush_interval):
+            return
+        try:
+            with closing(self._connect()) as db:
+                # BEGIN IMMEDIATE: لا يدمج عامل آخر صفوفنا بين التحقق والكتابة
+                db.execute("BEGIN IMMEDIATE")
+                if self._written and time.time() - self._written_at > self.retention:
+                    if not db.execute("SELECT 1 FROM Metrics WHERE Worker = ? LIMIT 1", (self._worker,)).fetchone():
+                        self._rebase()
+                with self._lock:
+                    written = {key: (list(series[0]), series[1], series[2]) for key, series in self._series.items()}
+                    self._dirty = False
+                    self._last_flush = now
+                db.executemany(
+                    "INSERT OR REPLACE INTO Metrics (Worker, Name, Labels, Buckets, Total, Count, UpdatedAt) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(self._worker, name, labels, json.dumps(buckets), total, count, time.time())
+                     for (name, labels), (buckets, total, count) in written.items()]
+                )
+                db.commit()
+            self._written = written
+            self._written_at = time.time()
+        except sqlite3.Error as e:
+            self._dirty = True
+            logger.warning("Metrics flush failed: %s", e)
+
+    def _rebase(self):
+        # صفوف هذا العامل دُمجت في rollup أثناء توقفه عن الكتابة: نطرح ما كُتب فلا يُحسب مرتين
+        with self._lock:
+            for key, (buckets, total, count) in self._written.items():
+                series = self._series.get(key)
+                if series is not None:
+                    series[0] = [a - b for a, b in zip(series[0], buckets)]
+                    series[1] -= total
+                    series[2] -= count
+            self._written = {}
+
+    def _rollup(self, db):
+        # صفوف العمال الذين لم يكتبوا منذ retention تُضاف إلى صف rollup لكل سلسلة ثم تُحذف
+        db.execute("BEGIN IMMEDIATE")
+        stale = db.execute(
+            "SELECT Worker, Name, Labels, Buckets, Total, Count FROM Metrics WHERE Worker != ? AND UpdatedAt < ?",
+            (ROLLUP_WORKER, time.time() - self.retention)
+        ).fetchall()
+        if not stale:
+            db.rollback()
+            return
+        merged = {}
+        for name, labels, buckets, total, count in db.execute(
+                "SELECT Name, Labels, Buckets, Total, Count FROM Metrics WHERE Worker = ?", (ROLLUP_WORKER,)):
+            merged[(name, labels)] = [json.loads(buckets), total, count]
+        for _, name, labels, buckets, total, count in stale:
+            if name in METRICS:
+                merged[(name, labels)] = _add_series(merged.get((name, labels)), json.loads(buckets), total, count)
+        db.executemany(
+            "INSERT OR REPLACE INTO Metrics (Worker, Name, Labels, Buckets, Total, Count, UpdatedAt) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(ROLLUP_WORKER, name, labels, json.dumps(buckets), total, count, time.time())
+             for (name, labels), (buckets, total, count) in merged.items()]
+        )
+        db.executemany("DELETE FROM Metrics WHERE Worker = ? AND Name = ? AND Labels = ?",
+                       [(worker, name, labels) for worker, name, labels, *_ in stale])
+        db.commit()
+
+    def render(self):
+        # مجموع كل العمال، والعمال المتوقفين من صف rollup (العدادات تراكمية)
+        self.flush(force=True)
+        with closing(self._connect()) as db:
+            try:
+                self._rollup(db)
+            except sqlite3.Error as e:
+                db.rollback()
+                logger.warning("Metrics rollup failed: %s", e)
+            rows = db.execute("SELECT Name, Labels, Buckets, Total, Count FROM Metrics").fetchall()
+
+        totals = {}
+        for name, labels, buckets, total, count in rows:
+            if name not in METRICS:
+                continue
+            totals[(name, labels)] = _add_series(totals.get((name, labels)), json.loads(buckets), total, count)
+
+        lines = []
+        for name, (kind, help_text, bounds) in METRICS.items():
+            series = sorted((labels, entry) for (n, labels), entry in totals.items() if n == name)
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, (buckets, total, count) in series:
+                pairs = [tuple(p) for p in json.loads(labels)]
+                cumulative = 0
+                for bound, n in zip(bounds, buckets):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_format_labels(pairs + [('le', f'{bound:g}')])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_format_labels(pairs)} {total:.6f}")
+                lines.append(f"{name}_count{_format_labels(pairs)} {count}")
+        return "\n".join(lines) + "\n"
+
+    # --- عداد الاستعلامات داخل الطلب الحالي ---
+    def start_request(self):
+        self._local.queries = 0
+
+    def request_queries(self):
+        return getattr(self._local, 'queries', 0)
+
+    def instrument(self, conn, endpoint):
+        return InstrumentedConnection(conn, self, endpoint)
+
+    def _query_done(self, endpoint, seconds):
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+        self.observe('db_query_duration_seconds', seconds, endpoint=endpoint)
+
+
+class InstrumentedCursor:
+    # غلاف حول المؤشر: يقيس زمن execute ويعد الاستعلامات، وباقي الخصائص تمر كما هي
+    def __init__(self, cursor, metrics, endpoint):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_metrics', metrics)
+        object.__setattr__(self, '_endpoint', endpoint)
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            result = getattr(self._cursor, method)(*args)
+        finally:
+            self._metrics._query_done(self._endpoint, time.perf_counter() - started)
+        # pyodbc ترجع المؤشر نفسه من execute للسماح بـ cursor.execute(...).fetchone()
+        return self if result is self._cursor else result
+
+    def execute(self, *args):
+        return self._timed('execute', *args)
+
+    def executemany(self, *args):
+        return self._timed('executemany', *args)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, metrics, endpoint):
+        self._conn = conn
+        self._metrics = metrics
+        self._endpoint = endpoint
+
+    def cursor(self):
+        return InstrumentedCursor(self._conn.cursor(), self._metrics, self._endpoint)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class PhaseTimer:
+    # يستبدل دالة progress الخاصة بالمهمة: كل تغيير في المرحلة يسجل زمن المرحلة السابقة
+    def __init__(self, metrics, name, progress=None, **labels):
+        self.metrics = metrics
+        self.name = name
+        self.progress = progress
+        self.labels = labels
+        self.phase = None
+        self.started = None
+
+    def __call__(self, phase=None, **kwargs):
+        if phase is not None and phase != self.phase:
+            self._close()
+            self.phase = phase
+            self.started = time.perf_counter()
+        if self.progress:
+            self.progress(phase=phase, **kwargs)
+
+    def _close(self):
+        if self.phase is not None:
+            self.metrics.observe(self.name, time.perf_counter() - self.started, phase=self.phase, **self.labels)
+            self.phase = None
+
+    def finish(self):
+        self._close()
@@ -0,0 +1,157 @@
+# --- ترحيلات قاعدة البيانات المُدارة (Managed Migrations) ---
+# كل ترحيل له معرف ثابت ويُسجل في جدول SchemaMigrations بعد تنفيذه،
+# فلا يُنفذ مرة ثانية. التشغيل: flask --app App migrate
+# عناصر الترحيل إما جمل SQL أو دوال تستقبل الـ cursor للخطوات التي تحتاج منطقًا.
+import logging
+
+from payroll_columns import MONEY_TYPE, is_money_column
+from payroll_summary import backfill_summaries
+from storage import quote_ident
+
+logger = logging.getLogger(__name__)
+
+CREATE_PAYSLIPS_PERIOD_INDEX = (
+    "IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Payslips_Period' "
+    "AND object_id = OBJECT_ID('Payslips')) "
+    "CREATE INDEX IX_Payslips_Period ON Payslips (PayYear, PayMonth) "
+    "INCLUDE (EmployeeID, EmployeeName, BasicSalary, TotalEntitlements, TotalDeductions, NetSalary)"
+)
+
+
+def convert_money_columns(cursor):
+    # تحويل أعمدة المبالغ النصية الموجودة إلى DECIMAL. العمود الذي به قيم غير رقمية
+    # (بعد إزالة فواصل الآلاف والمسافات) يُترك كما هو ويُسجل اسمه حتى يُراجع يدويًا.
+    cursor.execute("SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'Payslips'")
+    candidates = [name for name, data_type in cursor.fetchall()
+                  if data_type in ('nvarchar', 'varchar') and is_money_column(name)]
+    if not candidates:
+        return
+
+    # الفهرس IX_Payslips_Period يضم بعض أعمدة المبالغ ويمنع ALTER COLUMN عليها
+    cursor.execute(
+        "IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Payslips_Period' "
+        "AND object_id = OBJECT_ID('Payslips')) DROP INDEX IX_Payslips_Period ON Payslips"
+    )
+    for col in candidates:
+        q = quote_ident(col)
+        cleaned = f"NULLIF(REPLACE(REPLACE(LTRIM(RTRIM({q})), ',', ''), ' ', ''), '')"
+        cursor.execute(
+            f"SELECT COUNT(*) FROM Payslips WHERE {cleaned} IS NOT NULL AND TRY_CONVERT({MONEY_TYPE}, {cleaned}) IS NULL"
+        )
+        invalid = cursor.fetchone()[0]
+        if invalid:
+            logger.warning("Migration: column %s kept as text (%d non-numeric values)", col, invalid)
+            continue
+        cursor.execute(f"UPDATE Payslips SET {q} = {cleaned} WHERE {q} IS NOT NULL")
+        cursor.execute(f"ALTER TABLE Payslips ALTER COLUMN {q} {MONEY_TYPE} NULL")
+    cursor.execute(CREATE_PAYSLIPS_PERIOD_INDEX)
+
+
+MIGRATIONS = [
+    (
+        '0001_payslips_employee_period_index',
+        # صفحة "رواتبي" وتفاصيل راتب الموظف: بحث بالموظف ثم السنة والشهر
+        [
+            "IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Payslips_Employee_Period' "
+            "AND object_id = OBJECT_ID('Payslips')) "
+            "CREATE INDEX IX_Payslips_Employee_Period ON Payslips (EmployeeID, PayYear, PayMonth)",
+        ],
+    ),
+    (
+        '0002_payslips_period_index',
+        # صفحات المدير لكل شهر: الإجماليات وقائمة الرواتب تُقرأ من الفهرس بدون المرور على الصفوف العريضة
+        [CREATE_PAYSLIPS_PERIOD_INDEX],
+    ),
+    (
+        '0003_payroll_month_summary',
+        # ملخص محسوب مسبقًا لكل شهر (انظر payroll_summary.py) مع تعبئة الأشهر الموجودة
+        [
+            """
+            CREATE TABLE PayrollMonthSummary (
+                PayYear INT NOT NULL,
+                PayMonth NVARCHAR(50) NOT NULL,
+                Headcount INT NOT NULL,
+                TotalNetSalary DECIMAL(18, 2) NULL,
+                UpdatedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+                CONSTRAINT PK_PayrollMonthSummary PRIMARY KEY (PayYear, PayMonth)
+            )
+            """,
+            """
+            CREATE TABLE PayrollMonthBreakdown (
+                PayYear INT NOT NULL,
+                PayMonth NVARCHAR(50) NOT NULL,
+                Dimension NVARCHAR(50) NOT NULL,
+                DimensionValue NVARCHAR(255) NOT NULL,
+                Headcount INT NOT NULL,
+                TotalNetSalary DECIMAL(18, 2) NULL,
+                CONSTRAINT PK_PayrollMonthBreakdown PRIMARY KEY (PayYear, PayMonth, Dimension, DimensionValue)
+            )
+            """,
+            backfill_summaries,
+        ],
+    ),
+    (
+        '0004_payslip_money_columns',
+        # المبالغ تخزن DECIMAL بدلاً من NVARCHAR(MAX): صفوف أصغر وSUM بدون تحويل ضمني
+        [convert_money_columns],
+    ),
+    (
+        '0005_payslip_row_hashes',
+        # بصمة صف كل موظف في كل شهر، يقارن بها الرفع التزايدي ليطبق الفروق فقط
+        [
+            """
+            CREATE TABLE PayslipRowHashes (
+                PayYear INT NOT NULL,
+                PayMonth NVARCHAR(50) NOT NULL,
+                EmployeeID NVARCHAR(255) NOT NULL,
+                RowHash BINARY(32) NOT NULL,
+                CONSTRAINT PK_PayslipRowHashes PRIMARY KEY (PayYear, PayMonth, EmployeeID)
+            )
+            """,
+        ],
+    ),
+]
+
+
+def _ensure_migrations_table(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        IF OBJECT_ID('SchemaMigrations', 'U') IS NULL
+        CREATE TABLE SchemaMigrations (
+            MigrationID NVARCHAR(200) NOT NULL PRIMARY KEY,
+            AppliedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        )
+    """)
+    conn.commit()
+
+
+def applied_migrations(conn):
+    _ensure_migrations_table(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT MigrationID FROM SchemaMigrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending_migrations(conn, migrations=MIGRATIONS):
+    done = applied_migrations(conn)
+    return [(migration_id, statements) for migration_id, statements in migrations if migration_id not in done]
+
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    # كل ترحيل في معاملة مستقلة مع تسجيله، حتى لا يبقى ترحيل منفذ جزئيًا
+    applied = []
+    for migration_id, statements in pending_migrations(conn, migrations):
+        cursor = conn.cursor()
+        try:
+            for statement in statements:
+                if callable(statement):
+                    statement(cursor)
+                else:
+                    cursor.execute(statement)
+            cursor.execute("INSERT INTO SchemaMigrations (MigrationID) VALUES (?)", (migration_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(migration_id)
+    return applied
@@ -0,0 +1,98 @@
+# --- توحيد بيانات الشيت قبل أي عملية على قاعدة البيانات ---
+# نفس القواعد تستخدم في /upload (على أعمدة كاملة) وفي request_otp (على قيمة واحدة)
+# حتى لا يختلف شكل رقم الهاتف المخزن عن الرقم الذي يُبحث به عند تسجيل الدخول.
+import numpy as np
+import pandas as pd
+
+from payroll_columns import is_money_column, translate_header
+
+
+def normalize_phone(phone):
+    # 010... تصبح +2010... وإضافة +20 إذا لم تكن موجودة
+    if phone is None:
+        return ''
+    phone = str(phone).strip()
+    if not phone:
+        return ''
+    if phone.startswith('0'):
+        return '+2' + phone
+    if not phone.startswith('+20'):
+        return '+20' + phone
+    return phone
+
+
+# الأرقام العربية (٠-٩) والفارسية (۰-۹) كما تكتبها لوحة مفاتيح الموبايل
+EASTERN_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '0123456789' * 2)
+
+
+def normalize_otp(code):
+    # رمز التحقق كما أدخله المستخدم بأرقام ASCII، و '' إذا بقي فيه حرف غير ASCII
+    code = str(code or '').strip().translate(EASTERN_DIGITS)
+    return code if code.isascii() else ''
+
+
+def normalize_phone_column(phones):
+    # نفس قواعد normalize_phone لكن على العمود كاملاً دفعة واحدة
+    phones = phones.fillna('').astype(str).str.strip()
+    normalized = np.where(
+        phones.str.startswith('0'), '+2' + phones,
+        np.where(phones.str.startswith('+20'), phones, '+20' + phones)
+    )
+    return pd.Series(np.where(phones == '', '', normalized), index=phones.index, dtype=object)
+
+
+def prepare_upload_frame(df):
+    # df: الشيت كما قرئ من الإكسل (نصوص، '' للخلايا الفارغة)
+    df = df.rename(columns={col: translate_header(col) for col in df.columns})
+    return normalize_frame(df)
+
+
+def normalize_frame(df):
+    # df: أعمدة مترجمة بالفعل (تستخدم مباشرة مع دفعات القراءة المتدفقة)
+    if 'MobileNumber' in df.columns:
+        df['MobileNumber'] = normalize_phone_column(df['MobileNumber'])
+    if 'EmployeeID' in df.columns:
+        df = df[df['EmployeeID'] != '']
+    return df
+
+
+MONEY_PATTERN = r'-?[0-9]+(\.[0-9]+)?'
+
+
+def clean_money_column(values):
+    # إزالة فواصل الآلاف والمسافات من المبالغ ('1,250.50' -> '1250.50')
+    return values.fillna('').astype(str).str.replace('[,\\s\u00a0]', '', regex=True)
+
+
+def invalid_money_mask(values):
+    # القيم غير الفارغة التي ليست رقمًا عشريًا عاديًا (بعد التنظيف)؛ pd.to_numeric يقبل
+    # '1e3' و 'inf' و 'nan' وهي لا تناسب عمود DECIMAL ولا يقبلها TRY_CONVERT في SQL Server
+    return (values != '') & ~values.str.fullmatch(MONEY_PATTERN)
+
+
+def normalize_money_columns(df, columns):
+    # تنظيف أعمدة المبالغ والتأكد أن كل قيمها أرقام قبل رفعها لأعمدة DECIMAL
+    columns = [c for c in columns if c in df.columns]
+    if not columns:
+        return df
+    df = df.copy()
+    for col in columns:
+        cleaned = clean_money_column(df[col])
+        invalid = invalid_money_mask(cleaned)
+        if invalid.any():
+            samples = "، ".join(df.loc[invalid, col].astype(str).head(3))
+            raise ValueError(f"العمود '{col}' يحتوي على قيم غير رقمية ({int(invalid.sum())} قيمة، مثل: {samples})")
+        df[col] = cleaned
+    return df
+
+
+def sheet_money_columns(columns):
+    # أعمدة المبالغ في الشيت: المعروفة بالاسم فقط. العمود الجديد يضاف كنص حتى لو كانت
+    # قيمه أرقامًا الآن (كود فرع أو ملاحظات)، لأن نوع العمود دائم وقيم الأشهر القادمة غير معروفة
+    return [col for col in columns if is_money_column(col)]
+
+
+def to_db_values(df, columns):
+    # الخلايا الفارغة تتحول إلى NULL (بدلاً من فلترة v != '' لكل صف)
+    values = df[columns].astype(object)
+    return values.where(values != '', None)
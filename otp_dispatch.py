@@ -0,0 +1,178 @@
+# --- إرسال رموز التحقق (OTP) خارج مسار الطلب ---
+# request_otp يضع الرسالة في طابور محلي ويرجع فورًا، ومجموعة threads داخل كل عامل
+# ترسلها عبر مزود الإرسال (SMS أو بديل للتجربة). بطء المزود لا يؤخر صفحة تسجيل الدخول.
+import importlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+OTP_MESSAGE = "رمز التحقق الخاص بك هو: {code}"
+LATENCY_SAMPLES = 500  # آخر عدد من أزمنة التوصيل لحساب p50/p95
+
+
+# --- مزودات الإرسال: أي كائن له send(phone, message) ويرفع استثناء عند الفشل ---
+
+class ConsoleSender:
+    # البديل الافتراضي للتطوير: طباعة الرمز في الكونسول (نفس السلوك السابق)
+    def send(self, phone, message, employee_id=None):
+        print("\n===================================")
+        print(f"OTP for Employee {employee_id} ({phone}): {message}")
+        print("===================================\n")
+
+
+class FileSender:
+    # بديل للاختبار: كل رسالة سطر JSON في ملف
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def send(self, phone, message, employee_id=None):
+        line = json.dumps({'time': time.time(), 'employee_id': employee_id, 'phone': phone, 'message': message},
+                          ensure_ascii=False)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+
+def sender_from_spec(spec):
+    # 'console' أو 'file:/path/otp.log' أو 'package.module:ClassName' لمزود SMS حقيقي
+    spec = (spec or 'console').strip()
+    if spec == 'console':
+        return ConsoleSender()
+    if spec.startswith('file:'):
+        return FileSender(spec[len('file:'):])
+    module_name, _, class_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# --- تحديد عدد الطلبات لكل رقم موظف ورقم هاتف ---
+
+class RateLimiter:
+    # نافذة زمنية منزلقة: limit طلب على الأكثر لكل مفتاح خلال window ثانية
+    # مع store (مثل SQLiteStore) يصبح العد مشتركًا بين كل العمال بنافذة ثابتة (incr مع مدة صلاحية)
+    def __init__(self, limit=5, window=300, store=None):
+        self.limit = limit
+        self.window = window
+        self.store = store
+        self._lock = threading.Lock()
+        self._hits = {}
+        self.rejected = 0
+
+    def hit(self, *keys):
+        # يسجل المحاولة ويرجع False إن تجاوز أي مفتاح الحد
+        if self.store is not None:
+            counts = [self.store.incr(f"rate:{key}", self.window) for key in keys if key]
+            allowed = all(count <= self.limit for count in counts)
+            if not allowed:
+                with self._lock:
+                    self.rejected += 1
+            return allowed
+        now = time.monotonic()
+        allowed = True
+        with self._lock:
+            for key in keys:
+                if not key:
+                    continue
+                hits = self._hits.setdefault(key, deque())
+                while hits and now - hits[0] > self.window:
+                    hits.popleft()
+                if len(hits) >= self.limit:
+                    allowed = False
+                else:
+                    hits.append(now)
+            # تنظيف المفاتيح المنتهية حتى لا يكبر القاموس بلا حد
+            if len(self._hits) > 10000:
+                self._hits = {k: v for k, v in self._hits.items() if v and now - v[-1] <= self.window}
+            if not allowed:
+                self.rejected += 1
+        return allowed
+
+
+def parse_rate_limit(value, default=(5, 300)):
+    # "5/300": خمسة طلبات كل 300 ثانية
+    try:
+        limit, window = value.split('/')
+        return int(limit), int(window)
+    except (AttributeError, ValueError):
+        return default
+
+
+class OTPDispatcher:
+    def __init__(self, sender, workers=2, max_queue=1000, retries=2, retry_delay=1.0):
+        self.sender = sender
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._counters = {'enqueued': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'retries': 0}
+
+    def _ensure_workers(self):
+        # الـ threads تبدأ بعد fork داخل كل عامل وليس في العملية الأم
+        with self._lock:
+            if self._queue is None or self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._pid = os.getpid()
+                for i in range(self.workers):
+                    threading.Thread(target=self._worker, name=f"otp-{i}", daemon=True).start()
+            return self._queue
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def submit(self, employee_id, phone, code):
+        # يرجع False إذا كان الطابور ممتلئًا (المزود متوقف أو بطيء جدًا)
+        message = OTP_MESSAGE.format(code=code)
+        try:
+            self._ensure_workers().put_nowait((time.monotonic(), employee_id, phone, message))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('enqueued')
+        return True
+
+    def _worker(self):
+        q = self._queue
+        while True:
+            enqueued_at, employee_id, phone, message = q.get()
+            try:
+                for attempt in range(self.retries + 1):
+                    try:
+                        self.sender.send(phone, message, employee_id=employee_id)
+                    except Exception as e:
+                        logger.warning("OTP send failed for %s (attempt %d): %s", employee_id, attempt + 1, e)
+                        if attempt < self.retries:
+                            self._count('retries')
+                            time.sleep(self.retry_delay * (attempt + 1))
+                            continue
+                        self._count('failed')
+                    else:
+                        with self._lock:
+                            self._counters['sent'] += 1
+                            self._latencies.append(time.monotonic() - enqueued_at)
+                    break
+            finally:
+                q.task_done()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._counters)
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+        stats['workers'] = self.workers
+        stats['pid'] = os.getpid()
+        if latencies:
+            stats['latency_p50'] = round(latencies[len(latencies) // 2], 4)
+            stats['latency_p95'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4)
+            stats['latency_max'] = round(latencies[-1], 4)
+        return stats
@@ -0,0 +1,63 @@
+from functools import lru_cache
+
+# --- خريطة لترجمة أسماء الأعمدة من العربي في الإكسل إلى الإنجليزي في قاعدة البيانات ---
+COLUMN_MAPPING = {
+    'رقم الموظف': 'EmployeeID', 'الاسم': 'EmployeeName', 'الرقم القومي': 'NationalID',
+    'الوظيفة': 'JobTitle', 'كود مركز التكلفة': 'CostCenterCode', 'مركز التكلفة': 'CostCenterName',
+    'الإدارة': 'Department', 'رقم الموبايل': 'MobileNumber', 'مرتب أساسي': 'BasicSalary',
+    'بدل تمثيل': 'RepresentationAllowance', 'بدل إنتقال': 'TransportationAllowance',
+    'بدل ترقية': 'PromotionAllowance', 'بدل سيارة': 'CarAllowance', 'بدل نول': 'NolAllowance',
+    'بدل انتاج': 'ProductionAllowance', 'علاوات خاصة': 'SpecialAllowances',
+    'بدل طبيعة': 'NatureOfWorkAllowance', 'بدل غذاء': 'FoodAllowance', 'غلاء معيشة': 'CostOfLiving',
+    'جهد': 'EffortAllowance', 'بدل إنتظام': 'RegularityAllowance', 'اجمالي بدلات': 'TotalAllowances',
+    'إضافي': 'Overtime', 'صافي الحوافز': 'NetIncentives', 'بدل الباركود': 'BarcodeAllowance',
+    'بدل جودة': 'QualityAllowance', 'حافز النسيج': 'FabricIncentive', 'حافز استثنائ': 'ExceptionalIncentive',
+    'حافز إداري': 'AdministrativeIncentive', 'حافز عمليات': 'OperationsIncentive', 'بدل سكن': 'HousingAllowance',
+    'استحقاقات إخري': 'OtherEntitlements', 'عمولة': 'Commission', 'حافز انتاج': 'ProductionIncentive',
+    'الإسترداد': 'Reimbursement', 'حافز كفاءة': 'EfficiencyIncentive', 'بدل ملبس': 'ClothingAllowance',
+    'مكافئة': 'Bonus', 'إجمالى الاستحفافات': 'TotalEntitlements',
+    'حصة الموظف من التامينات': 'EmployeeInsuranceShare', 'مدة تامينات سابقة': 'PreviousInsurancePeriod',
+    'كسب عمل': 'WorkEarnings', 'غياب': 'AbsenceDeduction', 'جزاء راتب': 'SalaryPenalty',
+    'سلفة': 'AdvancePayment', 'غرامة': 'FineDeduction', 'كهرباء': 'ElectricityDeduction',
+    'تليفون': 'PhoneDeduction', 'مياه': 'WaterDeduction', 'فرق ايام': 'DaysDifferenceDeduction',
+    'خصومات اخري': 'OtherDeductions', 'كارت بريميوم': 'PremiumCardDeduction',
+    'ص.ت.الشهداء': 'MartyrsFundDeduction', 'خزانه': 'TreasuryDeduction',
+    'إجمالى الاستقطاعات': 'TotalDeductions', 'الصافي': 'NetSalary'
+}
+
+# الأعمدة التي تخص جدول الموظفين (أي عمود يحتوي اسمه على أحدها يعتبر عمود موظف)
+EMPLOYEE_BASE_COLS = ['EmployeeID', 'EmployeeName', 'NationalID', 'JobTitle', 'CostCenterCode', 'CostCenterName', 'Department', 'MobileNumber', 'Role']
+
+# نوع أعمدة المبالغ في جدول الرواتب
+MONEY_TYPE = "DECIMAL(18, 2)"
+# أعمدة جدول الرواتب المعروفة التي ليست مبالغ
+PAYSLIP_TEXT_COLS = frozenset(['PayslipID', 'EmployeeID', 'EmployeeName', 'PayYear', 'PayMonth', 'PreviousInsurancePeriod'])
+
+
+KNOWN_COLUMNS = frozenset(COLUMN_MAPPING.values())
+
+
+def translate_header(col):
+    # ترجمة الأعمدة المعروفة وتجهيز الجديدة كاسم صالح لقاعدة البيانات
+    if col in COLUMN_MAPPING:
+        return COLUMN_MAPPING[col]
+    return str(col).strip().replace(' ', '_')
+
+
+@lru_cache(maxsize=None)
+def is_employee_column(col_name):
+    return any(emp_col in col_name for emp_col in EMPLOYEE_BASE_COLS)
+
+
+@lru_cache(maxsize=None)
+def is_money_column(col_name):
+    # أعمدة الشيت المعروفة (من COLUMN_MAPPING) التي تحمل مبالغ؛ الأعمدة الجديدة تبقى نصًا
+    return (col_name in KNOWN_COLUMNS and col_name not in PAYSLIP_TEXT_COLS
+            and not is_employee_column(col_name))
+
+
+def partition_columns(columns, employee_columns, payslip_columns):
+    # تقسيم أعمدة الشيت بين جدولي Employees و Payslips حسب الأعمدة الموجودة فعليًا
+    employee_cols = [c for c in columns if c in employee_columns]
+    payslip_cols = [c for c in columns if c in payslip_columns and c not in ('PayYear', 'PayMonth')]
+    return employee_cols, payslip_cols
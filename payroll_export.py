@@ -0,0 +1,103 @@
+# --- تصدير رواتب شهر كامل (CSV / XLSX) كاستجابة متدفقة ---
+# الصفوف تُقرأ من مؤشر قاعدة البيانات على دفعات (fetchmany) وتُكتب للعميل أولاً بأول،
+# فلا يحتفظ العامل بالشهر كاملاً في الذاكرة مهما كان عدد الموظفين.
+import csv
+import io
+import os
+import tempfile
+
+from payroll_columns import COLUMN_MAPPING
+from storage import quote_ident
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# عكس خريطة الأعمدة: الاسم الإنجليزي في قاعدة البيانات -> العنوان العربي كما في الشيت
+EXPORT_HEADERS = {}
+for _arabic, _english in COLUMN_MAPPING.items():
+    EXPORT_HEADERS.setdefault(_english, _arabic)
+
+
+def export_header(col):
+    # الأعمدة غير المعروفة أضيفت من الشيت بعد استبدال المسافات بـ _
+    return EXPORT_HEADERS.get(col, col.replace('_', ' '))
+
+
+def export_filename(year, month, fmt):
+    return f"payslips_{year}_{month}.{fmt}"
+
+
+def month_rows(conn, year, month, columns, batch_size=EXPORT_BATCH_SIZE):
+    # مولّد: يرجع الصفوف دفعة بعد دفعة من نفس المؤشر بدلاً من fetchall
+    select_list = ", ".join(quote_ident(c) for c in columns)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {select_list} FROM Payslips WHERE PayYear = ? AND PayMonth = ? ORDER BY EmployeeID",
+        (year, month)
+    )
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        cursor.close()
+
+
+def _cell(value):
+    return '' if value is None else value
+
+
+def csv_chunks(columns, rows, batch_size=EXPORT_BATCH_SIZE):
+    # BOM حتى يفتح Excel الملف بالعربية بشكل صحيح
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([export_header(c) for c in columns])
+    pending = 0
+    for row in rows:
+        writer.writerow([_cell(v) for v in row])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def xlsx_chunks(columns, rows, chunk_size=64 * 1024):
+    # ملف xlsx مضغوط (zip) لا يمكن كتابته للعميل قبل اكتماله، لذلك تكتب الصفوف
+    # بوضع write_only (بدون الاحتفاظ بها في الذاكرة) إلى ملف مؤقت ثم يُرسل الملف على أجزاء.
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.sheet_view.rightToLeft = True
+    sheet.append([export_header(c) for c in columns])
+    for row in rows:
+        sheet.append([_cell(v) for v in row])
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def export_chunks(fmt, columns, rows):
+    if fmt == 'xlsx':
+        return xlsx_chunks(columns, rows)
+    return csv_chunks(columns, rows)
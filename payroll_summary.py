@@ -0,0 +1,106 @@
+# --- ملخص الرواتب لكل شهر (PayrollMonthSummary) ---
+# يُحسب مرة واحدة عند رفع الشهر بدلاً من COUNT/SUM على كل صفوف الشهر مع كل فتح
+# لصفحة المدير، فتصبح لوحة المدير بحجم عدد الأشهر وليس عدد صفوف الرواتب.
+from payslip_queries import group_months
+from storage import dialect_of
+
+# بُعد التجميع -> مفتاحه في القاموس الناتج
+SUMMARY_DIMENSIONS = {'Department': 'by_department', 'CostCenterName': 'by_cost_center'}
+
+def summary_dimensions(employee_columns):
+    # الأبعاد الموجودة فعلاً في جدول الموظفين (قد لا تكون أضيفت بعد في قاعدة جديدة)
+    return [dim for dim in SUMMARY_DIMENSIONS if dim in employee_columns]
+
+
+def refresh_month_summary(cursor, pay_year, pay_month, dimensions):
+    # يُستدعى داخل نفس معاملة الرفع بعد إدخال رواتب الشهر
+    period = (pay_year, pay_month)
+    net_salary = dialect_of(cursor).to_decimal("p.NetSalary")
+    cursor.execute("DELETE FROM PayrollMonthSummary WHERE PayYear = ? AND PayMonth = ?", period)
+    cursor.execute("DELETE FROM PayrollMonthBreakdown WHERE PayYear = ? AND PayMonth = ?", period)
+    cursor.execute(f"""
+        SELECT COUNT(p.EmployeeID), SUM({net_salary})
+        FROM Payslips p
+        WHERE p.PayYear = ? AND p.PayMonth = ?
+    """, period)
+    headcount, total_net_salary = cursor.fetchone()
+    if not headcount:
+        # شهر بدون رواتب لا يظهر في الملخص
+        return
+    cursor.execute(
+        "INSERT INTO PayrollMonthSummary (PayYear, PayMonth, Headcount, TotalNetSalary) VALUES (?, ?, ?, ?)",
+        period + (headcount, total_net_salary)
+    )
+    for dim in dimensions:
+        cursor.execute(f"""
+            INSERT INTO PayrollMonthBreakdown (PayYear, PayMonth, Dimension, DimensionValue, Headcount, TotalNetSalary)
+            SELECT ?, ?, ?, COALESCE(e.[{dim}], ''), COUNT(p.EmployeeID), SUM({net_salary})
+            FROM Payslips p
+            LEFT JOIN Employees e ON e.EmployeeID = p.EmployeeID
+            WHERE p.PayYear = ? AND p.PayMonth = ?
+            GROUP BY COALESCE(e.[{dim}], '')
+        """, period + (dim,) + period)
+
+
+def backfill_summaries(cursor):
+    # للأشهر المرفوعة قبل وجود جدول الملخص (يستخدم في الترحيل)
+    cursor.execute("SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'Employees'")
+    dimensions = summary_dimensions({row[0] for row in cursor.fetchall()})
+    cursor.execute("SELECT DISTINCT PayYear, PayMonth FROM Payslips WHERE PayYear IS NOT NULL AND PayMonth IS NOT NULL")
+    for pay_year, pay_month in cursor.fetchall():
+        refresh_month_summary(cursor, pay_year, pay_month, dimensions)
+
+
+def summary_months(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT PayYear, PayMonth FROM PayrollMonthSummary ORDER BY PayYear DESC, PayMonth DESC")
+    return group_months(cursor.fetchall())
+
+
+def empty_summary(pay_year, pay_month):
+    # شهر ليس له ملخص محفوظ يُعرض بأصفار (الملخص يُحسب عند الرفع والترحيل فقط)
+    summary = {'year': pay_year, 'month': pay_month, 'total_employees': 0, 'total_net_salary': None}
+    for key in SUMMARY_DIMENSIONS.values():
+        summary[key] = []
+    return summary
+
+
+def month_stamp(conn, pay_year, pay_month):
+    # بصمة آخر تحديث لبيانات الشهر (الملخص يُعاد حسابه مع كل رفع)، و None إذا لم يكن له ملخص
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT Headcount, TotalNetSalary, UpdatedAt FROM PayrollMonthSummary WHERE PayYear = ? AND PayMonth = ?",
+        (pay_year, pay_month)
+    )
+    row = cursor.fetchone()
+    return None if row is None else "|".join(str(value) for value in row)
+
+
+def month_summary(conn, pay_year, pay_month):
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT Headcount, TotalNetSalary FROM PayrollMonthSummary WHERE PayYear = ? AND PayMonth = ?",
+        (pay_year, pay_month)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    summary = {
+        'year': pay_year,
+        'month': pay_month,
+        'total_employees': row[0],
+        'total_net_salary': row[1],
+    }
+    for key in SUMMARY_DIMENSIONS.values():
+        summary[key] = []
+    cursor.execute(
+        "SELECT Dimension, DimensionValue, Headcount, TotalNetSalary FROM PayrollMonthBreakdown "
+        "WHERE PayYear = ? AND PayMonth = ? ORDER BY Dimension, TotalNetSalary DESC",
+        (pay_year, pay_month)
+    )
+    for dimension, value, headcount, total in cursor.fetchall():
+        if dimension in SUMMARY_DIMENSIONS:
+            summary[SUMMARY_DIMENSIONS[dimension]].append(
+                {'name': value, 'total_employees': headcount, 'total_net_salary': total}
+            )
+    return summary
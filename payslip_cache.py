@@ -0,0 +1,179 @@
+# --- ذاكرة مؤقتة لقسائم الموظفين (صفحات /my_payslips) ---
+# بيانات الشهر لا تتغير إلا عند رفع شيت جديد لنفس الشهر، لذلك تُحفظ القسيمة بعد معالجتها
+# بمفتاح (EmployeeID، السنة، الشهر) في ذاكرة LRU داخل كل عامل، واختياريًا في ملف SQLite
+# مشترك بين عمال gunicorn. الإبطال يتم لكل شهر عبر ملف إصدار (مثل SchemaCache): رفع الشهر
+# يغير وقت تعديل ملفه فتصبح كل المفاتيح القديمة لهذا الشهر غير مستخدمة في كل العمال.
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+MONTHS_VERSION = "months"  # يتغير مع أي رفع لأن قائمة أشهر الموظف قد تتغير
+
+
+class VersionFile:
+    # الإصدار = وقت تعديل الملف؛ touch يغيره فيلاحظ كل عامل أن ما لديه قديم
+    # (بدون مسار: عامل واحد والإصدار ثابت 0 والإبطال محلي فقط)
+    def __init__(self, path=None):
+        self.path = path
+
+    @classmethod
+    def named(cls, directory, name):
+        # ملف إصدار لكل اسم داخل مجلد (مثل إصدار كل شهر)
+        if not directory:
+            return cls()
+        return cls(os.path.join(directory, f"{re.sub(r'[^0-9A-Za-z_-]', '_', name)}.version"))
+
+    def version(self):
+        if not self.path:
+            return 0
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def touch(self):
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a'):
+                os.utime(self.path, None)
+
+
+class LRUCache:
+    def __init__(self, max_entries=10000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    # المستوى المشترك: ملف محلي يقرأه كل العمال (القيم محفوظة بـ pickle)
+    PRUNE_EVERY = 500
+
+    def __init__(self, path, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self._sets = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS Cache (Key TEXT PRIMARY KEY, Value BLOB NOT NULL, ExpiresAt REAL NOT NULL)")
+            db.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT Value FROM Cache WHERE Key = ? AND ExpiresAt > ?", (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        self._sets += 1
+        with closing(self._connect()) as db:
+            db.execute("INSERT OR REPLACE INTO Cache (Key, Value, ExpiresAt) VALUES (?, ?, ?)",
+                       (key, pickle.dumps(value), time.time() + self.ttl))
+            if self._sets % self.PRUNE_EVERY == 0:
+                db.execute("DELETE FROM Cache WHERE ExpiresAt <= ?", (time.time(),))
+            db.commit()
+
+    def delete_prefix(self, prefix):
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM Cache WHERE substr(Key, 1, ?) = ?", (len(prefix), prefix))
+            db.commit()
+
+
+class PayslipCache:
+    def __init__(self, max_entries=10000, ttl=3600, version_dir=None, shared_path=None):
+        self.local = LRUCache(max_entries, ttl)
+        self.shared = SQLiteCacheBackend(shared_path, ttl) if shared_path else None
+        self.version_dir = version_dir
+
+    def _version(self, name):
+        return VersionFile.named(self.version_dir, name).version()
+
+    def _touch(self, name):
+        VersionFile.named(self.version_dir, name).touch()
+
+    def _get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def _set(self, key, value):
+        self.local.set(key, value)
+        if self.shared:
+            self.shared.set(key, value)
+
+    def _payslip_key(self, employee_id, year, month):
+        return f"payslip|{year}|{month}|{employee_id}|{self._version(f'{year}_{month}')}"
+
+    def _months_key(self, employee_id):
+        return f"months|{employee_id}|{self._version(MONTHS_VERSION)}"
+
+    def get_payslip(self, employee_id, year, month):
+        return self._get(self._payslip_key(employee_id, year, month))
+
+    def set_payslip(self, employee_id, year, month, payslip):
+        self._set(self._payslip_key(employee_id, year, month), payslip)
+
+    def get_months(self, employee_id):
+        return self._get(self._months_key(employee_id))
+
+    def set_months(self, employee_id, months):
+        self._set(self._months_key(employee_id), months)
+
+    def invalidate_month(self, year, month):
+        # يستدعى بعد أن يستبدل الرفع بيانات الشهر فعلاً
+        self._touch(f"{year}_{month}")
+        self._touch(MONTHS_VERSION)
+        for prefix in (f"payslip|{year}|{month}|", "months|"):
+            self.local.delete_prefix(prefix)
+            if self.shared:
+                self.shared.delete_prefix(prefix)
+
+    def stats(self):
+        return {
+            'entries': len(self.local),
+            'hits': self.local.hits,
+            'misses': self.local.misses,
+            'shared': bool(self.shared),
+            'pid': os.getpid(),
+        }
@@ -0,0 +1,150 @@
+# --- تنظيم بيانات الراتب إلى استحقاقات واستقطاعات وإجماليات ---
+# تستخدمها صفحة تفاصيل راتب الموظف ومهمة توليد ملفات PDF لكل رواتب الشهر (في عمليات منفصلة)،
+# لذلك هي هنا وليست داخل App.py حتى لا تستورد العمليات تطبيق Flask وتجمع الاتصالات.
+from functools import lru_cache
+
+from payroll_columns import COLUMN_MAPPING
+
+NON_SALARY_COLS = frozenset([
+    'PayslipID', 'EmployeeID', 'EmployeeName', 'NationalID', 'Role', 'JobTitle',
+    'CostCenterCode', 'CostCenterName', 'Department', 'MobileNumber', 'PayMonth', 'PayYear',
+    'TotalAllowances', 'TotalEntitlements', 'TotalDeductions', 'NetSalary', # سنتجاهل الصافي من الملف
+    'PreviousInsurancePeriod'
+])
+
+ARABIC_LABELS = {v: k for k, v in COLUMN_MAPPING.items()}
+
+# أعمدة لا تقرأها صفحة القسيمة: رقم السجل، والصافي الذي يُعاد حسابه من الإجماليات
+DETAIL_SKIPPED_COLS = frozenset(['PayslipID', 'NetSalary'])
+
+
+def _parse_amount(value):
+    # بند في عمود نصي (عمود جديد من الشيت): رقم إن أمكن وإلا None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+class PayslipLayout:
+    # تصنيف الأعمدة (بند راتب أم لا) والعنوان العربي لكل عمود يُحسبان مرة واحدة لكل قائمة أعمدة
+    # بدلاً من إعادة بنائهما مع كل قسيمة
+    def __init__(self, columns=(), money_columns=None):
+        self.columns = tuple(columns)
+        # أعمدة DECIMAL في الجدول: قيمها أرقام فتُحول مباشرة، ولا تُجرب قراءة الرقم إلا من
+        # الأعمدة النصية (None: أنواع الأعمدة غير معروفة فتُجرب كل القيم)
+        self.money_columns = None if money_columns is None else frozenset(money_columns)
+        self._labels = {}
+        for col in self.columns:
+            self._label(col)
+
+    @property
+    def detail_columns(self):
+        # أعمدة استعلام القسيمة: بنود الراتب والإجماليات وبيانات العرض (رقم الموظف، الاسم، الفترة)
+        return tuple(c for c in self.columns if c not in DETAIL_SKIPPED_COLS)
+
+    def _label(self, col):
+        # None: عمود ليس بند راتب (بيانات الموظف أو الإجماليات)
+        label = None if col in NON_SALARY_COLS else ARABIC_LABELS.get(col, col)
+        self._labels[col] = label
+        return label
+
+    def _totals(self, payslip, total_entitlements, total_deductions):
+        payslip['totals'] = {
+            'إجمالي الاستحقاقات': total_entitlements,
+            'إجمالي الاستقطاعات': total_deductions
+        }
+
+    def process(self, raw_data):
+        # 1. جلب الإجماليات وتحويلها إلى أرقام بشكل آمن
+        total_entitlements = float(raw_data.get('TotalEntitlements', 0) or 0)
+        total_deductions = float(raw_data.get('TotalDeductions', 0) or 0)
+
+        # 2. حساب صافي المرتب الصحيح وتحديث البيانات الخام به
+        raw_data['NetSalary'] = total_entitlements + total_deductions
+
+        entitlements = {}
+        deductions = {}
+        labels = self._labels
+        money = self.money_columns
+        for db_col_name, value in raw_data.items():
+            label = labels[db_col_name] if db_col_name in labels else self._label(db_col_name)
+            if label is None or value is None or value == '':
+                continue
+            if money is not None and db_col_name in money:
+                numeric_value = float(value)
+            else:
+                numeric_value = _parse_amount(value)
+                if numeric_value is None:
+                    continue
+            if numeric_value > 0:
+                entitlements[label] = numeric_value
+            elif numeric_value < 0:
+                # نعرض الاستقطاعات كأرقام موجبة لتجنب علامة السالب المزدوجة
+                deductions[label] = abs(numeric_value)
+
+        payslip = {'raw_data': raw_data, 'entitlements': entitlements, 'deductions': deductions}
+        self._totals(payslip, total_entitlements, total_deductions)
+        return payslip
+
+    def process_rows(self, names, rows):
+        # نفس نتيجة process لكل صف، لكن مواضع أعمدة بنود الراتب وعناوينها تُحدد مرة واحدة
+        # للدفعة كاملة، فلا يمر كل صف إلا على أعمدة البنود فقط
+        names = list(names)
+        labels = [self._labels[col] if col in self._labels else self._label(col) for col in names]
+        money = self.money_columns
+        salary = [(i, label, money is not None and names[i] in money)
+                  for i, label in enumerate(labels) if label is not None]
+        entitled_at = names.index('TotalEntitlements') if 'TotalEntitlements' in names else None
+        deducted_at = names.index('TotalDeductions') if 'TotalDeductions' in names else None
+
+        payslips = []
+        for row in rows:
+            total_entitlements = float(row[entitled_at] or 0) if entitled_at is not None else 0.0
+            total_deductions = float(row[deducted_at] or 0) if deducted_at is not None else 0.0
+            raw_data = dict(zip(names, row))
+            raw_data['NetSalary'] = total_entitlements + total_deductions
+
+            entitlements = {}
+            deductions = {}
+            for i, label, is_money in salary:
+                value = row[i]
+                if value is None or value == '':
+                    continue
+                if is_money:
+                    numeric_value = float(value)
+                else:
+                    numeric_value = _parse_amount(value)
+                    if numeric_value is None:
+                        continue
+                if numeric_value > 0:
+                    entitlements[label] = numeric_value
+                elif numeric_value < 0:
+                    deductions[label] = -numeric_value
+
+            payslip = {'raw_data': raw_data, 'entitlements': entitlements, 'deductions': deductions}
+            self._totals(payslip, total_entitlements, total_deductions)
+            payslips.append(payslip)
+        return payslips
+
+    def process_many(self, records):
+        # records: قائمة dict لها نفس المفاتيح (مثل دفعات توليد PDF)
+        if not records:
+            return []
+        names = list(records[0])
+        return self.process_rows(names, ([r.get(n) for n in names] for r in records))
+
+
+@lru_cache(maxsize=8)
+def compiled_layout(columns, money_columns=None):
+    # columns: tuple الأعمدة من SchemaCache و money_columns أعمدة DECIMAL منه (frozenset)؛ بعد أن
+    # تضيف مزامنة الهيكل أعمدة جديدة تتغير القائمة فيُبنى تصنيف جديد تلقائيًا
+    return PayslipLayout(columns, money_columns)
+
+
+DEFAULT_LAYOUT = PayslipLayout()
+
+
+# --- دالة مساعدة لتنظيم بيانات الراتب (الإصدار النهائي مع الحساب التلقائي) ---
+def process_payslip_data(raw_data):
+    return DEFAULT_LAYOUT.process(raw_data)
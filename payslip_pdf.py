@@ -0,0 +1,210 @@
+# --- توليد قسائم الرواتب PDF لشهر كامل ---
+# الصفوف تُقرأ من قاعدة البيانات على دفعات في العملية الرئيسية، ورسم ملفات PDF (الجزء
+# الثقيل على المعالج) يتم في مجموعة عمليات (process pool) متوازية، ثم تُكتب النتائج
+# في ملف zip واحد أو ملف zip لكل إدارة.
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from functools import lru_cache
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+
+from payslip_layout import compiled_layout
+from storage import quote_ident
+
+PDF_BATCH_SIZE = 50  # عدد القسائم التي ترسل لعملية الرسم في المرة الواحدة
+DEFAULT_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+FONT_NAME = "PayslipFont"
+
+
+def _init_worker(font_path):
+    # تسجيل الخط مرة واحدة في كل عملية رسم
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    pdfmetrics.registerFont(TTFont(FONT_NAME, font_path))
+
+
+@lru_cache(maxsize=4096)
+def _ar(text):
+    # reportlab لا يدعم تشكيل الحروف العربية ولا اتجاه الكتابة من اليمين لليسار
+    # (أسماء البنود تتكرر في كل القسائم، لذلك تُحفظ نتيجة التشكيل)
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+
+    return get_display(arabic_reshaper.reshape(str(text)))
+
+
+def _amount(value):
+    return f"{value:,.2f}"
+
+
+def render_payslip_pdf(payslip, year, month):
+    # payslip: ناتج process_payslip_data (استحقاقات واستقطاعات وإجماليات)
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    raw_data = payslip['raw_data']
+    buffer = BytesIO()
+    width, height = A4
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+    right = width - 50
+    y = height - 60
+
+    pdf.setFont(FONT_NAME, 16)
+    pdf.drawRightString(right, y, _ar(f"قسيمة راتب شهر {month} / {year}"))
+    y -= 30
+    pdf.setFont(FONT_NAME, 11)
+    for label, key in (('الاسم', 'EmployeeName'), ('رقم الموظف', 'EmployeeID'),
+                       ('الإدارة', 'Department'), ('الوظيفة', 'JobTitle')):
+        value = raw_data.get(key)
+        if value:
+            pdf.drawRightString(right, y, _ar(f"{label}: {value}"))
+            y -= 18
+
+    for title, items in (('الاستحقاقات', payslip['entitlements']),
+                         ('الاستقطاعات', payslip['deductions'])):
+        y -= 12
+        pdf.setFont(FONT_NAME, 13)
+        pdf.drawRightString(right, y, _ar(title))
+        y -= 20
+        pdf.setFont(FONT_NAME, 10)
+        for name, value in items.items():
+            if y < 80:
+                pdf.showPage()
+                pdf.setFont(FONT_NAME, 10)
+                y = height - 60
+            pdf.drawRightString(right, y, _ar(name))
+            pdf.drawString(60, y, _amount(value))
+            y -= 16
+
+    y -= 12
+    pdf.setFont(FONT_NAME, 12)
+    for label, value in list(payslip['totals'].items()) + [('الصافي', payslip['raw_data']['NetSalary'])]:
+        pdf.drawRightString(right, y, _ar(label))
+        pdf.drawString(60, y, _amount(value))
+        y -= 18
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def _render_batch(batch, year, month, money_columns=None):
+    # تنفذ داخل عملية الرسم: ترجع (رقم الموظف، الإدارة، محتوى PDF) لكل قسيمة
+    payslips = compiled_layout((), money_columns).process_many([raw_data for _, _, raw_data in batch])
+    return [(employee_id, department, render_payslip_pdf(payslip, year, month))
+            for (employee_id, department, _), payslip in zip(batch, payslips)]
+
+
+def _safe_name(value):
+    value = re.sub(r'[\\/:*?"<>|\s]+', '_', str(value or '').strip())
+    return value or 'بدون_إدارة'
+
+
+def month_payslip_batches(conn, year, month, payslip_columns, employee_columns, batch_size=PDF_BATCH_SIZE):
+    # مولّد دفعات: [(EmployeeID, Department, raw_data)] من مؤشر واحد عبر fetchmany
+    select_list = ", ".join(f"p.{quote_ident(c)}" for c in payslip_columns)
+    department = "COALESCE(e.Department, '')" if 'Department' in employee_columns else "''"
+    job_title = ", e.JobTitle AS EmpJobTitle" if 'JobTitle' in employee_columns else ""
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {select_list}, {department} AS EmpDepartment{job_title} "
+        f"FROM Payslips p LEFT JOIN Employees e ON e.EmployeeID = p.EmployeeID "
+        f"WHERE p.PayYear = ? AND p.PayMonth = ? ORDER BY p.EmployeeID",
+        (year, month)
+    )
+    names = [d[0] for d in cursor.description]
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = []
+            for row in rows:
+                record = dict(zip(names, row))
+                dept = record.pop('EmpDepartment')
+                if 'EmpJobTitle' in record:
+                    record.setdefault('JobTitle', record.pop('EmpJobTitle'))
+                record.setdefault('Department', dept)
+                batch.append((record['EmployeeID'], dept, record))
+            yield batch
+    finally:
+        cursor.close()
+
+
+class _ArchiveWriter:
+    # zip واحد للشهر أو zip لكل إدارة داخل مجلد الإخراج
+    def __init__(self, output_dir, year, month, by_department):
+        self.output_dir = output_dir
+        self.prefix = f"payslips_{year}_{month}"
+        self.by_department = by_department
+        self._archives = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _archive(self, department):
+        name = f"{self.prefix}_{_safe_name(department)}.zip" if self.by_department else f"{self.prefix}.zip"
+        if name not in self._archives:
+            self._archives[name] = zipfile.ZipFile(os.path.join(self.output_dir, name), 'w', zipfile.ZIP_DEFLATED)
+        return self._archives[name]
+
+    def write(self, employee_id, department, content):
+        self._archive(department).writestr(f"{_safe_name(employee_id)}.pdf", content)
+
+    def close(self):
+        for archive in self._archives.values():
+            archive.close()
+        return sorted(self._archives)
+
+
+def generate_month_pdfs(conn, year, month, payslip_columns, employee_columns, output_dir,
+                        by_department=False, workers=None, font_path=None, progress=None, money_columns=None):
+    # money_columns: أعمدة DECIMAL في جدول Payslips (frozenset) لتصنيف البنود بدون تجربة كل قيمة
+    font_path = font_path or DEFAULT_FONT_PATH
+    workers = workers or os.cpu_count() or 1
+    if progress:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM Payslips WHERE PayYear = ? AND PayMonth = ?", (year, month))
+        progress(phase='render', rows_total=cursor.fetchone()[0])
+
+    started = time.monotonic()
+    writer = _ArchiveWriter(output_dir, year, month, by_department)
+    rendered = 0
+    # spawn بدلاً من fork: العملية الأم فيها threads واتصالات قاعدة بيانات مفتوحة
+    context = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(font_path,)) as pool:
+            in_flight = set()
+            batches = month_payslip_batches(conn, year, month, payslip_columns, employee_columns)
+
+            def drain(return_when):
+                nonlocal in_flight, rendered
+                done, in_flight = wait(in_flight, return_when=return_when)
+                for future in done:
+                    for employee_id, department, content in future.result():
+                        writer.write(employee_id, department, content)
+                        rendered += 1
+                if progress:
+                    progress(rows_processed=rendered)
+
+            # عدد محدود من الدفعات قيد التنفيذ حتى لا يُحمّل الشهر كاملاً في الذاكرة
+            for batch in batches:
+                in_flight.add(pool.submit(_render_batch, batch, year, month, money_columns))
+                if len(in_flight) >= workers * 2:
+                    drain(FIRST_COMPLETED)
+            if in_flight:
+                drain(ALL_COMPLETED)
+    finally:
+        files = writer.close()
+
+    elapsed = time.monotonic() - started
+    return {
+        'payslips': rendered,
+        'files': files,
+        'workers': workers,
+        'seconds': round(elapsed, 2),
+        'payslips_per_sec': round(rendered / elapsed, 1) if elapsed > 0 else 0,
+    }
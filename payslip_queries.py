@@ -0,0 +1,39 @@
+# --- استعلامات صفحات رواتب الموظف ---
+# استعلامات ضيقة تعتمد على الفهرس IX_Payslips_Employee_Period (انظر migrations.py)
+# وتقرأ النتائج بالترتيب وليس بأسماء الخصائص حتى تعمل مع أي مشغل DB-API.
+from storage import quote_ident
+
+
+def group_months(rows):
+    # {السنة: [الأشهر]} مع تجاهل السجلات التي سنتها أو شهرها فارغ
+    payslip_data = {}
+    for year, month in rows:
+        if not year or not month:
+            continue
+        payslip_data.setdefault(year, []).append(month)
+    return payslip_data
+
+
+def employee_months(conn, employee_id, archived=()):
+    # archived: أشهر الموظف المؤرشفة (أقدم من أشهر الجدول الحي فتأتي بعدها)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT DISTINCT PayYear, PayMonth FROM Payslips WHERE EmployeeID = ? "
+        "ORDER BY PayYear DESC, PayMonth DESC",
+        (employee_id,)
+    )
+    return group_months(list(cursor.fetchall()) + list(archived))
+
+
+def employee_payslip(conn, employee_id, year, month, columns):
+    # columns: الأعمدة التي تعرضها صفحة التفاصيل فقط (PayslipLayout.detail_columns بدلاً من SELECT *)
+    select_list = ", ".join(quote_ident(c) for c in columns)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {select_list} FROM Payslips WHERE EmployeeID = ? AND PayYear = ? AND PayMonth = ?",
+        (employee_id, year, month)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return dict(zip([d[0] for d in cursor.description], row))
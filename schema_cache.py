@@ -0,0 +1,64 @@
+# --- ذاكرة مؤقتة لأعمدة الجداول (بدلاً من INFORMATION_SCHEMA مع كل طلب) ---
+# الأعمدة لا تتغير إلا عندما يضيف رفع الشيت أعمدة جديدة عبر ALTER TABLE،
+# وعندها يتم إبطال الذاكرة. ملف الإصدار (version_path) يجعل الإبطال يصل لكل
+# عمال gunicorn: كل عامل يقارن وقت تعديل الملف قبل استخدام ما لديه.
+import threading
+import time
+
+from payslip_cache import VersionFile
+from storage import dialect_of
+
+
+class SchemaCache:
+    def __init__(self, tables=('Employees', 'Payslips'), version_path=None, max_age=3600):
+        self.tables = tuple(tables)
+        self.version_file = VersionFile(version_path)
+        self.max_age = max_age  # حد أقصى احتياطي في حال تعديل الهيكل من خارج التطبيق
+        self._lock = threading.Lock()
+        self._columns = {}
+        self._types = {}
+        self._loaded_at = 0.0
+        self._version = None
+
+    def _load(self, conn):
+        # INFORMATION_SCHEMA في SQL Server أو PRAGMA table_info في SQLite
+        types = {table: {} for table in self.tables}
+        for table, column, data_type in dialect_of(conn).table_columns(conn.cursor(), self.tables):
+            types[table][column] = data_type
+        return types
+
+    def _ensure(self, conn):
+        version = self.version_file.version()
+        with self._lock:
+            fresh = (self._columns and version == self._version
+                     and time.monotonic() - self._loaded_at < self.max_age)
+            if fresh:
+                return self._columns, self._types
+        types = self._load(conn)
+        columns = {table: tuple(cols) for table, cols in types.items()}
+        with self._lock:
+            self._columns = columns
+            self._types = types
+            self._version = version
+            self._loaded_at = time.monotonic()
+        return columns, types
+
+    def columns(self, conn, table):
+        # أسماء الأعمدة بترتيبها في الجدول
+        return self._ensure(conn)[0][table]
+
+    def column_set(self, conn, table):
+        return frozenset(self.columns(conn, table))
+
+    def column_types(self, conn, table):
+        # {اسم العمود: DATA_TYPE} مثل 'nvarchar' أو 'decimal'
+        return self._ensure(conn)[1][table]
+
+    def typed_columns(self, conn, table, data_type):
+        return frozenset(c for c, t in self.column_types(conn, table).items() if t == data_type)
+
+    def invalidate(self):
+        # يستدعى بعد أن يضيف ALTER TABLE أعمدة فعلاً
+        with self._lock:
+            self._columns = {}
+        self.version_file.touch()
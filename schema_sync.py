@@ -0,0 +1,94 @@
+# --- تخطيط مزامنة هيكل الجداول مع أعمدة الشيت ---
+# تحسب كل الأعمدة الناقصة أولاً ثم تضاف بجملة ALTER واحدة لكل جدول داخل معاملة
+# واحدة، بدلاً من ALTER منفصلة (وقفل منفصل على الجدول) لكل عمود جديد.
+from payroll_columns import MONEY_TYPE, is_employee_column, is_money_column
+from storage import SQLSERVER, dialect_of, quote_ident
+
+EMPLOYEE_COLUMN_TYPE = "NVARCHAR(255) NULL"
+MONEY_COLUMN_TYPE = f"{MONEY_TYPE} NULL"
+
+
+class SchemaPlan:
+    def __init__(self, employee_additions=(), payslip_additions=(), money_additions=(), dialect=SQLSERVER):
+        self.employee_additions = list(employee_additions)
+        self.payslip_additions = list(payslip_additions)
+        # أعمدة الرواتب الجديدة التي تضاف كـ DECIMAL بدلاً من نص: المبالغ المعروفة بالاسم فقط
+        self.money_additions = [c for c in money_additions if c in self.payslip_additions and is_money_column(c)]
+        self.dialect = dialect
+
+    def __bool__(self):
+        return bool(self.employee_additions or self.payslip_additions)
+
+    @property
+    def statements(self):
+        statements = []
+        money = set(self.money_additions)
+        for table, additions, col_type in (
+            ('Employees', self.employee_additions, EMPLOYEE_COLUMN_TYPE),
+            ('Payslips', self.payslip_additions, f"{self.dialect.text_type} NULL"),
+        ):
+            cols = [f"{quote_ident(c)} {MONEY_COLUMN_TYPE if c in money else col_type}" for c in additions]
+            if not cols:
+                continue
+            if self.dialect.multi_column_alter:
+                statements.append(f"ALTER TABLE {table} ADD {', '.join(cols)}")
+            else:
+                statements.extend(f"ALTER TABLE {table} ADD COLUMN {col}" for col in cols)
+        return statements
+
+    def as_dict(self):
+        return {
+            'employee_additions': self.employee_additions,
+            'payslip_additions': self.payslip_additions,
+            'money_additions': self.money_additions,
+            'statements': self.statements,
+        }
+
+
+def plan_schema_changes(sheet_columns, db_employee_columns, db_payslip_columns, dialect=SQLSERVER):
+    employee_additions = []
+    payslip_additions = []
+    for col_name in dict.fromkeys(sheet_columns):
+        if is_employee_column(col_name):
+            if col_name not in db_employee_columns:
+                employee_additions.append(col_name)
+        elif col_name not in db_payslip_columns:
+            payslip_additions.append(col_name)
+    money_additions = [c for c in payslip_additions if is_money_column(c)]
+    return SchemaPlan(employee_additions, payslip_additions, money_additions, dialect)
+
+
+def apply_plan(conn, plan):
+    cursor = conn.cursor()
+    try:
+        for statement in plan.statements:
+            cursor.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def sync_schema(conn, schema, sheet_columns, dry_run=False):
+    # المزامنة الديناميكية لهيكل قاعدة البيانات: إضافة أعمدة الشيت الجديدة
+    # الأعمدة الحالية تأتي من الذاكرة المؤقتة ولا تُقرأ من قاعدة البيانات إلا بعد إضافة فعلية
+    dialect = dialect_of(conn)
+    db_employee_columns = schema.column_set(conn, 'Employees')
+    db_payslip_columns = schema.column_set(conn, 'Payslips')
+    plan = plan_schema_changes(sheet_columns, db_employee_columns, db_payslip_columns, dialect)
+    if dry_run or not plan:
+        return db_employee_columns, db_payslip_columns, plan
+
+    try:
+        apply_plan(conn, plan)
+    except Exception:
+        # ربما أضاف عامل آخر نفس الأعمدة قبل أن تصل ذاكرتنا المؤقتة: إعادة القراءة والتخطيط مرة واحدة
+        schema.invalidate()
+        plan = plan_schema_changes(sheet_columns, schema.column_set(conn, 'Employees'),
+                                   schema.column_set(conn, 'Payslips'), dialect)
+        if plan:
+            apply_plan(conn, plan)
+
+    # تحديث قوائم الأعمدة بعد الإضافة (ولكل العمال عبر ملف الإصدار)
+    schema.invalidate()
+    return schema.column_set(conn, 'Employees'), schema.column_set(conn, 'Payslips'), plan
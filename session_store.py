@@ -0,0 +1,194 @@
+# --- مخزن الجلسات ورموز التحقق على الخادم ---
+# الكوكي يحمل رقم الجلسة فقط، وبيانات الجلسة (رقم الموظف، الصلاحية، رسائل flash) ورموز
+# التحقق وعدادات المحاولات محفوظة في مخزن مشترك بين عمال gunicorn مع مدة صلاحية لكل مفتاح.
+# أي مخزن يطبق get / set / delete / incr (نفس أوامر Redis الأساسية) يمكن استخدامه.
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class MemoryStore:
+    # داخل العملية فقط: للتطوير أو لتشغيل عامل واحد
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, ttl=None):
+        # مدة الصلاحية تبدأ مع أول زيادة (نافذة ثابتة مثل INCR + EXPIRE)
+        with self._lock:
+            now = time.time()
+            entry = self._live(key, now)
+            value = (entry[0] if entry else 0) + 1
+            expires_at = entry[1] if entry else (now + ttl if ttl else None)
+            self._data[key] = (value, expires_at)
+            return value
+
+    def prune(self):
+        with self._lock:
+            now = time.time()
+            for key in [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]:
+                del self._data[key]
+
+
+class SQLiteStore:
+    # ملف SQLite محلي مشترك بين العمال (يمكن وضعه في /dev/shm ليبقى في الذاكرة)
+    # البحث بالمفتاح الأساسي، والمفاتيح المنتهية تُتجاهل عند القراءة وتحذف دوريًا
+    PRUNE_INTERVAL = 300
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS KV (Key TEXT PRIMARY KEY, Value TEXT NOT NULL, ExpiresAt REAL)")
+        db.commit()
+
+    def _db(self):
+        # اتصال لكل thread داخل كل عامل (لا يُستخدم اتصال العملية الأم بعد fork)
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def get(self, key):
+        row = self._db().execute(
+            "SELECT Value FROM KV WHERE Key = ? AND (ExpiresAt IS NULL OR ExpiresAt > ?)", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        self._db().execute(
+            "INSERT OR REPLACE INTO KV (Key, Value, ExpiresAt) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None)
+        )
+        if now - self._last_prune > self.PRUNE_INTERVAL:
+            self.prune()
+
+    def delete(self, key):
+        self._db().execute("DELETE FROM KV WHERE Key = ?", (key,))
+
+    def incr(self, key, ttl=None):
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT Value, ExpiresAt FROM KV WHERE Key = ? AND (ExpiresAt IS NULL OR ExpiresAt > ?)", (key, now)
+            ).fetchone()
+            value = (json.loads(row[0]) if row else 0) + 1
+            expires_at = row[1] if row else (now + ttl if ttl else None)
+            db.execute("INSERT OR REPLACE INTO KV (Key, Value, ExpiresAt) VALUES (?, ?, ?)",
+                       (key, json.dumps(value), expires_at))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return value
+
+    def prune(self):
+        self._last_prune = time.time()
+        self._db().execute("DELETE FROM KV WHERE ExpiresAt IS NOT NULL AND ExpiresAt <= ?", (self._last_prune,))
+
+
+def store_from_spec(spec, default_path):
+    # 'memory' أو 'sqlite' (الملف الافتراضي) أو 'sqlite:/dev/shm/payslip_sessions.db'
+    spec = (spec or 'sqlite').strip()
+    if spec == 'memory':
+        return MemoryStore()
+    if spec.startswith('sqlite:'):
+        return SQLiteStore(spec[len('sqlite:'):])
+    return SQLiteStore(default_path)
+
+
+# --- جلسات Flask على الخادم ---
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        # رقم جلسة جديد عند تسجيل الدخول (حماية من تثبيت الجلسة) وحذف القديم من المخزن
+        self.previous_sid = self.previous_sid or self.sid
+        self.sid = new_sid()
+        self.modified = True
+
+
+def new_sid():
+    return secrets.token_urlsafe(32)
+
+
+class StoreSessionInterface(SessionInterface):
+    key_prefix = "session:"
+
+    def __init__(self, store, ttl=8 * 3600):
+        self.store = store
+        self.ttl = ttl
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(self.key_prefix + sid)
+            if data is not None:
+                return ServerSession(data, sid=sid)
+        return ServerSession(sid=new_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.previous_sid:
+            self.store.delete(self.key_prefix + session.previous_sid)
+
+        if not session:
+            # جلسة فارغة (مثلاً بعد تسجيل الخروج): حذفها من المخزن ومن المتصفح
+            if session.modified and not session.new:
+                self.store.delete(self.key_prefix + session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified:
+            self.store.set(self.key_prefix + session.sid, dict(session), self.ttl)
+        if session.modified or session.new:
+            response.set_cookie(
+                name, session.sid, max_age=self.ttl, httponly=self.get_cookie_httponly(app),
+                domain=domain, path=path, secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
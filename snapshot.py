@@ -0,0 +1,229 @@
+# --- لقطة الشهر المنشور (ملف ثنائي للقراءة فقط عبر mmap) ---
+# يوم صرف الرواتب يُقرأ نفس الشهر آلاف المرات ولا يُكتب. "نشر الشهر" يحول قسائمه إلى ملف
+# ثابت: رأس، أسماء الأعمدة، سجل لكل موظف بتخطيط أعمدة ثابت، ثم فهرس مرتب برقم الموظف
+# (مفتاح بعرض ثابت + موضع السجل). كل عمال gunicorn يفتحون الملف بـ mmap فتُشارك صفحاته
+# في ذاكرة النظام، وقراءة قسيمة = بحث ثنائي في الفهرس بدون أي اتصال بقاعدة البيانات.
+# الأشهر غير المنشورة تُقرأ من قاعدة البيانات كالمعتاد.
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+MAGIC = b'PAYSNAP1'
+# magic، عدد الأعمدة، عدد السجلات، عرض مفتاح الفهرس، موضع الفهرس
+HEADER = struct.Struct('<8sIIIQ')
+INDEX_ENTRY_TAIL = struct.Struct('<QI')  # موضع السجل وطوله بعد المفتاح
+
+# نوع كل قيمة في السجل
+TAG_NONE, TAG_STR, TAG_INT, TAG_DECIMAL, TAG_FLOAT = range(5)
+
+
+def _file_name(year, month):
+    return f"payslips_{int(year)}_{re.sub(r'[^0-9A-Za-z_-]', '_', str(month))}.snap"
+
+
+def _encode_value(value):
+    if value is None:
+        return TAG_NONE, b''
+    if isinstance(value, bool):
+        return TAG_INT, str(int(value)).encode('ascii')
+    if isinstance(value, int):
+        return TAG_INT, str(value).encode('ascii')
+    if isinstance(value, Decimal):
+        return TAG_DECIMAL, str(value).encode('ascii')
+    if isinstance(value, float):
+        return TAG_FLOAT, repr(value).encode('ascii')
+    return TAG_STR, str(value).encode('utf-8')
+
+
+_DECODERS = {
+    TAG_STR: lambda raw: raw.decode('utf-8'),
+    TAG_INT: lambda raw: int(raw),
+    TAG_DECIMAL: lambda raw: Decimal(raw.decode('ascii')),
+    TAG_FLOAT: lambda raw: float(raw),
+}
+
+
+def write_snapshot(path, columns, rows, money_columns=None, stamp=None):
+    # rows: صفوف (tuple) بترتيب columns؛ أول صف لكل رقم موظف هو المعتمد
+    # money_columns: أعمدة DECIMAL وقت النشر (تُحفظ مع الأسماء لتصنيف بنود القسيمة)
+    # stamp: بصمة الشهر في قاعدة البيانات وقت النشر (month_stamp) يقارنها القارئ بالبصمة الحالية
+    columns = list(columns)
+    id_index = columns.index('EmployeeID')
+    record_header = struct.Struct('<' + 'BI' * len(columns))
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    entries = {}
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, 0, 0, 0, 0))
+            money = None if money_columns is None else sorted(c for c in money_columns if c in columns)
+            names = json.dumps({'columns': columns, 'money': money, 'stamp': stamp}, ensure_ascii=False).encode('utf-8')
+            f.write(struct.pack('<I', len(names)))
+            f.write(names)
+            offset = f.tell()
+            for row in rows:
+                key = str(row[id_index]).encode('utf-8')
+                if key in entries:
+                    continue
+                encoded = [_encode_value(v) for v in row]
+                header_values = []
+                for tag, payload in encoded:
+                    header_values += [tag, len(payload)]
+                record = record_header.pack(*header_values) + b''.join(payload for _, payload in encoded)
+                f.write(record)
+                entries[key] = (offset, len(record))
+                offset += len(record)
+
+            key_width = max((len(k) for k in entries), default=1)
+            entry = struct.Struct(f'<{key_width}s')
+            for key in sorted(entries):
+                f.write(entry.pack(key) + INDEX_ENTRY_TAIL.pack(*entries[key]))
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, len(columns), len(entries), key_width, offset))
+            f.flush()
+            os.fsync(f.fileno())
+        # الاستبدال الذري: العمال الذين فتحوا الملف القديم يكملون عليه حتى يلاحظوا التغيير
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(entries)
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_columns, self.count, self.key_width, self._index_offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"ليس ملف لقطة رواتب: {path}")
+        (names_length,) = struct.unpack_from('<I', self._mm, HEADER.size)
+        start = HEADER.size + 4
+        names = json.loads(self._mm[start:start + names_length].decode('utf-8'))
+        if isinstance(names, list):
+            # لقطة قديمة: الأسماء فقط
+            names = {'columns': names, 'money': None}
+        self.columns = tuple(names['columns'])
+        self.money_columns = None if names['money'] is None else frozenset(names['money'])
+        self.stamp = names.get('stamp')
+        self._record_header = struct.Struct('<' + 'BI' * n_columns)
+        self._entry_size = self.key_width + INDEX_ENTRY_TAIL.size
+        # عدد القراءات الجارية، واللقطة المستبدلة تُغلق عندما تنتهي آخر قراءة (PayslipSnapshots)
+        self.readers = 0
+        self.retired = False
+
+    def _find(self, key):
+        # بحث ثنائي على المفاتيح المرتبة (مكملة بأصفار إلى عرض ثابت)
+        if len(key) > self.key_width:
+            return None
+        key = key.ljust(self.key_width, b'\0')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            position = self._index_offset + middle * self._entry_size
+            current = self._mm[position:position + self.key_width]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return INDEX_ENTRY_TAIL.unpack_from(self._mm, position + self.key_width)
+        return None
+
+    def get(self, employee_id):
+        found = self._find(str(employee_id).encode('utf-8'))
+        if found is None:
+            return None
+        offset, _ = found
+        header = self._record_header.unpack_from(self._mm, offset)
+        position = offset + self._record_header.size
+        record = {}
+        for i, column in enumerate(self.columns):
+            tag, length = header[2 * i], header[2 * i + 1]
+            if tag == TAG_NONE:
+                record[column] = None
+            else:
+                record[column] = _DECODERS[tag](self._mm[position:position + length])
+                position += length
+        return record
+
+    def close(self):
+        self._mm.close()
+
+
+class PayslipSnapshots:
+    # اللقطات المفتوحة في هذا العامل؛ كل قراءة تتحقق (stat واحد) أن الملف لم يُستبدل أو يُحذف.
+    # اللقطة المستبدلة يُغلق الـ mmap والملف الخاص بها فور انتهاء آخر قراءة جارية منها
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._open = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, year, month):
+        return os.path.join(self.directory, _file_name(year, month))
+
+    def _acquire(self, year, month):
+        path = self.path(year, month)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        key = (int(year), str(month))
+        with self._lock:
+            snapshot = self._open.get(key)
+            if snapshot is not None and (stat is None or snapshot.identity != (stat.st_ino, stat.st_mtime_ns)):
+                del self._open[key]
+                self._retire(snapshot)
+                snapshot = None
+            if snapshot is None and stat is not None:
+                snapshot = self._open[key] = Snapshot(path)
+            if snapshot is not None:
+                snapshot.readers += 1
+            return snapshot
+
+    def _retire(self, snapshot):
+        # تحت self._lock: لا يُغلق الآن إن كان thread آخر يقرأ منه
+        snapshot.retired = True
+        if not snapshot.readers:
+            snapshot.close()
+
+    def _release(self, snapshot):
+        with self._lock:
+            snapshot.readers -= 1
+            if snapshot.retired and not snapshot.readers:
+                snapshot.close()
+
+    @contextmanager
+    def reading(self, year, month):
+        # with snapshots.reading(year, month) as snapshot: ... (None إذا لم يُنشر الشهر)
+        # اللقطة تبقى مفتوحة داخل الـ with حتى لو استُبدل ملفها أثناء القراءة
+        snapshot = self._acquire(year, month)
+        try:
+            yield snapshot
+        finally:
+            if snapshot is not None:
+                self._release(snapshot)
+
+    def publish(self, year, month, columns, rows, money_columns=None, stamp=None):
+        count = write_snapshot(self.path(year, month), columns, rows, money_columns, stamp)
+        return {'year': int(year), 'month': str(month), 'payslips': count,
+                'bytes': os.path.getsize(self.path(year, month))}
+
+    def unpublish(self, year, month):
+        try:
+            os.remove(self.path(year, month))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def published(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.snap'))
@@ -0,0 +1,135 @@
+// --- متابعة المهام الخلفية (رفع الرواتب وتوليد PDF) من الصفحة ---
+// الاستخدام في القالب:
+//   <div data-job-status-url="{{ job_status_url }}"></div>
+//   <script src="{{ url_for('static', filename='job_status.js') }}"></script>
+// الصفحة تسأل مسار الحالة (upload_job_status أو pdf_job_status) كل ثانية وتعرض المرحلة
+// وعدد الصفوف، وعند الانتهاء رسالة المهمة وزر تطبيق المعاينة أو روابط التحميل.
+(function () {
+    'use strict';
+
+    var POLL_INTERVAL = 1000;
+    var MAX_INTERVAL = 5000; // عند أخطاء الشبكة تتباعد المحاولات حتى هذا الحد
+
+    var PHASES = {
+        queued: 'في الانتظار',
+        started: 'بدأت المعالجة',
+        parse: 'قراءة الملف',
+        schema_sync: 'مزامنة الأعمدة',
+        stage: 'رفع الصفوف',
+        diff: 'مقارنة التغييرات',
+        employees_upsert: 'تحديث الموظفين',
+        payslips_insert: 'تحديث الرواتب',
+        summary: 'ملخص الشهر',
+        render: 'توليد القسائم',
+        done: 'اكتملت'
+    };
+
+    function element(tag, text, className) {
+        var node = document.createElement(tag);
+        if (text) {
+            node.textContent = text;
+        }
+        if (className) {
+            node.className = className;
+        }
+        return node;
+    }
+
+    function progressText(job) {
+        var parts = [PHASES[job.phase] || job.phase || 'في الانتظار'];
+        if (job.rows_total) {
+            parts.push(job.rows_processed + ' / ' + job.rows_total + ' صف');
+        } else if (job.rows_processed) {
+            parts.push(job.rows_processed + ' صف');
+        }
+        if (job.rows_per_sec) {
+            parts.push(job.rows_per_sec + ' صف/ثانية');
+        }
+        return parts.join(' — ');
+    }
+
+    function render(container, job) {
+        container.textContent = '';
+        container.setAttribute('data-job-state', job.status);
+
+        if (job.status === 'queued' || job.status === 'running') {
+            container.appendChild(element('p', progressText(job), 'job-progress'));
+            if (job.rows_total) {
+                var bar = element('progress');
+                bar.max = job.rows_total;
+                bar.value = job.rows_processed || 0;
+                container.appendChild(bar);
+            }
+            return false;
+        }
+
+        if (job.status === 'failed') {
+            container.appendChild(element('p', '❌ فشلت المهمة: ' + (job.message || ''), 'job-error'));
+            return true;
+        }
+
+        // done: رسالة المهمة (قد تكون عدة أسطر مثل ملخص الفروق)
+        var message = element('p', job.message || '✅ اكتملت المهمة.', 'job-message');
+        message.style.whiteSpace = 'pre-line';
+        container.appendChild(message);
+
+        if (job.apply_url) {
+            // معاينة رفع تزايدي: التطبيق الفعلي بعد التأكيد
+            var form = element('form');
+            form.method = 'post';
+            form.action = job.apply_url;
+            form.appendChild(element('button', 'تطبيق التغييرات'));
+            container.appendChild(form);
+        }
+        (job.downloads || []).forEach(function (url) {
+            var link = element('a', decodeURIComponent(url.split('/').pop()));
+            link.href = url;
+            container.appendChild(element('div')).appendChild(link);
+        });
+        return true;
+    }
+
+    function poll(container, url, interval) {
+        fetch(url, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+            .then(function (response) {
+                if (response.redirected) {
+                    // انتهت الجلسة: مسار الحالة يحول لصفحة الدخول
+                    window.location = response.url;
+                    return null;
+                }
+                if (response.status === 404) {
+                    container.textContent = 'المهمة غير موجودة.';
+                    return null;
+                }
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.json();
+            })
+            .then(function (job) {
+                if (job && !render(container, job)) {
+                    setTimeout(poll, POLL_INTERVAL, container, url, POLL_INTERVAL);
+                }
+            })
+            .catch(function () {
+                var next = Math.min(interval * 2, MAX_INTERVAL);
+                setTimeout(poll, next, container, url, next);
+            });
+    }
+
+    function start() {
+        var containers = document.querySelectorAll('[data-job-status-url]');
+        Array.prototype.forEach.call(containers, function (container) {
+            var url = container.getAttribute('data-job-status-url');
+            if (url) {
+                poll(container, url, POLL_INTERVAL);
+            }
+        });
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', start);
+    } else {
+        start();
+    }
+})();
@@ -0,0 +1,214 @@
+# --- طبقة التخزين: SQL Server أو SQLite محلي ---
+# الاستعلامات في الوحدات الأخرى مكتوبة بصيغة مشتركة بين القاعدتين، وما يختلف فعلاً
+# (الجداول المؤقتة، TOP/LIMIT، UPDATE مع JOIN، أنواع الأعمدة، قراءة هيكل الجداول)
+# يأتي من "لهجة" القاعدة (dialect) المرتبطة بالاتصال نفسه، فتعمل نفس الدوال
+# (التحقق من الهوية، أشهر الموظف، قسيمة الراتب، الإدخال المجمّع، مزامنة الهيكل) على الاثنين.
+# SQLite للتطوير المحلي واختبارات الأداء و CI بحجم بيانات كامل بدون خادم SQL Server.
+import os
+import sqlite3
+import threading
+
+from payroll_columns import EMPLOYEE_BASE_COLS, MONEY_TYPE
+
+
+def quote_ident(name):
+    # [اسم العمود] يعمل في SQL Server و SQLite
+    return "[" + str(name).replace("]", "]]") + "]"
+
+
+class SQLServerDialect:
+    name = 'mssql'
+    fast_executemany = True
+    text_type = "NVARCHAR(MAX)"
+    # أعمدة الجدول المؤقت بطول محدد: معاملات MAX في pyodbc تُرسل صفًا صفًا (data-at-execution)
+    # فتلغي فائدة fast_executemany
+    staging_text_type = "NVARCHAR(4000)"
+    multi_column_alter = True
+
+    def temp_table(self, name):
+        return f"#{name}"
+
+    def create_temp_table(self, name, columns_ddl):
+        return f"CREATE TABLE #{name} ({columns_ddl})"
+
+    def drop_temp_table(self, name):
+        return f"IF OBJECT_ID('tempdb..#{name}') IS NOT NULL DROP TABLE #{name}"
+
+    def top(self, n):
+        return f"TOP ({int(n)}) "
+
+    def limit(self, n):
+        return ""
+
+    def to_decimal(self, expr):
+        return f"TRY_CONVERT({MONEY_TYPE}, {expr})"
+
+    def update_join(self, table, alias, assignments, source, on, where):
+        # assignments: [(العمود بين أقواس، التعبير)]
+        set_clause = ", ".join(f"{alias}.{col} = {expr}" for col, expr in assignments)
+        return f"UPDATE {alias} SET {set_clause} FROM {table} {alias} JOIN {source} ON {on} WHERE {where}"
+
+    def affected_rows(self, cursor):
+        return max(cursor.rowcount, 0)
+
+    def table_columns(self, cursor, tables):
+        # [(الجدول، العمود، النوع)] بترتيب الأعمدة في كل جدول
+        placeholders = ", ".join("?" * len(tables))
+        cursor.execute(
+            f"SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+            f"WHERE TABLE_NAME IN ({placeholders}) ORDER BY TABLE_NAME, ORDINAL_POSITION",
+            tuple(tables)
+        )
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+class SQLiteDialect(SQLServerDialect):
+    name = 'sqlite'
+    fast_executemany = False
+    text_type = "TEXT"
+    staging_text_type = "TEXT"
+    multi_column_alter = False  # ALTER TABLE في SQLite يضيف عمودًا واحدًا فقط
+
+    def temp_table(self, name):
+        return f"temp.{name}"
+
+    def create_temp_table(self, name, columns_ddl):
+        return f"CREATE TEMP TABLE {name} ({columns_ddl})"
+
+    def drop_temp_table(self, name):
+        return f"DROP TABLE IF EXISTS temp.{name}"
+
+    def top(self, n):
+        return ""
+
+    def limit(self, n):
+        return f" LIMIT {int(n)}"
+
+    def to_decimal(self, expr):
+        return f"CAST({expr} AS REAL)"
+
+    def update_join(self, table, alias, assignments, source, on, where):
+        # UPDATE ... FROM في SQLite: أسماء الأعمدة المعدلة بدون اسم الجدول
+        set_clause = ", ".join(f"{col} = {expr}" for col, expr in assignments)
+        return f"UPDATE {table} AS {alias} SET {set_clause} FROM {source} WHERE {on} AND {where}"
+
+    def affected_rows(self, cursor):
+        # sqlite3 لا تحدّث rowcount للجمل التي تبدأ بـ WITH
+        cursor.execute("SELECT changes()")
+        return cursor.fetchone()[0]
+
+    def table_columns(self, cursor, tables):
+        columns = []
+        for table in sorted(tables):
+            cursor.execute(f"PRAGMA table_info({quote_ident(table)})")
+            for _, name, declared, *_ in cursor.fetchall():
+                # نفس صيغة DATA_TYPE في SQL Server: 'nvarchar' و 'decimal' ...
+                columns.append((table, name, (declared or 'text').split('(')[0].strip().lower()))
+        return columns
+
+
+SQLSERVER = SQLServerDialect()
+SQLITE = SQLiteDialect()
+
+
+def dialect_of(conn_or_cursor):
+    # الاتصال (أو مؤشره) يحمل لهجته؛ اتصالات pyodbc لا تحملها فهي SQL Server
+    dialect = getattr(conn_or_cursor, 'dialect', None)
+    if dialect is None:
+        dialect = getattr(getattr(conn_or_cursor, 'connection', None), 'dialect', None)
+    return dialect or SQLSERVER
+
+
+# --- الواجهات الخلفية ---
+
+class SQLServerBackend:
+    name = 'mssql'
+    dialect = SQLSERVER
+
+    def __init__(self, connection_string):
+        self.connection_string = connection_string
+
+    def connect(self):
+        import pyodbc
+
+        return pyodbc.connect(self.connection_string)
+
+    def migrate(self, conn):
+        from migrations import apply_migrations
+
+        return apply_migrations(conn)
+
+
+class _SQLiteConnection(sqlite3.Connection):
+    dialect = SQLITE
+
+
+# نفس جداول SQL Server بعد كل الترحيلات؛ باقي أعمدة الشيت تضيفها مزامنة الهيكل عند الرفع
+SQLITE_SCHEMA = [
+    ('Employees', "CREATE TABLE IF NOT EXISTS Employees ({})".format(", ".join(
+        f"[{c}] NVARCHAR(255){' NOT NULL PRIMARY KEY' if c == 'EmployeeID' else ''}" for c in EMPLOYEE_BASE_COLS
+    ))),
+    ('Payslips', f"""CREATE TABLE IF NOT EXISTS Payslips (
+        PayslipID INTEGER PRIMARY KEY, EmployeeID NVARCHAR(255), EmployeeName NVARCHAR(255),
+        BasicSalary {MONEY_TYPE}, TotalEntitlements {MONEY_TYPE}, TotalDeductions {MONEY_TYPE},
+        NetSalary {MONEY_TYPE}, PayYear INT, PayMonth NVARCHAR(50))"""),
+    ('IX_Payslips_Employee_Period',
+     "CREATE INDEX IF NOT EXISTS IX_Payslips_Employee_Period ON Payslips (EmployeeID, PayYear, PayMonth)"),
+    ('IX_Payslips_Period', "CREATE INDEX IF NOT EXISTS IX_Payslips_Period ON Payslips (PayYear, PayMonth)"),
+    ('PayrollMonthSummary', f"""CREATE TABLE IF NOT EXISTS PayrollMonthSummary (
+        PayYear INT NOT NULL, PayMonth NVARCHAR(50) NOT NULL, Headcount INT NOT NULL,
+        TotalNetSalary {MONEY_TYPE} NULL, UpdatedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (PayYear, PayMonth))"""),
+    ('PayrollMonthBreakdown', f"""CREATE TABLE IF NOT EXISTS PayrollMonthBreakdown (
+        PayYear INT NOT NULL, PayMonth NVARCHAR(50) NOT NULL, Dimension NVARCHAR(50) NOT NULL,
+        DimensionValue NVARCHAR(255) NOT NULL, Headcount INT NOT NULL, TotalNetSalary {MONEY_TYPE} NULL,
+        PRIMARY KEY (PayYear, PayMonth, Dimension, DimensionValue))"""),
+    ('PayslipRowHashes', """CREATE TABLE IF NOT EXISTS PayslipRowHashes (
+        PayYear INT NOT NULL, PayMonth NVARCHAR(50) NOT NULL, EmployeeID NVARCHAR(255) NOT NULL,
+        RowHash BINARY(32) NOT NULL, PRIMARY KEY (PayYear, PayMonth, EmployeeID))"""),
+]
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    dialect = SQLITE
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ready = False
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def connect(self):
+        # الاتصال ينتقل بين threads عبر التجمع (thread واحد في كل مرة)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, factory=_SQLiteConnection)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            if not self._ready:
+                self.migrate(conn)
+                self._ready = True
+        return conn
+
+    def migrate(self, conn):
+        # إنشاء الجداول الناقصة (قاعدة محلية جديدة لا تحتاج ترحيلات SQL Server)
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master")
+        existing = {row[0] for row in cursor.fetchall()}
+        created = []
+        for name, statement in SQLITE_SCHEMA:
+            if name not in existing:
+                cursor.execute(statement)
+                created.append(name)
+        conn.commit()
+        return created
+
+
+def backend_from_spec(spec, connection_string, default_sqlite_path):
+    # 'mssql' (الافتراضي) أو 'sqlite' (الملف الافتراضي) أو 'sqlite:/path/payroll.db'
+    spec = (spec or 'mssql').strip()
+    if spec == 'sqlite':
+        return SQLiteBackend(default_sqlite_path)
+    if spec.startswith('sqlite:'):
+        return SQLiteBackend(spec[len('sqlite:'):])
+    return SQLServerBackend(connection_string)
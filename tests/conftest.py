@@ -0,0 +1,83 @@
+# --- إعداد الاختبارات: قاعدة SQLite مؤقتة لكل اختبار بدلاً من SQL Server ---
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_pool import ConnectionPool  # noqa: E402
+from schema_cache import SchemaCache  # noqa: E402
+from storage import SQLiteBackend  # noqa: E402
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteBackend(str(tmp_path / "payroll.db"))
+
+
+@pytest.fixture
+def pool(backend):
+    pool = ConnectionPool(backend.connect, min_size=0, max_size=2)
+    yield pool
+    pool.close_all()
+
+
+@pytest.fixture
+def schema(tmp_path):
+    return SchemaCache(version_path=str(tmp_path / "schema.version"))
+
+
+@pytest.fixture
+def write_sheet(tmp_path):
+    # شيت إكسل بنفس رؤوس الأعمدة العربية؛ كل صف dict من اسم العمود إلى القيمة
+    def write(rows, name="sheet.xlsx"):
+        path = str(tmp_path / name)
+        pd.DataFrame(rows, dtype=str).to_excel(path, index=False)
+        return path
+    return write
+
+
+def _employee_row(emp, net, extra=None):
+    # صف موظف في الشيت؛ extra لأعمدة إضافية أو لتغيير قيمة عمود بالاسم العربي
+    row = {'رقم الموظف': str(emp), 'الاسم': f"موظف {emp}", 'رقم الموبايل': f"0100000{emp:04d}",
+           'الإدارة': 'الإنتاج', 'مرتب أساسي': '1,000.00', 'الصافي': str(net)}
+    row.update(extra or {})
+    return row
+
+
+@pytest.fixture
+def employee_row():
+    return _employee_row
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    # التطبيق يقرأ إعداداته عند الاستيراد: كل ملفات الحالة في مجلد الاختبار وقاعدة SQLite
+    monkeypatch.setenv('SECRET_KEY', 'test')
+    monkeypatch.setenv('INSTANCE_PATH', str(tmp_path / 'instance'))
+    monkeypatch.setenv('DB_BACKEND', f"sqlite:{tmp_path / 'app.db'}")
+    monkeypatch.setenv('DB_POOL_MIN', '0')
+    monkeypatch.setenv('SESSION_STORE', 'memory')
+    monkeypatch.setenv('OTP_SENDER', f"file:{tmp_path / 'otp.log'}")
+    for name in ('JOBS_DB_PATH', 'METRICS_DB_PATH', 'UPLOAD_DIR', 'SNAPSHOT_DIR', 'ARCHIVE_DIR',
+                 'PDF_OUTPUT_DIR', 'PAYSLIP_CACHE_DB', 'METRICS_TOKEN'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.delitem(sys.modules, 'App', raising=False)
+    import App
+    from jinja2 import ChoiceLoader, FunctionLoader
+
+    # القوالب ليست جزءاً من الاختبار: قالب فارغ لأي صفحة
+    App.app.jinja_env.loader = ChoiceLoader([App.app.jinja_env.loader, FunctionLoader(lambda name: "")])
+    yield App
+    App.db_pool.close_all()
+
+
+@pytest.fixture
+def admin_client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['employee_id'] = 'admin'
+        session['role'] = 'admin'
+    return client
@@ -0,0 +1,103 @@
+import pytest
+
+from analytics import (AnalyticsCache, employee_dimensions, employee_history, load_month_frame, month_analytics,
+                       month_deltas, recent_months)
+from archive import PayrollArchive
+from upload_pipeline import run_upload
+
+
+@pytest.fixture
+def months(pool, schema, write_sheet, employee_row):
+    # شهران: الثاني بمكافأة لموظف واحد وصافي أعلى
+    sheets = {
+        '1': [employee_row(1, 1000), employee_row(2, 500, {'الإدارة': 'المالية'})],
+        '2': [employee_row(1, 1200, {'مكافئة': '200'}), employee_row(2, 500, {'الإدارة': 'المالية'})],
+    }
+    for month, rows in sheets.items():
+        run_upload(pool, schema, write_sheet(rows), 2025, month)
+    with pool.connection() as conn:
+        return schema.column_set(conn, 'Payslips'), schema.column_set(conn, 'Employees')
+
+
+def analytics_for(pool, archive, payslip_columns, employee_columns, month):
+    with pool.connection() as conn:
+        dimensions = employee_dimensions(conn, employee_columns)
+        frame, components, dims = load_month_frame(conn, archive, 2025, month, payslip_columns, dimensions)
+    return month_analytics(frame, 2025, month, components, dims)
+
+
+def test_month_totals_breakdown_and_components(pool, months):
+    result = analytics_for(pool, None, *months, '2')
+    assert (result['headcount'], result['totals']['NetSalary'], result['totals']['BasicSalary']) == (2, 1700, 2000)
+    assert [(d['name'], d['headcount'], d['totals']['NetSalary']) for d in result['by_department']] == [
+        ('الإنتاج', 1, 1200), ('المالية', 1, 500)]
+    bonus = next(c for c in result['components'] if c['column'] == 'Bonus')
+    assert (bonus['label'], bonus['employees'], bonus['average']) == ('مكافئة', 1, 200)
+    assert bonus['share_of_net'] == round(200 / 1700, 4)
+
+
+def test_archived_month_matches_live(tmp_path, pool, months):
+    live = analytics_for(pool, None, *months, '1')
+    archive = PayrollArchive(str(tmp_path / 'archive'))
+    with pool.connection() as conn:
+        archive.archive_month(conn, 2025, '1', ['Department'])
+    assert analytics_for(pool, archive, *months, '1') == live
+
+
+def test_deltas_and_recent_months(pool, months):
+    results = [analytics_for(pool, None, *months, month) for month in ('1', '2')]
+    trend = month_deltas(results)
+    assert 'change' not in trend[0]
+    assert trend[1]['change']['NetSalary'] == 200
+    assert trend[1]['change_pct']['NetSalary'] == round(200 / 1500, 4)
+    assert {'column': 'Bonus', 'label': 'مكافئة', 'change': 200} in trend[1]['component_change']
+    assert 'BasicSalary' not in [c['column'] for c in trend[1]['component_change']]
+    with pool.connection() as conn:
+        assert recent_months(conn, 12) == [(2025, '1'), (2025, '2')]
+        assert recent_months(conn, 1) == [(2025, '2')]
+
+
+def test_employee_history(tmp_path, pool, months):
+    archive = PayrollArchive(str(tmp_path / 'archive'))
+    with pool.connection() as conn:
+        archive.archive_month(conn, 2025, '1', ['Department'])
+        history = employee_history(conn, archive, '1', months[0])
+        assert [(m['month'], m['totals']['NetSalary'], m['net_change']) for m in history['months']] == [
+            ('1', 1000, None), ('2', 1200, 200)]
+        assert history['months'][1]['components']['Bonus'] == 200
+        assert history['average_net'] == 1100
+        assert employee_history(conn, archive, '99', months[0]) is None
+
+
+def test_employee_history_without_component_columns(pool):
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO Payslips (EmployeeID, PayYear, PayMonth) VALUES ('1', 2025, '1')")
+        conn.commit()
+        history = employee_history(conn, None, '1', {'EmployeeID', 'PayYear', 'PayMonth'})
+    assert history['months'] == [{'year': 2025, 'month': '1', 'totals': {}, 'net_change': None, 'components': {}}]
+
+
+def test_cache_invalidation(tmp_path):
+    first, second = (AnalyticsCache(version_dir=str(tmp_path / 'versions')) for _ in range(2))
+    for cache in (first, second):
+        cache.set(2025, '1', {'headcount': 1})
+        cache.set(2025, '2', {'headcount': 2})
+    first.invalidate_month(2025, '1')
+    assert second.get(2025, '1') is None and second.get(2025, '2') == {'headcount': 2}
+    first.invalidate()
+    assert second.get(2025, '2') is None
+
+
+def test_trend_loads_employee_dimensions_once_per_request(app_module, admin_client, monkeypatch,
+                                                          write_sheet, employee_row):
+    for month in ('1', '2', '3'):
+        run_upload(app_module.db_pool, app_module.schema_cache, write_sheet([employee_row(1, 1000)]), 2025, month)
+    calls = []
+    monkeypatch.setattr(app_module, 'employee_dimensions',
+                        lambda *args: calls.append(args) or employee_dimensions(*args))
+    response = admin_client.get('/analytics/trend?months=3')
+    assert response.status_code == 200 and len(response.json['months']) == 3
+    assert len(calls) == 1
+    # الأشهر محفوظة الآن: لا حاجة لجدول الموظفين
+    admin_client.get('/analytics/trend?months=3')
+    assert len(calls) == 1
@@ -0,0 +1,100 @@
+import os
+
+import pyarrow.parquet as pq
+import pytest
+
+from archive import PayrollArchive
+from listings import payslip_page
+from payslip_queries import employee_months, employee_payslip
+from upload_pipeline import run_upload
+
+
+@pytest.fixture
+def uploaded(pool, schema, write_sheet, employee_row):
+    for month, bonus in (('1', '100'), ('2', '')):
+        rows = [employee_row(emp, 1000 + emp, {'مكافئة': bonus, 'كود الفرع': f"B{emp}"}) for emp in (1, 2, 3)]
+        run_upload(pool, schema, write_sheet(rows), 2025, month)
+    with pool.connection() as conn:
+        return schema.columns(conn, 'Payslips')
+
+
+def live_payslip(pool, employee_id, year, month, columns):
+    with pool.connection() as conn:
+        record = employee_payslip(conn, employee_id, year, month, columns)
+    record.pop('PayslipID', None)
+    return record
+
+
+def test_archive_round_trip(tmp_path, pool, uploaded):
+    archive = PayrollArchive(str(tmp_path / "archive"))
+    live = {emp: live_payslip(pool, emp, 2025, '1', uploaded) for emp in ('1', '2', '3')}
+
+    with pool.connection() as conn:
+        assert archive.closed_months(conn, keep=1) == [(2025, '1')]
+        result = archive.archive_month(conn, 2025, '1', ['Department'])
+        with pytest.raises(ValueError):
+            archive.archive_month(conn, 2025, '1', ['Department'])
+    assert (result['rows'], archive.has_month(2025, '1')) == (3, True)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM Payslips WHERE PayYear = 2025 AND PayMonth = '1'")
+        assert cursor.fetchone()[0] == 0
+        assert employee_months(conn, '2', archive.employee_months('2')) == {2025: ['2', '1']}
+
+    for emp, record in live.items():
+        archived = archive.employee_payslip(emp, 2025, '1', uploaded)
+        archived.pop('PayslipID', None)
+        assert archived == record
+    assert [row[0] for row in archive.month_rows(2025, '1', ['EmployeeID'])] == ['1', '2', '3']
+
+    with pool.connection() as conn:
+        assert archive.restore_month(conn, 2025, '1', uploaded)['rows'] == 3
+    assert not archive.has_month(2025, '1')
+    for emp, record in live.items():
+        assert live_payslip(pool, emp, 2025, '1', uploaded) == record
+
+
+def test_archived_page_matches_live_page(tmp_path, pool, schema, uploaded):
+    archive = PayrollArchive(str(tmp_path / "archive"))
+    with pool.connection() as conn:
+        employee_columns = schema.column_set(conn, 'Employees')
+        live = payslip_page(conn, 2025, '1', employee_columns, page_size=2)
+        archive.archive_month(conn, 2025, '1', ['Department'])
+        archived = archive.payslip_page(conn, 2025, '1', employee_columns, page_size=2)
+        assert archived == live
+        rest = archive.payslip_page(conn, 2025, '1', employee_columns, cursor_token=archived['next_cursor'],
+                                    page_size=2)
+        assert [item['EmployeeID'] for item in rest['items']] == ['3']
+        assert rest['next_cursor'] is None
+
+
+@pytest.mark.parametrize('damage', [lambda table: table.slice(1), lambda table: table.take([1, 0, 2])])
+def test_month_kept_when_written_file_does_not_match(tmp_path, monkeypatch, pool, uploaded, damage):
+    # ملف ناقص أو محتوى مختلف على القرص: لا يُحذف الشهر من الجدول ولا يُسجل في الأرشيف
+    read_table = pq.read_table
+    monkeypatch.setattr(pq, 'read_table', lambda path: damage(read_table(path)))
+    archive = PayrollArchive(str(tmp_path / "archive"))
+    with pool.connection() as conn:
+        with pytest.raises(ValueError):
+            archive.archive_month(conn, 2025, '1', ['Department'])
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM Payslips WHERE PayYear = 2025 AND PayMonth = '1'")
+        assert cursor.fetchone()[0] == 3
+    assert not archive.has_month(2025, '1')
+    assert [name for name in os.listdir(tmp_path / "archive") if 'parquet' in name] == []
+
+
+def test_archive_command_requires_explicit_archive_dir(tmp_path, monkeypatch, app_module):
+    with app_module.db_pool.connection() as conn:
+        conn.execute("INSERT INTO Payslips (EmployeeID, NetSalary, PayYear, PayMonth) VALUES ('1', 100, 2024, '1')")
+        conn.commit()
+    runner = app_module.app.test_cli_runner()
+    result = runner.invoke(args=['archive-months', '--year', '2024', '--month', '1'])
+    assert result.exit_code != 0 and 'ARCHIVE_DIR is not set' in result.output
+    assert not app_module.payroll_archive.has_month(2024, '1')
+
+    monkeypatch.setattr(app_module, 'ARCHIVE_DIR', str(tmp_path / "durable"))
+    monkeypatch.setattr(app_module, 'payroll_archive', PayrollArchive(str(tmp_path / "durable")))
+    result = runner.invoke(args=['archive-months', '--year', '2024', '--month', '1'])
+    assert result.exit_code == 0 and 'Archived 2024/1' in result.output
+    assert app_module.payroll_archive.has_month(2024, '1')
@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from bulk_ingest import STAGING_MAX_LENGTH, _create_staging, ingest_month
+from storage import SQLSERVER
+
+EMPLOYEE_COLUMNS = {'EmployeeID', 'EmployeeName', 'MobileNumber', 'Department', 'Role'}
+PAYSLIP_COLUMNS = {'EmployeeID', 'EmployeeName', 'BasicSalary', 'NetSalary'}
+
+
+def sheet(rows):
+    # صفوف الشيت بعد ترجمة الأعمدة (قيم نصية و '' للخلايا الفارغة)
+    return pd.DataFrame(rows, columns=['EmployeeID', 'EmployeeName', 'MobileNumber', 'Department',
+                                       'BasicSalary', 'NetSalary'], dtype=str)
+
+
+def fetch(pool, query, params=()):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def ingest(pool, df, year=2025, month='1', **kwargs):
+    with pool.connection() as conn:
+        report = ingest_month(conn, df, year, month, EMPLOYEE_COLUMNS, PAYSLIP_COLUMNS,
+                              money_columns=frozenset({'BasicSalary', 'NetSalary'}), **kwargs)
+        conn.commit()
+    return report
+
+
+def test_ingest_inserts_employees_and_payslips(pool):
+    report = ingest(pool, sheet([
+        ['1', 'أحمد', '+201000000001', 'الإنتاج', '1000', '1,200.50'],
+        ['2', 'منى', '+201000000002', 'المالية', '900', '950'],
+    ]))
+    assert (report['rows'], report['employees_inserted'], report['employees_updated']) == (2, 2, 0)
+    assert (report['payslips_deleted'], report['payslips_inserted']) == (0, 2)
+    assert fetch(pool, "SELECT EmployeeID, EmployeeName, Role FROM Employees ORDER BY EmployeeID") == [
+        ('1', 'أحمد', 'employee'), ('2', 'منى', 'employee')]
+    assert fetch(pool, "SELECT EmployeeID, NetSalary FROM Payslips ORDER BY EmployeeID") == [('1', 1200.5), ('2', 950)]
+
+
+def test_reupload_updates_employees_and_replaces_month(pool):
+    ingest(pool, sheet([['1', 'أحمد', '+201000000001', 'الإنتاج', '1000', '1200']]))
+    # الخلية الفارغة لا تمسح القيمة المحفوظة
+    report = ingest(pool, sheet([['1', 'أحمد علي', '', 'المالية', '1000', '1300'], ['', 'بدون رقم', '', '', '', '']]))
+    assert (report['rows'], report['employees_updated'], report['employees_inserted']) == (1, 1, 0)
+    assert (report['payslips_deleted'], report['payslips_inserted']) == (1, 1)
+    assert fetch(pool, "SELECT EmployeeName, MobileNumber, Department FROM Employees") == [
+        ('أحمد علي', '+201000000001', 'المالية')]
+    assert fetch(pool, "SELECT NetSalary FROM Payslips") == [(1300,)]
+
+
+def test_months_are_independent(pool):
+    ingest(pool, sheet([['1', 'أحمد', '', '', '1000', '1200']]), month='1')
+    ingest(pool, sheet([['1', 'أحمد', '', '', '1000', '1250']]), month='2')
+    assert fetch(pool, "SELECT PayMonth, NetSalary FROM Payslips ORDER BY PayMonth") == [('1', 1200), ('2', 1250)]
+
+
+def test_missing_employee_id_column_rejected(pool):
+    with pytest.raises(ValueError):
+        ingest(pool, sheet([['1', 'أحمد', '', '', '1000', '1200']]).drop(columns=['EmployeeID']))
+
+
+def test_value_longer_than_staging_column_rejected(pool):
+    with pytest.raises(ValueError):
+        ingest(pool, sheet([['1', 'x' * (STAGING_MAX_LENGTH + 1), '', '', '1000', '1200']]))
+    assert fetch(pool, "SELECT COUNT(*) FROM Payslips") == [(0,)]
+
+
+class RecordingCursor:
+    dialect = SQLSERVER
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=()):
+        self.statements.append(statement)
+
+
+def test_sqlserver_staging_columns_are_bounded():
+    # أعمدة NVARCHAR(MAX) تجعل pyodbc يرسل القيم صفًا صفًا بدلاً من دفعة fast_executemany
+    cursor = RecordingCursor()
+    _create_staging(cursor, ['EmployeeID', 'NetSalary'])
+    create = cursor.statements[-1]
+    assert create.startswith("CREATE TABLE #PayrollStaging")
+    assert "[EmployeeID] NVARCHAR(4000) NULL" in create and "[NetSalary] NVARCHAR(4000) NULL" in create
+    assert "MAX" not in create
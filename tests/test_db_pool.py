@@ -0,0 +1,100 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class Factory:
+    # اتصالات SQLite في الذاكرة مع عدّ ما فُتح منها
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self):
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.opened.append(conn)
+        return conn
+
+
+def test_checkout_and_return_reuses_connection():
+    factory = Factory()
+    pool = ConnectionPool(factory, min_size=0, max_size=2)
+    with pool.connection() as conn:
+        first = conn.raw
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+        assert pool.stats()['in_use'] == 1
+    with pool.connection() as conn:
+        assert conn.raw is first
+    stats = pool.stats()
+    assert (stats['created'], stats['checkouts'], stats['open'], stats['idle'], stats['in_use']) == (1, 2, 1, 1, 0)
+
+
+def test_returned_connection_cannot_be_used():
+    pool = ConnectionPool(Factory(), min_size=0, max_size=1)
+    conn = pool.acquire()
+    conn.close()
+    with pytest.raises(AttributeError):
+        conn.cursor()
+
+
+def test_health_check_replaces_broken_connection():
+    factory = Factory()
+    pool = ConnectionPool(factory, min_size=0, max_size=1, health_check_after=0)
+    pool.acquire().close()
+    # الاتصال الخامل انقطع (مثلاً أغلقه الخادم) فيُستبدل عند الحجز التالي
+    factory.opened[0].close()
+    with pool.connection() as conn:
+        assert conn.raw is factory.opened[1]
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+    stats = pool.stats()
+    assert (stats['failed_health_checks'], stats['created'], stats['closed'], stats['open']) == (1, 2, 1, 1)
+
+
+def test_idle_connections_evicted_down_to_min_size():
+    pool = ConnectionPool(Factory(), min_size=1, max_size=3, idle_timeout=0)
+    conns = [pool.acquire() for _ in range(3)]
+    for conn in conns:
+        conn.close()
+    assert pool.prune() == 2
+    stats = pool.stats()
+    assert (stats['open'], stats['idle'], stats['evicted_idle']) == (1, 1, 2)
+
+
+def test_checkout_times_out_when_pool_is_full():
+    pool = ConnectionPool(Factory(), min_size=0, max_size=1, checkout_timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    held.close()
+    pool.acquire().close()
+    stats = pool.stats()
+    assert (stats['timeouts'], stats['peak_in_use'], stats['open']) == (1, 1, 1)
+
+
+def test_waiting_checkout_gets_released_connection():
+    pool = ConnectionPool(Factory(), min_size=0, max_size=1, checkout_timeout=5)
+    held = pool.acquire()
+    timer = threading.Timer(0.05, held.close)
+    timer.start()
+    with pool.connection() as conn:
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+    timer.join()
+    assert pool.stats()['waits'] >= 1
+    assert pool.stats()['created'] == 1
+
+
+def test_failed_query_discards_only_unhealthy_connection():
+    factory = Factory()
+    pool = ConnectionPool(factory, min_size=0, max_size=1)
+    with pytest.raises(sqlite3.OperationalError):
+        with pool.connection() as conn:
+            conn.execute("SELECT * FROM missing_table")
+    # خطأ في الاستعلام لا يعني فساد الاتصال: يعود للتجمع
+    assert pool.stats()['idle'] == 1
+    assert pool.stats()['closed'] == 0
+
+
+def test_invalid_sizes_rejected():
+    with pytest.raises(ValueError):
+        ConnectionPool(Factory(), min_size=3, max_size=2)
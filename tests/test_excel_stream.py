@@ -0,0 +1,52 @@
+import pandas as pd
+from openpyxl import Workbook
+
+from excel_stream import ExcelBatchReader
+from normalize import prepare_upload_frame
+
+
+def write_workbook(path, rows):
+    # القيم بأنواعها كما يكتبها Excel (أرقام وليست نصوص) مع صفوف فارغة
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+ROWS = [
+    ['رقم الموظف', 'الاسم', 'رقم الموبايل', 'الصافي', None],
+    [1, 'أحمد', '01000000001', 1200.5, None],
+    [None, None, None, None, None],
+    [2, 'منى', 1000000002, 950.0, None],
+    [3, 'سارة', None, 800, None],
+]
+
+
+def test_batches_match_full_read(tmp_path):
+    path = write_workbook(tmp_path / "sheet.xlsx", ROWS)
+    reader = ExcelBatchReader(path, batch_size=2)
+    assert reader.columns == ['EmployeeID', 'EmployeeName', 'MobileNumber', 'NetSalary']
+    batches = list(reader)
+    assert [len(b) for b in batches] == [2, 1]
+
+    streamed = pd.concat(batches, ignore_index=True)
+    full = prepare_upload_frame(pd.read_excel(path, header=0, dtype=str).fillna(''))
+    full = full.drop(columns=[c for c in full.columns if c.startswith('Unnamed')]).reset_index(drop=True)
+    assert streamed.to_dict('records') == full.to_dict('records')
+    assert streamed.loc[1, 'NetSalary'] == '950' and streamed.loc[1, 'MobileNumber'] == '+201000000002'
+
+
+def test_peek_does_not_consume_first_batch(tmp_path):
+    reader = ExcelBatchReader(write_workbook(tmp_path / "sheet.xlsx", ROWS), batch_size=2)
+    first = reader.peek()
+    assert reader.peek() is first
+    batches = list(reader)
+    assert batches[0] is first and len(batches) == 2
+
+
+def test_header_only_sheet(tmp_path):
+    reader = ExcelBatchReader(write_workbook(tmp_path / "sheet.xlsx", ROWS[:1]))
+    assert reader.peek() is None
+    assert list(reader) == []
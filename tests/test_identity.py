@@ -0,0 +1,49 @@
+from identity import IdentityCache, lookup_identity
+
+
+def test_lookup_identity_matches_id_and_phone(pool):
+    with pool.connection() as conn:
+        conn.executemany("INSERT INTO Employees (EmployeeID, MobileNumber, Role) VALUES (?, ?, ?)",
+                         [('7', '+201000000007', 'Admin'), ('8', '+201000000008', None)])
+        conn.commit()
+        assert lookup_identity(conn, '7', '+201000000007') == {
+            'employee_id': '7', 'role': 'admin', 'phone': '+201000000007'}
+        assert lookup_identity(conn, '8', '+201000000008')['role'] == 'employee'
+        assert lookup_identity(conn, '7', '+201000000008') is None
+
+
+def test_cache_hits_until_upload_invalidates_other_workers(tmp_path):
+    version = str(tmp_path / 'identity.version')
+    first, second = IdentityCache(version_path=version), IdentityCache(version_path=version)
+    identity = {'employee_id': '7', 'role': 'employee', 'phone': '+201000000007'}
+    for cache in (first, second):
+        cache.set('7', '+201000000007', identity)
+    assert second.get('7', '+201000000007') == identity
+    assert second.get('7', '+201000000008') is None
+    assert second.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+
+    # رفع شيت في عامل يبطل ما حفظه الآخر
+    first.invalidate()
+    assert len(first.local) == 0
+    assert second.get('7', '+201000000007') is None
+
+
+def test_cache_is_bounded():
+    cache = IdentityCache(max_entries=2)
+    for emp in ('1', '2', '3'):
+        cache.set(emp, '010', {'employee_id': emp})
+    assert cache.get('1', '010') is None and cache.get('3', '010') == {'employee_id': '3'}
+    assert cache.stats()['entries'] == 2
+
+
+def test_request_otp_reuses_cached_identity(app_module):
+    with app_module.db_pool.connection() as conn:
+        conn.execute("INSERT INTO Employees (EmployeeID, MobileNumber) VALUES ('7', '+201000000007')")
+        conn.commit()
+    client = app_module.app.test_client()
+    checkouts = app_module.db_pool.stats()['checkouts']
+    for _ in range(2):
+        client.post('/request_otp', data={'emp_id': '7', 'phone_number': '01000000007'})
+    assert app_module.identity_cache.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+    # الطلب الثاني لا يحتاج قاعدة البيانات
+    assert app_module.db_pool.stats()['checkouts'] == checkouts + 1
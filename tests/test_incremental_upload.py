@@ -0,0 +1,55 @@
+from upload_pipeline import run_upload
+
+
+def month_rows(pool, year, month):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT EmployeeID, NetSalary FROM Payslips WHERE PayYear = ? AND PayMonth = ? "
+                       "ORDER BY EmployeeID", (year, month))
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def test_preview_reports_diff_without_changes(pool, schema, write_sheet, employee_row):
+    run_upload(pool, schema, write_sheet([employee_row(emp, 1000) for emp in (1, 2, 3, 4)]), 2025, '1')
+    # 1 بدون تغيير، 2 و3 معدلان، 4 محذوف، 5 جديد
+    path = write_sheet([employee_row(1, 1000), employee_row(2, 1500), employee_row(3, 1000, {'الإدارة': 'المالية'}),
+                        employee_row(5, 900)])
+    report = run_upload(pool, schema, path, 2025, '1', preview=True)
+    diff = report['diff']
+    assert (diff['inserted'], diff['updated'], diff['deleted'], diff['unchanged']) == (1, 2, 1, 1)
+    assert diff['samples'] == {'insert': ['5'], 'update': ['2', '3'], 'delete': ['4']}
+    assert 'duplicates' not in diff
+    assert len(month_rows(pool, 2025, '1')) == 4
+
+
+def test_incremental_upload_applies_only_changes(pool, schema, write_sheet, employee_row):
+    run_upload(pool, schema, write_sheet([employee_row(emp, 1000) for emp in (1, 2, 3)]), 2025, '1')
+    path = write_sheet([employee_row(1, 1000), employee_row(2, 1200), employee_row(4, 800)])
+    report = run_upload(pool, schema, path, 2025, '1', incremental=True)
+    assert report['incremental'] is True
+    assert (report['payslips_deleted'], report['payslips_inserted']) == (2, 2)
+    assert month_rows(pool, 2025, '1') == [('1', 1000), ('2', 1200), ('4', 800)]
+
+    # نفس الشيت مرة أخرى: لا شيء يتغير
+    report = run_upload(pool, schema, path, 2025, '1', incremental=True)
+    assert (report['diff']['unchanged'], report['payslips_deleted'], report['payslips_inserted']) == (3, 0, 0)
+
+
+def test_duplicate_employee_ids_fall_back_to_full_replace(pool, schema, write_sheet, employee_row):
+    run_upload(pool, schema, write_sheet([employee_row(emp, 1000) for emp in (1, 2)]), 2025, '1')
+    path = write_sheet([employee_row(1, 1000), employee_row(2, 1100), employee_row(2, 1200)])
+    report = run_upload(pool, schema, path, 2025, '1', incremental=True)
+    assert report['diff']['duplicates'] == 1
+    assert report['incremental'] is False
+    # الاستبدال الكامل: كل صفوف الشهر القديمة تُحذف وتُدخل صفوف الشيت كلها
+    assert (report['payslips_deleted'], report['payslips_inserted']) == (2, 3)
+
+
+def test_row_hashes_follow_the_month(pool, schema, write_sheet, employee_row):
+    run_upload(pool, schema, write_sheet([employee_row(emp, 1000) for emp in (1, 2, 3)]), 2025, '1')
+    run_upload(pool, schema, write_sheet([employee_row(1, 1000), employee_row(2, 1200)]), 2025, '1', incremental=True)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT EmployeeID FROM PayslipRowHashes WHERE PayYear = 2025 AND PayMonth = '1' "
+                       "ORDER BY EmployeeID")
+        assert [row[0] for row in cursor.fetchall()] == ['1', '2']
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def wait_for(store, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_runs_in_background_and_reports_result(store):
+    queue = JobQueue(store, max_workers=1)
+
+    def work(job):
+        job.progress(phase='stage', rows_total=10)
+        job.progress(rows_processed=10)
+        job.set_message("تم")
+        return {'rows': job.params['rows']}
+
+    job_id = queue.submit('upload', work, {'rows': 10})
+    job = wait_for(store, job_id)
+    assert (job['kind'], job['status'], job['phase'], job['message']) == ('upload', 'done', 'done', "تم")
+    assert (job['rows_processed'], job['rows_total'], job['result']) == (10, 10, {'rows': 10})
+    assert job['params'] == {'rows': 10}
+    assert job['started_at'] and job['finished_at'] >= job['started_at']
+
+
+def test_failed_job_keeps_error_message(store):
+    queue = JobQueue(store, max_workers=1)
+
+    def work(job):
+        raise ValueError("العمود 'BasicSalary' يحتوي على قيم غير رقمية")
+
+    job = wait_for(store, queue.submit('upload', work))
+    assert job['status'] == 'failed'
+    assert job['message'] == "العمود 'BasicSalary' يحتوي على قيم غير رقمية"
+
+
+def test_row_progress_writes_are_throttled(store, monkeypatch):
+    monkeypatch.setattr(jobs, 'PROGRESS_WRITE_INTERVAL', 3600)
+    job = jobs.Job(store, store.create('upload'), {})
+    job.progress(phase='stage')
+    job.progress(rows_processed=5)
+    # عداد الصفوف ينتظر حتى الكتابة التالية، وتغيير المرحلة يكتب فورًا
+    assert (store.get(job.id)['phase'], store.get(job.id)['rows_processed']) == ('stage', 0)
+    job.progress(phase='payslips_insert')
+    assert (store.get(job.id)['phase'], store.get(job.id)['rows_processed']) == ('payslips_insert', 5)
+
+
+def test_running_job_of_dead_worker_reported_failed(store, monkeypatch):
+    job_id = store.create('pdf')
+    store.update(job_id, status='running', started_at=time.time(), worker_pid=12345)
+    monkeypatch.setattr(jobs, '_pid_alive', lambda pid: False)
+    job = store.get(job_id)
+    assert job['status'] == 'failed' and job['message']
+
+
+def test_recent_jobs_by_kind(store):
+    ids = [store.create(kind) for kind in ('upload', 'pdf', 'upload')]
+    assert [job['id'] for job in store.recent(kind='upload')] == [ids[2], ids[0]]
+    assert len(store.recent()) == 3
+    assert store.get('missing') is None
@@ -0,0 +1,81 @@
+import pytest
+
+from listings import (MAX_PAGE_SIZE, decode_cursor, employee_page, encode_cursor, filters_from, page_size_from,
+                      payslip_page)
+
+EMPLOYEES = [
+    # رقم الموظف، الاسم، الإدارة
+    ('1', 'سارة', 'المالية'),
+    ('2', 'أحمد', 'الإنتاج'),
+    ('3', 'أحمد', 'الإنتاج'),
+    ('10', None, 'الإنتاج'),
+    ('4', 'منى', 'المالية'),
+]
+
+
+@pytest.fixture
+def month(pool, schema):
+    with pool.connection() as conn:
+        conn.executemany("INSERT INTO Employees (EmployeeID, EmployeeName, Department, Role) VALUES (?, ?, ?, 'employee')",
+                         EMPLOYEES)
+        conn.executemany("INSERT INTO Payslips (EmployeeID, EmployeeName, NetSalary, PayYear, PayMonth) "
+                         "VALUES (?, ?, 100, 2025, '1')", [(emp, name) for emp, name, _ in EMPLOYEES])
+        conn.commit()
+        return schema.column_set(conn, 'Employees')
+
+
+def all_pages(fetch, page_size):
+    pages, token = [], None
+    while True:
+        page = fetch(token, page_size)
+        pages.append([item['EmployeeID'] for item in page['items']])
+        token = page['next_cursor']
+        if token is None:
+            return pages
+
+
+# الترتيب بالاسم (الفارغ أولاً) ثم رقم الموظف كنص
+ORDER = ['10', '2', '3', '1', '4']
+
+
+@pytest.mark.parametrize('page_size', [1, 2, 3, 5, 50])
+def test_payslip_pages_cover_month_once_in_order(pool, month, page_size):
+    with pool.connection() as conn:
+        pages = all_pages(lambda token, size: payslip_page(conn, 2025, '1', month, {}, token, size), page_size)
+    assert [emp for page in pages for emp in page] == ORDER
+    assert all(len(page) == page_size for page in pages[:-1])
+
+
+def test_employee_pages_with_filters(pool, month):
+    with pool.connection() as conn:
+        fetch = lambda token, size: employee_page(conn, month, {'department': 'الإنتاج'}, token, size)  # noqa: E731
+        assert all_pages(fetch, 2) == [['10', '2'], ['3']]
+        page = employee_page(conn, month, {'q': 'أحم'})
+        assert [item['EmployeeID'] for item in page['items']] == ['2', '3']
+        assert page['items'][0]['Department'] == 'الإنتاج'
+        # البحث برقم الموظف يطابق بداية الرقم
+        assert [item['EmployeeID'] for item in employee_page(conn, month, {'q': '1'})['items']] == ['10', '1']
+
+
+def test_payslip_page_filters_by_employee_department(pool, month):
+    with pool.connection() as conn:
+        page = payslip_page(conn, 2025, '1', month, {'department': 'المالية'})
+        assert [item['EmployeeID'] for item in page['items']] == ['1', '4']
+        assert set(page['items'][0]) == {'EmployeeName', 'EmployeeID', 'BasicSalary', 'TotalEntitlements',
+                                         'TotalDeductions', 'NetSalary'}
+        # فلتر على عمود غير موجود في جدول الموظفين يُتجاهل
+        assert len(payslip_page(conn, 2025, '1', {'EmployeeID'}, {'department': 'المالية'})['items']) == 5
+
+
+def test_cursor_round_trip_and_invalid_tokens():
+    assert decode_cursor(encode_cursor('أحمد', '3')) == ('أحمد', '3')
+    assert decode_cursor(None) is None
+    assert decode_cursor('not-a-cursor') is None
+
+
+def test_page_size_and_filters_from_args():
+    assert page_size_from('20') == 20
+    assert page_size_from('0') == 1
+    assert page_size_from('100000') == MAX_PAGE_SIZE
+    assert page_size_from('abc') == page_size_from(None) == 50
+    assert filters_from({'department': ' المالية ', 'q': '', 'other': 'x'}) == {'department': 'المالية'}
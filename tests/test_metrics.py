@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+from metrics import ROLLUP_WORKER, Metrics, PhaseTimer
+
+
+def sample(text, line):
+    return float(next(row.split()[-1] for row in text.splitlines() if row.startswith(line + ' ')))
+
+
+def test_render_sums_all_workers(tmp_path):
+    path = str(tmp_path / 'metrics.db')
+    first, second = Metrics(path), Metrics(path)
+    first.observe('http_request_duration_seconds', 0.02, endpoint='login', method='GET', status=200)
+    second.observe('http_request_duration_seconds', 0.2, endpoint='login', method='GET', status=200)
+    second.observe('db_queries_per_request', 3, endpoint='login')
+    first.flush(force=True)
+    text = second.render()
+    labels = '{endpoint="login",method="GET",status="200"'
+    assert sample(text, f'http_request_duration_seconds_count{labels}}}') == 2
+    assert sample(text, f'http_request_duration_seconds_bucket{labels},le="0.025"}}') == 1
+    assert sample(text, f'http_request_duration_seconds_bucket{labels},le="+Inf"}}') == 2
+    assert sample(text, f'http_request_duration_seconds_sum{labels}}}') == pytest.approx(0.22)
+    assert sample(text, 'db_queries_per_request_bucket{endpoint="login",le="3"}') == 1
+    assert '# TYPE db_connect_seconds' not in text
+
+
+def test_stale_workers_rolled_up_without_double_counting(tmp_path):
+    path = str(tmp_path / 'metrics.db')
+    stale, live = Metrics(path, retention=60), Metrics(path, retention=60)
+    for _ in range(3):
+        stale.observe('db_checkout_seconds', 0.001)
+    stale.flush(force=True)
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE Metrics SET UpdatedAt = 0")
+    live.observe('db_checkout_seconds', 0.001)
+    assert sample(live.render(), 'db_checkout_seconds_count') == 4
+    with sqlite3.connect(path) as db:
+        workers = {row[0] for row in db.execute("SELECT Worker FROM Metrics")}
+    assert workers == {ROLLUP_WORKER, live._worker}
+
+    # العامل المدموج يعود للكتابة: يُكتب الجديد فقط ولا يُحسب المدموج مرتين
+    stale._written_at = 0
+    stale.observe('db_checkout_seconds', 0.001)
+    stale.flush(force=True)
+    assert sample(live.render(), 'db_checkout_seconds_count') == 5
+
+
+def test_instrumented_connection_counts_queries(tmp_path, backend):
+    metrics = Metrics(str(tmp_path / 'metrics.db'))
+    conn = metrics.instrument(backend.connect(), 'payslip_details')
+    metrics.start_request()
+    cursor = conn.cursor()
+    assert cursor.execute("SELECT 1") is cursor
+    cursor.executemany("INSERT INTO Employees (EmployeeID) VALUES (?)", [("1",), ("2",)])
+    assert metrics.request_queries() == 2
+    assert sample(metrics.render(), 'db_query_duration_seconds_count{endpoint="payslip_details"}') == 2
+
+
+def test_phase_timer_records_each_phase(tmp_path):
+    metrics = Metrics(str(tmp_path / 'metrics.db'))
+    calls = []
+    timer = PhaseTimer(metrics, 'upload_phase_seconds', lambda **kwargs: calls.append(kwargs), mode='full')
+    timer(phase='read')
+    timer(rows_processed=10)
+    timer(phase='insert')
+    timer.finish()
+    text = metrics.render()
+    assert sample(text, 'upload_phase_seconds_count{mode="full",phase="read"}') == 1
+    assert sample(text, 'upload_phase_seconds_count{mode="full",phase="insert"}') == 1
+    assert calls[1] == {'phase': None, 'rows_processed': 10}
+
+
+@pytest.mark.parametrize('header', ['Bearer wrong', 'Bearer تجربة', 'Bearer é', ''])
+def test_metrics_endpoint_rejects_bad_tokens(app_module, monkeypatch, header):
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', 'secret')
+    client = app_module.app.test_client()
+    assert client.get('/metrics', headers={'Authorization': header}).status_code == 403
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200 and '# TYPE http_request_duration_seconds histogram' in response.text
@@ -0,0 +1,125 @@
+import pytest
+
+from migrations import MIGRATIONS, apply_migrations, convert_money_columns, pending_migrations
+
+
+class FakeSQLServer:
+    # اتصال SQL Server وهمي: يسجل الجمل المنفذة ويرد على استعلامات الترحيلات فقط
+    def __init__(self, applied=(), fail_on=None, results=()):
+        self.applied = list(applied)
+        # results: [(جزء من الجملة، الصفوف)] لردود استعلامات الترحيلات نفسها
+        self.results = list(results)
+        self.uncommitted = []
+        self.statements = []
+        self.fail_on = fail_on
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.applied += self.uncommitted
+        self.uncommitted = []
+
+    def rollback(self):
+        self.uncommitted = []
+
+    def respond(self, statement, params):
+        if self.fail_on and self.fail_on in statement:
+            raise RuntimeError(f"failed: {self.fail_on}")
+        for fragment, rows in self.results:
+            if fragment in statement:
+                return rows
+        if statement.startswith("SELECT MigrationID"):
+            return [(m,) for m in self.applied]
+        if statement.startswith("INSERT INTO SchemaMigrations"):
+            self.uncommitted.append(params[0])
+        return []
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    def execute(self, statement, params=()):
+        statement = " ".join(statement.split())
+        self.conn.statements.append(statement)
+        self._rows = self.conn.respond(statement, params)
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+MIGRATION_IDS = [migration_id for migration_id, _ in MIGRATIONS]
+
+
+def test_migrations_applied_in_order_once():
+    conn = FakeSQLServer()
+    assert apply_migrations(conn) == MIGRATION_IDS
+    assert conn.applied == MIGRATION_IDS
+    assert apply_migrations(conn) == []
+    assert pending_migrations(conn) == []
+
+
+def test_only_pending_migrations_run():
+    conn = FakeSQLServer(applied=MIGRATION_IDS[:2])
+    assert apply_migrations(conn) == MIGRATION_IDS[2:]
+    assert not any('IX_Payslips_Employee_Period' in s for s in conn.statements)
+
+
+def test_failed_migration_is_not_recorded():
+    conn = FakeSQLServer(fail_on='CREATE TABLE PayrollMonthSummary')
+    with pytest.raises(RuntimeError):
+        apply_migrations(conn)
+    # الترحيلات السابقة تبقى مسجلة، والفاشل يُعاد في التشغيل التالي
+    assert conn.applied == MIGRATION_IDS[:2]
+    conn.fail_on = None
+    assert apply_migrations(conn) == MIGRATION_IDS[2:]
+
+
+def test_index_migrations_are_idempotent_sql():
+    conn = FakeSQLServer()
+    apply_migrations(conn, MIGRATIONS[:2])
+    creates = [s for s in conn.statements if 'CREATE INDEX' in s]
+    assert len(creates) == 2 and all(s.startswith("IF NOT EXISTS (SELECT 1 FROM sys.indexes") for s in creates)
+    assert "ON Payslips (EmployeeID, PayYear, PayMonth)" in creates[0]
+    assert "ON Payslips (PayYear, PayMonth) INCLUDE (EmployeeID, EmployeeName, BasicSalary" in creates[1]
+
+
+def test_summary_migration_creates_tables_and_backfills():
+    conn = FakeSQLServer(applied=MIGRATION_IDS[:2])
+    apply_migrations(conn, MIGRATIONS[:3])
+    assert any(s.startswith("CREATE TABLE PayrollMonthSummary") for s in conn.statements)
+    assert any(s.startswith("CREATE TABLE PayrollMonthBreakdown") for s in conn.statements)
+    assert any(s.startswith("SELECT DISTINCT PayYear, PayMonth FROM Payslips") for s in conn.statements)
+
+
+def test_money_migration_converts_only_clean_text_columns():
+    conn = FakeSQLServer(results=[
+        ("INFORMATION_SCHEMA.COLUMNS", [('BasicSalary', 'nvarchar'), ('Bonus', 'nvarchar'),
+                                        ('كود_الفرع', 'nvarchar'), ('NetSalary', 'decimal')]),
+        ("RTRIM([BasicSalary])", [(0,)]),
+        ("RTRIM([Bonus])", [(3,)]),
+    ])
+    convert_money_columns(conn.cursor())
+    alters = [s for s in conn.statements if s.startswith("ALTER TABLE")]
+    # Bonus فيه قيم غير رقمية فيبقى نصًا، والعمود غير المالي والعمود DECIMAL لا يُلمسان
+    assert alters == ["ALTER TABLE Payslips ALTER COLUMN [BasicSalary] DECIMAL(18, 2) NULL"]
+    assert conn.statements[1].startswith("IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Payslips_Period'")
+    assert "CREATE INDEX IX_Payslips_Period" in conn.statements[-1]
+
+
+def test_money_migration_without_text_money_columns_does_nothing():
+    conn = FakeSQLServer(results=[("INFORMATION_SCHEMA.COLUMNS", [('NetSalary', 'decimal')])])
+    convert_money_columns(conn.cursor())
+    assert len(conn.statements) == 1
+
+
+def test_row_hash_migration_creates_table():
+    conn = FakeSQLServer(applied=MIGRATION_IDS[:4])
+    assert apply_migrations(conn) == ['0005_payslip_row_hashes']
+    created = [s for s in conn.statements if s.startswith("CREATE TABLE PayslipRowHashes")]
+    assert len(created) == 1 and "PRIMARY KEY (PayYear, PayMonth, EmployeeID)" in created[0]
@@ -0,0 +1,87 @@
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from normalize import invalid_money_mask, normalize_money_columns, sheet_money_columns
+from payroll_columns import MONEY_TYPE
+from schema_sync import plan_schema_changes
+from storage import SQLITE
+from upload_pipeline import run_upload
+
+
+def month_rows(pool, year, month):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT EmployeeID, NetSalary FROM Payslips WHERE PayYear = ? AND PayMonth = ? "
+                       "ORDER BY EmployeeID", (year, month))
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def column_types(pool, table):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table})")
+        return {row[1]: row[2] for row in cursor.fetchall()}
+
+
+def test_invalid_money_mask_accepts_only_plain_decimals():
+    values = pd.Series(['1250.50', '-50', '0', '', '1e3', 'inf', 'nan', '-inf', '12.', '.5', '١٠٠', 'abc'])
+    assert invalid_money_mask(values).tolist() == [False] * 4 + [True] * 8
+
+
+def test_scientific_and_special_values_rejected_with_samples():
+    df = pd.DataFrame({'BasicSalary': ['1,000', '1e3', 'NaN'], 'NetSalary': ['900', '900', '900']})
+    with pytest.raises(ValueError) as error:
+        normalize_money_columns(df, ['BasicSalary', 'NetSalary'])
+    assert '1e3' in str(error.value) and 'NaN' in str(error.value)
+    cleaned = normalize_money_columns(df.iloc[:1], ['BasicSalary', 'NetSalary'])
+    assert cleaned['BasicSalary'].tolist() == ['1000']
+
+
+def test_sheet_money_columns_only_known_money_columns():
+    columns = ['EmployeeID', 'EmployeeName', 'MobileNumber', 'BasicSalary', 'NetSalary',
+               'PreviousInsurancePeriod', 'كود_الفرع']
+    assert sheet_money_columns(columns) == ['BasicSalary', 'NetSalary']
+
+
+def test_schema_plan_types_only_known_money_columns_as_decimal():
+    plan = plan_schema_changes(['EmployeeID', 'Department', 'Bonus', 'PreviousInsurancePeriod', 'كود_الفرع'],
+                               {'EmployeeID'}, {'EmployeeID', 'NetSalary'}, SQLITE)
+    assert plan.employee_additions == ['Department']
+    assert plan.payslip_additions == ['Bonus', 'PreviousInsurancePeriod', 'كود_الفرع']
+    assert plan.money_additions == ['Bonus']
+    assert plan.statements == [
+        'ALTER TABLE Employees ADD COLUMN [Department] NVARCHAR(255) NULL',
+        f'ALTER TABLE Payslips ADD COLUMN [Bonus] {MONEY_TYPE} NULL',
+        'ALTER TABLE Payslips ADD COLUMN [PreviousInsurancePeriod] TEXT NULL',
+        'ALTER TABLE Payslips ADD COLUMN [كود_الفرع] TEXT NULL',
+    ]
+
+
+def test_new_numeric_looking_column_stays_text(pool, schema, write_sheet, employee_row):
+    run_upload(pool, schema, write_sheet([employee_row(1, 1000, {'كود الفرع': '17', 'مكافئة': '250'})]), 2025, '1')
+    types = column_types(pool, 'Payslips')
+    assert (types['كود_الفرع'], types['Bonus']) == ('TEXT', MONEY_TYPE)
+    # الشهر التالي بقيمة غير رقمية في نفس العمود يُقبل
+    report = run_upload(pool, schema, write_sheet([employee_row(1, 1000, {'كود الفرع': 'B17'})]), 2025, '2')
+    assert report['payslips_inserted'] == 1
+    with pool.connection() as conn:
+        assert schema.typed_columns(conn, 'Payslips', 'decimal') >= {'Bonus', 'BasicSalary', 'NetSalary'}
+
+
+@pytest.mark.parametrize('stream_mode', [False, True])
+def test_invalid_money_rejected_before_schema_change(pool, schema, write_sheet, employee_row, stream_mode):
+    path = write_sheet([employee_row(1, 1000, {'مرتب أساسي': 'abc', 'بدل آخر': '1'})])
+    with pytest.raises(ValueError):
+        run_upload(pool, schema, path, 2025, '1', stream_mode=stream_mode)
+    assert 'بدل_آخر' not in column_types(pool, 'Payslips')
+    assert month_rows(pool, 2025, '1') == []
+
+
+def test_money_values_cleaned_before_insert(pool, schema, write_sheet, employee_row):
+    run_upload(pool, schema, write_sheet([employee_row(1, '1,250.50')]), 2025, '1')
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT BasicSalary, NetSalary FROM Payslips")
+        assert [Decimal(str(v)) for v in cursor.fetchone()] == [Decimal('1000'), Decimal('1250.5')]
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from normalize import normalize_phone, normalize_phone_column, prepare_upload_frame
+
+PHONES = ['01012345678', '1012345678', '+201012345678', '  01012345678 ', '', None]
+
+
+@pytest.mark.parametrize('phone, expected', [
+    ('01012345678', '+201012345678'),
+    ('1012345678', '+201012345678'),
+    ('+201012345678', '+201012345678'),
+    ('  01012345678 ', '+201012345678'),
+    ('', ''),
+    (None, ''),
+])
+def test_normalize_phone(phone, expected):
+    assert normalize_phone(phone) == expected
+
+
+def test_phone_column_matches_single_value_rules():
+    # الرقم المخزن عند الرفع يجب أن يطابق الرقم الذي يُبحث به عند تسجيل الدخول
+    assert list(normalize_phone_column(pd.Series(PHONES))) == [normalize_phone(p) for p in PHONES]
+
+
+def test_prepare_upload_frame_translates_and_drops_rows_without_id():
+    df = pd.DataFrame({'رقم الموظف': ['1', '', '3'], 'رقم الموبايل': ['0100', '0101', ''],
+                       'الصافي': ['10', '20', '30'], 'كود الفرع': ['a', 'b', 'c']})
+    prepared = prepare_upload_frame(df)
+    assert list(prepared.columns) == ['EmployeeID', 'MobileNumber', 'NetSalary', 'كود_الفرع']
+    assert prepared.to_dict('records') == [
+        {'EmployeeID': '1', 'MobileNumber': '+20100', 'NetSalary': '10', 'كود_الفرع': 'a'},
+        {'EmployeeID': '3', 'MobileNumber': '', 'NetSalary': '30', 'كود_الفرع': 'c'},
+    ]
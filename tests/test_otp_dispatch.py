@@ -0,0 +1,86 @@
+import json
+import threading
+
+import pytest
+
+from otp_dispatch import ConsoleSender, FileSender, OTPDispatcher, RateLimiter, parse_rate_limit, sender_from_spec
+from session_store import store_from_spec
+
+
+class FlakySender:
+    # يفشل أول failures مرة ثم ينجح
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, phone, message, employee_id=None):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("provider down")
+        self.sent.append((employee_id, phone, message))
+
+
+def test_file_sender_receives_message_in_background(tmp_path):
+    path = tmp_path / 'otp.log'
+    dispatcher = OTPDispatcher(sender_from_spec(f"file:{path}"), workers=1)
+    assert dispatcher.submit('7', '01000000007', 123456)
+    dispatcher._queue.join()
+    message = json.loads(path.read_text(encoding='utf-8'))
+    assert (message['employee_id'], message['phone']) == ('7', '01000000007')
+    assert message['message'].endswith('123456')
+    stats = dispatcher.stats()
+    assert (stats['enqueued'], stats['sent'], stats['queue_depth']) == (1, 1, 0)
+    assert 'latency_p95' in stats
+
+
+def test_failed_sends_are_retried_then_counted():
+    sender = FlakySender(failures=1)
+    dispatcher = OTPDispatcher(sender, workers=1, retries=1, retry_delay=0)
+    dispatcher.submit('7', '010', 1)
+    dispatcher._queue.join()
+    assert len(sender.sent) == 1
+
+    sender.failures = 5
+    dispatcher.submit('8', '010', 2)
+    dispatcher._queue.join()
+    stats = dispatcher.stats()
+    assert (stats['sent'], stats['failed'], stats['retries']) == (1, 1, 2)
+
+
+def test_full_queue_drops_instead_of_blocking():
+    release = threading.Event()
+
+    class BlockingSender:
+        def send(self, phone, message, employee_id=None):
+            release.wait(5)
+
+    dispatcher = OTPDispatcher(BlockingSender(), workers=1, max_queue=1)
+    results = [dispatcher.submit(str(i), '010', i) for i in range(4)]
+    release.set()
+    dispatcher._queue.join()
+    assert results[-1] is False and dispatcher.stats()['dropped'] >= 1
+
+
+@pytest.mark.parametrize('store', [None, store_from_spec('memory', None)])
+def test_rate_limiter_counts_every_key(store):
+    limiter = RateLimiter(limit=2, window=300, store=store)
+    assert limiter.hit('emp:1', 'phone:010')
+    assert limiter.hit('emp:1', 'phone:011')
+    # رقم الموظف تجاوز الحد حتى مع رقم هاتف جديد
+    assert not limiter.hit('emp:1', 'phone:012')
+    assert limiter.hit('emp:2', 'phone:012')
+    assert limiter.rejected == 1
+
+
+def test_rate_limiter_window_slides():
+    limiter = RateLimiter(limit=1, window=0)
+    assert limiter.hit('emp:1')
+    assert limiter.hit('emp:1')
+
+
+def test_parse_rate_limit_and_sender_spec(tmp_path):
+    assert parse_rate_limit('10/60') == (10, 60)
+    assert parse_rate_limit('bad') == parse_rate_limit(None) == (5, 300)
+    assert isinstance(sender_from_spec(None), ConsoleSender)
+    assert isinstance(sender_from_spec('otp_dispatch:ConsoleSender'), ConsoleSender)
+    assert isinstance(sender_from_spec(f"file:{tmp_path / 'otp.log'}"), FileSender)
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from normalize import normalize_otp
+
+EASTERN = str.maketrans('0123456789', '٠١٢٣٤٥٦٧٨٩')
+
+
+def test_normalize_otp():
+    assert normalize_otp(' ١٢٣٤٥٦ ') == '123456'
+    assert normalize_otp('۱۲۳۴۵۶') == '123456'
+    assert normalize_otp('12٣4') == '1234'
+    assert normalize_otp('١٢٣abc') == '123abc'
+    assert normalize_otp('رمز') == normalize_otp(None) == ''
+
+
+@pytest.fixture
+def otp_client(app_module, tmp_path):
+    with app_module.db_pool.connection() as conn:
+        conn.execute("INSERT INTO Employees (EmployeeID, EmployeeName, MobileNumber, Role) "
+                     "VALUES ('7', 'سارة', '+201000000007', 'employee')")
+        conn.commit()
+    client = app_module.app.test_client()
+    response = client.post('/request_otp', data={'emp_id': '7', 'phone_number': '01000000007'})
+    assert response.headers['Location'].endswith('/verify_otp')
+    app_module.otp_dispatcher._queue.join()
+    message = json.loads((tmp_path / 'otp.log').read_text(encoding='utf-8'))['message']
+    return client, message.split()[-1]
+
+
+def test_code_typed_in_arabic_digits_logs_in(otp_client):
+    client, code = otp_client
+    response = client.post('/verify_otp', data={'otp': code.translate(EASTERN)})
+    assert response.status_code == 302 and response.headers['Location'] == '/'
+    with client.session_transaction() as session:
+        assert (session['employee_id'], session['role']) == ('7', 'employee')
+
+
+@pytest.mark.parametrize('otp', ['٠٠٠٠٠٠', 'رمز خطأ', '١٢٣abc', ''])
+def test_wrong_non_ascii_code_is_rejected_not_an_error(otp_client, otp):
+    client, code = otp_client
+    if otp == '٠٠٠٠٠٠' and code == '000000':
+        otp = '١١١١١١'
+    response = client.post('/verify_otp', data={'otp': otp})
+    assert response.status_code == 200
+    with client.session_transaction() as session:
+        assert 'employee_id' not in session
+        assert session['_flashes'][-1] == ('error', 'رمز التحقق غير صحيح.')
@@ -0,0 +1,71 @@
+import io
+
+from openpyxl import load_workbook
+
+from payroll_export import csv_chunks, export_filename, export_header, month_rows, xlsx_chunks
+
+COLUMNS = ['EmployeeID', 'EmployeeName', 'NetSalary', 'كود_الفرع']
+ROWS = [('1', 'سارة', 1500.5, 'A'), ('2', None, 900, None)]
+
+
+def test_headers_and_filename():
+    assert export_header('EmployeeName') == 'الاسم'
+    assert export_header('NetSalary') == 'الصافي'
+    # عمود أضيف من الشيت: يعود العنوان بالمسافات
+    assert export_header('كود_الفرع') == 'كود الفرع'
+    assert export_filename(2025, '3', 'xlsx') == 'payslips_2025_3.xlsx'
+
+
+def test_csv_has_bom_arabic_headers_and_batches():
+    chunks = list(csv_chunks(COLUMNS, iter(ROWS), batch_size=1))
+    assert len(chunks) == 3
+    text = b''.join(chunks).decode('utf-8')
+    assert text.startswith('﻿')
+    lines = text[1:].splitlines()
+    assert lines == ['رقم الموظف,الاسم,الصافي,كود الفرع', '1,سارة,1500.5,A', '2,,900,']
+
+
+def test_xlsx_reads_back_right_to_left():
+    data = b''.join(xlsx_chunks(COLUMNS, iter(ROWS), chunk_size=1024))
+    sheet = load_workbook(io.BytesIO(data)).active
+    assert sheet.sheet_view.rightToLeft
+    assert [list(row) for row in sheet.iter_rows(values_only=True)] == [
+        ['رقم الموظف', 'الاسم', 'الصافي', 'كود الفرع'], ['1', 'سارة', 1500.5, 'A'], ['2', None, 900, None]]
+
+
+def test_month_rows_streams_one_month_in_employee_order(pool):
+    with pool.connection() as conn:
+        conn.executemany("INSERT INTO Payslips (EmployeeID, NetSalary, PayYear, PayMonth) VALUES (?, ?, ?, ?)",
+                         [('2', 200, 2025, '1'), ('1', 100, 2025, '1'), ('3', 300, 2025, '2')])
+        conn.commit()
+        rows = month_rows(conn, 2025, '1', ['EmployeeID', 'NetSalary'], batch_size=1)
+        assert [tuple(row) for row in rows] == [('1', 100), ('2', 200)]
+
+
+def insert_month(app_module, month):
+    with app_module.db_pool.connection() as conn:
+        conn.executemany("INSERT INTO Payslips (EmployeeID, EmployeeName, NetSalary, PayYear, PayMonth) "
+                         "VALUES (?, ?, ?, 2025, ?)", [('1', 'سارة', 100, month), ('2', 'أحمد', 200, month)])
+        conn.commit()
+
+
+def test_live_month_export_holds_connection_until_streamed(app_module, admin_client):
+    insert_month(app_module, '2')
+    response = admin_client.get('/payslips/2025/2/export', buffered=False)
+    assert app_module.db_pool.stats()['in_use'] == 1
+    body = b''.join(response.response).decode('utf-8')
+    response.close()
+    assert len(body.splitlines()) == 3 and 'سارة' in body
+    assert app_module.db_pool.stats()['in_use'] == 0
+
+
+def test_archived_month_export_releases_connection_before_streaming(app_module, admin_client):
+    insert_month(app_module, '1')
+    with app_module.db_pool.connection() as conn:
+        app_module.payroll_archive.archive_month(conn, 2025, '1', ['Department'])
+    response = admin_client.get('/payslips/2025/1/export', buffered=False)
+    # الصفوف تُقرأ من ملف Parquet: لا اتصال محجوز أثناء التنزيل
+    assert app_module.db_pool.stats()['in_use'] == 0
+    body = b''.join(response.response).decode('utf-8')
+    response.close()
+    assert len(body.splitlines()) == 3 and 'سارة' in body and 'أحمد' in body
@@ -0,0 +1,85 @@
+from archive import PayrollArchive
+from payroll_summary import (backfill_summaries, empty_summary, month_summary, refresh_month_summary,
+                             summary_dimensions, summary_months)
+from upload_pipeline import run_upload
+
+
+def upload(pool, schema, write_sheet, employee_row, month, nets, departments=None):
+    departments = departments or {}
+    rows = [employee_row(emp, net, {'الإدارة': departments.get(emp, 'الإنتاج')}) for emp, net in nets.items()]
+    return run_upload(pool, schema, write_sheet(rows), 2025, month)
+
+
+def test_upload_refreshes_month_summary(pool, schema, write_sheet, employee_row):
+    upload(pool, schema, write_sheet, employee_row, '1', {1: 1000, 2: 500, 3: 250}, {3: 'المالية'})
+    with pool.connection() as conn:
+        summary = month_summary(conn, 2025, '1')
+    assert (summary['total_employees'], summary['total_net_salary']) == (3, 1750)
+    assert summary['by_department'] == [
+        {'name': 'الإنتاج', 'total_employees': 2, 'total_net_salary': 1500},
+        {'name': 'المالية', 'total_employees': 1, 'total_net_salary': 250},
+    ]
+    # مركز التكلفة غير موجود في الشيت: كل الموظفين تحت قيمة فارغة
+    assert summary['by_cost_center'] == [{'name': '', 'total_employees': 3, 'total_net_salary': 1750}]
+
+    # إعادة رفع الشهر تستبدل الملخص
+    upload(pool, schema, write_sheet, employee_row, '1', {1: 1000})
+    with pool.connection() as conn:
+        summary = month_summary(conn, 2025, '1')
+    assert (summary['total_employees'], summary['total_net_salary']) == (1, 1000)
+    assert len(summary['by_department']) == 1
+
+
+def test_summary_months_and_empty_month(pool, schema, write_sheet, employee_row):
+    upload(pool, schema, write_sheet, employee_row, '1', {1: 1000})
+    upload(pool, schema, write_sheet, employee_row, '2', {1: 1000})
+    with pool.connection() as conn:
+        assert summary_months(conn) == {2025: ['2', '1']}
+        assert month_summary(conn, 2025, '3') is None
+        # شهر بلا رواتب لا يُكتب له ملخص
+        refresh_month_summary(conn.cursor(), 2025, '3', ['Department'])
+        assert month_summary(conn, 2025, '3') is None
+    assert empty_summary(2025, '3') == {'year': 2025, 'month': '3', 'total_employees': 0,
+                                        'total_net_salary': None, 'by_department': [], 'by_cost_center': []}
+
+
+def test_summary_dimensions_present_in_employees():
+    assert summary_dimensions({'EmployeeID', 'Department'}) == ['Department']
+    assert summary_dimensions({'EmployeeID', 'Department', 'CostCenterName'}) == ['Department', 'CostCenterName']
+
+
+def test_archive_computes_missing_summary_before_delete(tmp_path, pool, schema, write_sheet, employee_row):
+    upload(pool, schema, write_sheet, employee_row, '1', {1: 1000, 2: 500})
+    with pool.connection() as conn:
+        conn.execute("DELETE FROM PayrollMonthSummary")
+        conn.execute("DELETE FROM PayrollMonthBreakdown")
+        conn.commit()
+        PayrollArchive(str(tmp_path / "archive")).archive_month(conn, 2025, '1', ['Department'])
+        # الرواتب حُذفت من الجدول والملخص بقي لصفحات المدير
+        summary = month_summary(conn, 2025, '1')
+    assert (summary['total_employees'], summary['total_net_salary']) == (2, 1500)
+    assert summary['by_department'][0]['total_employees'] == 2
+
+
+class InformationSchemaCursor:
+    # backfill_summaries يقرأ أعمدة Employees من INFORMATION_SCHEMA (يعمل من ترحيل SQL Server)
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.connection = cursor.connection
+
+    def execute(self, statement, params=()):
+        if 'INFORMATION_SCHEMA' in statement:
+            statement = "SELECT name FROM pragma_table_info('Employees')"
+        return self.cursor.execute(statement, params)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+def test_backfill_summarizes_existing_months(pool):
+    with pool.connection() as conn:
+        conn.executemany("INSERT INTO Payslips (EmployeeID, NetSalary, PayYear, PayMonth) VALUES (?, ?, ?, ?)",
+                         [('1', 100, 2024, '11'), ('2', 200, 2024, '11'), ('1', 300, 2024, '12')])
+        backfill_summaries(InformationSchemaCursor(conn.cursor()))
+        assert summary_months(conn) == {2024: ['12', '11']}
+        assert month_summary(conn, 2024, '11')['total_net_salary'] == 300
@@ -0,0 +1,59 @@
+import os
+
+from payslip_cache import LRUCache, PayslipCache, VersionFile
+
+
+def test_upload_in_one_worker_invalidates_the_others(tmp_path):
+    # عاملان بذاكرة محلية منفصلة ومجلد إصدارات مشترك
+    first, second = (PayslipCache(version_dir=str(tmp_path / 'versions')) for _ in range(2))
+    for cache in (first, second):
+        cache.set_payslip('7', 2025, '1', {'NetSalary': 100})
+        cache.set_payslip('7', 2025, '2', {'NetSalary': 200})
+        cache.set_months('7', {2025: ['2', '1']})
+
+    first.invalidate_month(2025, '1')
+    assert second.get_payslip('7', 2025, '1') is None
+    assert second.get_months('7') is None
+    # الأشهر الأخرى لا تتأثر
+    assert second.get_payslip('7', 2025, '2') == {'NetSalary': 200}
+
+
+def test_shared_tier_fills_local_cache(tmp_path):
+    shared = str(tmp_path / 'cache.db')
+    first = PayslipCache(version_dir=str(tmp_path / 'versions'), shared_path=shared)
+    second = PayslipCache(version_dir=str(tmp_path / 'versions'), shared_path=shared)
+    first.set_payslip('7', 2025, '1', {'NetSalary': 100})
+    assert second.get_payslip('7', 2025, '1') == {'NetSalary': 100}
+    assert len(second.local) == 1
+
+    second.invalidate_month(2025, '1')
+    assert first.get_payslip('7', 2025, '1') is None
+
+
+def test_without_version_dir_invalidation_is_local():
+    cache = PayslipCache()
+    cache.set_payslip('7', 2025, '1', {'NetSalary': 100})
+    cache.invalidate_month(2025, '1')
+    assert cache.get_payslip('7', 2025, '1') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_lru_evicts_oldest_and_expires():
+    cache = LRUCache(max_entries=2, ttl=3600)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    expired = LRUCache(ttl=-1)
+    expired.set('a', 1)
+    assert expired.get('a') is None and len(expired) == 0
+
+
+def test_version_file_named_and_touch(tmp_path):
+    version = VersionFile.named(str(tmp_path), '2025/1')
+    assert os.path.basename(version.path) == '2025_1.version'
+    assert version.version() == 0
+    version.touch()
+    assert version.version() > 0
+    assert VersionFile.named(None, '2025_1').version() == 0
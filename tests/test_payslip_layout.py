@@ -0,0 +1,41 @@
+from payslip_layout import PayslipLayout, compiled_layout, process_payslip_data
+
+COLUMNS = ('PayslipID', 'EmployeeID', 'EmployeeName', 'BasicSalary', 'Bonus', 'Penalty', 'كود_الفرع',
+           'TotalEntitlements', 'TotalDeductions', 'NetSalary', 'PayYear', 'PayMonth')
+RAW = {'EmployeeID': '7', 'EmployeeName': 'سارة', 'BasicSalary': 1000, 'Bonus': '250.5', 'Penalty': '-50',
+       'كود_الفرع': 'A1', 'TotalEntitlements': 1250.5, 'TotalDeductions': -50, 'NetSalary': 1, 'PayYear': 2025,
+       'PayMonth': '1'}
+
+
+def test_detail_columns_skip_id_and_net():
+    layout = PayslipLayout(COLUMNS)
+    assert 'PayslipID' not in layout.detail_columns and 'NetSalary' not in layout.detail_columns
+    assert layout.detail_columns[:3] == ('EmployeeID', 'EmployeeName', 'BasicSalary')
+
+
+def test_process_splits_items_and_recomputes_net():
+    payslip = PayslipLayout(COLUMNS).process(dict(RAW))
+    assert payslip['entitlements'] == {'مرتب أساسي': 1000.0, 'مكافئة': 250.5}
+    assert payslip['deductions'] == {'Penalty': 50.0}
+    assert payslip['raw_data']['NetSalary'] == 1200.5
+    assert payslip['totals'] == {'إجمالي الاستحقاقات': 1250.5, 'إجمالي الاستقطاعات': -50}
+
+
+def test_money_columns_and_default_layout_agree():
+    # أعمدة DECIMAL تُحول مباشرة، والنصية غير الرقمية (كود_الفرع) ليست بنداً في الحالتين
+    typed = PayslipLayout(COLUMNS, frozenset({'BasicSalary', 'Bonus'})).process(dict(RAW))
+    untyped = process_payslip_data(dict(RAW))
+    assert typed['entitlements'] == untyped['entitlements']
+    assert typed['deductions'] == untyped['deductions']
+
+
+def test_process_many_matches_process():
+    layout = compiled_layout(COLUMNS, frozenset({'BasicSalary'}))
+    records = [dict(RAW), dict(RAW, Bonus=None, Penalty='')]
+    assert layout.process_many([dict(r) for r in records]) == [layout.process(dict(r)) for r in records]
+    assert layout.process_many([]) == []
+
+
+def test_compiled_layout_is_reused_per_column_list():
+    assert compiled_layout(COLUMNS) is compiled_layout(COLUMNS)
+    assert compiled_layout(COLUMNS + ('Grade',)) is not compiled_layout(COLUMNS)
@@ -0,0 +1,68 @@
+import os
+import time
+import zipfile
+
+import pytest
+
+from payslip_pdf import _safe_name, generate_month_pdfs, month_payslip_batches
+
+PAYSLIP_COLUMNS = ['EmployeeID', 'EmployeeName', 'BasicSalary', 'TotalEntitlements', 'TotalDeductions', 'NetSalary']
+
+
+@pytest.fixture
+def month(pool):
+    with pool.connection() as conn:
+        conn.executemany("INSERT INTO Employees (EmployeeID, EmployeeName, Department, Role) VALUES (?, ?, ?, 'employee')",
+                         [('1', 'سارة', 'المالية'), ('2', 'أحمد', 'الإنتاج'), ('3', 'منى', None)])
+        conn.executemany("INSERT INTO Payslips (EmployeeID, EmployeeName, BasicSalary, TotalEntitlements, "
+                         "TotalDeductions, NetSalary, PayYear, PayMonth) VALUES (?, ?, 1000, 1000, 100, 900, 2025, '1')",
+                         [('1', 'سارة'), ('2', 'أحمد'), ('3', 'منى')])
+        conn.commit()
+
+
+def test_batches_join_department(pool, month):
+    with pool.connection() as conn:
+        batches = list(month_payslip_batches(conn, 2025, '1', PAYSLIP_COLUMNS, {'EmployeeID', 'Department'},
+                                             batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert [(emp, dept) for batch in batches for emp, dept, _ in batch] == [
+        ('1', 'المالية'), ('2', 'الإنتاج'), ('3', '')]
+    assert batches[0][0][2]['Department'] == 'المالية'
+
+
+def test_safe_name():
+    assert _safe_name('الموارد / البشرية') == 'الموارد_البشرية'
+    assert _safe_name('') == 'بدون_إدارة'
+
+
+def test_generate_zip_per_department(tmp_path, pool, month):
+    pytest.importorskip('reportlab')
+    pytest.importorskip('arabic_reshaper')
+    output = tmp_path / 'pdfs'
+    with pool.connection() as conn:
+        report = generate_month_pdfs(conn, 2025, '1', PAYSLIP_COLUMNS, {'EmployeeID', 'Department'}, str(output),
+                                     by_department=True, workers=1)
+    assert report['payslips'] == 3
+    assert report['files'] == ['payslips_2025_1_الإنتاج.zip', 'payslips_2025_1_المالية.zip',
+                               'payslips_2025_1_بدون_إدارة.zip']
+    with zipfile.ZipFile(output / 'payslips_2025_1_المالية.zip') as archive:
+        assert archive.namelist() == ['1.pdf']
+        assert archive.read('1.pdf').startswith(b'%PDF')
+
+
+def test_prune_removes_only_old_finished_job_outputs(app_module):
+    finished = app_module.job_store.create('pdf')
+    app_module.job_store.update(finished, status='done')
+    recent = app_module.job_store.create('pdf')
+    app_module.job_store.update(recent, status='done')
+    running = app_module.job_store.create('pdf')
+    app_module.job_store.update(running, status='running')
+    old = time.time() - app_module.PDF_OUTPUT_TTL - 60
+    for name in (finished, recent, running, '2025_1'):
+        os.makedirs(os.path.join(app_module.PDF_OUTPUT_DIR, name))
+        if name != recent:
+            os.utime(os.path.join(app_module.PDF_OUTPUT_DIR, name), (old, old))
+
+    app_module.prune_pdf_outputs()
+    # مجلد أمر payslip-pdfs ومهمة لم تنته بعد يبقيان
+    assert sorted(os.listdir(app_module.PDF_OUTPUT_DIR)) == sorted([recent, running, '2025_1'])
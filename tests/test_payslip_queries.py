@@ -0,0 +1,29 @@
+from payslip_queries import employee_months, employee_payslip, group_months
+
+
+def insert_payslips(pool, rows):
+    with pool.connection() as conn:
+        conn.executemany("INSERT INTO Payslips (EmployeeID, EmployeeName, NetSalary, PayYear, PayMonth) "
+                         "VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+
+
+def test_group_months_skips_empty_periods():
+    assert group_months([(2025, '2'), (2025, '1'), (None, '3'), (2024, ''), (2024, '12')]) == {
+        2025: ['2', '1'], 2024: ['12']}
+
+
+def test_employee_months_newest_first_with_archived_after(pool):
+    insert_payslips(pool, [('7', 'أ', 100, 2025, '1'), ('7', 'أ', 100, 2025, '2'), ('8', 'ب', 100, 2025, '3')])
+    with pool.connection() as conn:
+        assert employee_months(conn, '7') == {2025: ['2', '1']}
+        assert employee_months(conn, '7', [(2024, '12')]) == {2025: ['2', '1'], 2024: ['12']}
+        assert employee_months(conn, '9') == {}
+
+
+def test_employee_payslip_selects_only_requested_columns(pool):
+    insert_payslips(pool, [('7', 'أحمد', 1250.5, 2025, '1')])
+    with pool.connection() as conn:
+        assert employee_payslip(conn, '7', 2025, '1', ['EmployeeName', 'NetSalary']) == {
+            'EmployeeName': 'أحمد', 'NetSalary': 1250.5}
+        assert employee_payslip(conn, '7', 2025, '2', ['NetSalary']) is None
@@ -0,0 +1,44 @@
+from schema_cache import SchemaCache
+
+
+def add_column(pool, table, column, col_type="TEXT"):
+    with pool.connection() as conn:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN [{column}] {col_type} NULL")
+        conn.commit()
+
+
+def test_columns_cached_until_invalidated(pool, tmp_path):
+    version_path = str(tmp_path / "schema.version")
+    # عاملان (workers) يشتركان في ملف الإصدار فقط
+    worker_a = SchemaCache(version_path=version_path)
+    worker_b = SchemaCache(version_path=version_path)
+    with pool.connection() as conn:
+        assert 'Bonus' not in worker_a.column_set(conn, 'Payslips')
+        assert 'Bonus' not in worker_b.column_set(conn, 'Payslips')
+
+    add_column(pool, 'Payslips', 'Bonus', 'DECIMAL(18, 2)')
+    with pool.connection() as conn:
+        # بدون إبطال: الأعمدة من الذاكرة ولا يُقرأ هيكل الجدول
+        assert 'Bonus' not in worker_b.column_set(conn, 'Payslips')
+        worker_a.invalidate()
+        assert 'Bonus' in worker_a.column_set(conn, 'Payslips')
+        assert 'Bonus' in worker_b.column_set(conn, 'Payslips')
+        assert worker_b.columns(conn, 'Payslips')[-1] == 'Bonus'
+        assert 'Bonus' in worker_b.typed_columns(conn, 'Payslips', 'decimal')
+
+
+def test_max_age_reloads_changes_made_outside_the_app(pool, tmp_path):
+    cache = SchemaCache(version_path=str(tmp_path / "schema.version"), max_age=0)
+    with pool.connection() as conn:
+        cache.column_set(conn, 'Employees')
+    add_column(pool, 'Employees', 'Grade')
+    with pool.connection() as conn:
+        assert 'Grade' in cache.column_set(conn, 'Employees')
+
+
+def test_column_types_use_sql_server_names(pool, schema):
+    with pool.connection() as conn:
+        types = schema.column_types(conn, 'Payslips')
+        assert (types['NetSalary'], types['EmployeeID'], types['PayYear']) == ('decimal', 'nvarchar', 'int')
+        assert schema.typed_columns(conn, 'Payslips', 'decimal') == {
+            'BasicSalary', 'TotalEntitlements', 'TotalDeductions', 'NetSalary'}
@@ -0,0 +1,51 @@
+from schema_sync import SchemaPlan, plan_schema_changes, sync_schema
+from storage import SQLITE, SQLSERVER
+
+
+def test_plan_only_missing_columns():
+    plan = plan_schema_changes(['EmployeeID', 'EmployeeName', 'Department', 'NetSalary', 'Note', 'Note'],
+                               {'EmployeeID', 'EmployeeName'}, {'EmployeeID', 'EmployeeName', 'NetSalary'})
+    assert (plan.employee_additions, plan.payslip_additions) == (['Department'], ['Note'])
+    assert plan
+    assert not plan_schema_changes(['EmployeeID', 'NetSalary'], {'EmployeeID'}, {'NetSalary'})
+
+
+def test_sql_server_adds_all_columns_in_one_alter_per_table():
+    plan = SchemaPlan(['Department', 'JobTitle'], ['Note', 'Grade'], dialect=SQLSERVER)
+    assert plan.statements == [
+        'ALTER TABLE Employees ADD [Department] NVARCHAR(255) NULL, [JobTitle] NVARCHAR(255) NULL',
+        'ALTER TABLE Payslips ADD [Note] NVARCHAR(MAX) NULL, [Grade] NVARCHAR(MAX) NULL',
+    ]
+
+
+def test_sqlite_adds_one_column_per_statement():
+    plan = SchemaPlan([], ['Note', 'Grade'], dialect=SQLITE)
+    assert plan.statements == ['ALTER TABLE Payslips ADD COLUMN [Note] TEXT NULL',
+                               'ALTER TABLE Payslips ADD COLUMN [Grade] TEXT NULL']
+
+
+def test_sync_schema_applies_plan_and_refreshes_cache(pool, schema):
+    with pool.connection() as conn:
+        employee_columns, payslip_columns, plan = sync_schema(conn, schema, ['EmployeeID', 'Department', 'Note'])
+        assert plan.statements and {'Department'} <= employee_columns and 'Note' in payslip_columns
+        # المزامنة التالية بنفس الأعمدة لا تحتاج أي تعديل
+        assert not sync_schema(conn, schema, ['EmployeeID', 'Department', 'Note'])[2]
+
+
+def test_dry_run_does_not_alter(pool, schema):
+    with pool.connection() as conn:
+        _, payslip_columns, plan = sync_schema(conn, schema, ['EmployeeID', 'Note'], dry_run=True)
+        assert plan.payslip_additions == ['Note'] and 'Note' not in payslip_columns
+        schema.invalidate()
+        assert 'Note' not in schema.column_set(conn, 'Payslips')
+
+
+def test_columns_added_by_another_worker_are_replanned(pool, schema):
+    with pool.connection() as conn:
+        schema.column_set(conn, 'Payslips')
+        # عامل آخر أضاف العمود بعد أن قرأنا الهيكل: الـ ALTER يفشل ثم يُعاد التخطيط
+        conn.execute("ALTER TABLE Payslips ADD COLUMN [Note] TEXT NULL")
+        conn.commit()
+        _, payslip_columns, plan = sync_schema(conn, schema, ['EmployeeID', 'Note', 'Grade'])
+        assert plan.payslip_additions == ['Grade']
+        assert {'Note', 'Grade'} <= payslip_columns
@@ -0,0 +1,135 @@
+import time
+
+import pytest
+from flask import Flask, session
+
+from session_store import MemoryStore, SQLiteStore, StoreSessionInterface, store_from_spec
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # ساعة يدوية بدلاً من الانتظار الفعلي لانتهاء الصلاحية
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStore()
+    return SQLiteStore(str(tmp_path / "sessions.db"))
+
+
+def test_get_set_delete(store):
+    assert store.get("missing") is None
+    store.set("session:a", {'emp_id': '7', 'flashes': [['info', 'مرحبًا']]})
+    assert store.get("session:a") == {'emp_id': '7', 'flashes': [['info', 'مرحبًا']]}
+    store.delete("session:a")
+    assert store.get("session:a") is None
+
+
+def test_keys_expire_after_ttl(store, clock):
+    store.set("session:a", {'emp_id': '7'}, ttl=60)
+    store.set("session:b", {'emp_id': '8'})
+    clock[0] += 59
+    assert store.get("session:a") == {'emp_id': '7'}
+    clock[0] += 1
+    assert store.get("session:a") is None
+    assert store.get("session:b") == {'emp_id': '8'}
+    store.prune()
+    assert store.get("session:b") == {'emp_id': '8'}
+
+
+def test_incr_window_starts_at_first_increment(store, clock):
+    assert [store.incr("otp:7", ttl=60) for _ in range(3)] == [1, 2, 3]
+    clock[0] += 30
+    # الزيادة لا تمد النافذة
+    assert store.incr("otp:7", ttl=60) == 4
+    clock[0] += 30
+    assert store.incr("otp:7", ttl=60) == 1
+
+
+def test_store_from_spec(tmp_path):
+    assert isinstance(store_from_spec('memory', None), MemoryStore)
+    custom = store_from_spec(f"sqlite:{tmp_path / 'custom.db'}", None)
+    assert custom.path == str(tmp_path / "custom.db")
+    assert store_from_spec(None, str(tmp_path / "default.db")).path == str(tmp_path / "default.db")
+
+
+# --- جلسات Flask على الخادم ---
+
+@pytest.fixture
+def app(store):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.session_interface = StoreSessionInterface(store, ttl=3600)
+
+    @app.route('/visit')
+    def visit():
+        session['visits'] = session.get('visits', 0) + 1
+        return str(session['visits'])
+
+    @app.route('/login')
+    def login():
+        session.regenerate()
+        session['emp_id'] = '7'
+        return 'ok'
+
+    @app.route('/whoami')
+    def whoami():
+        return session.get('emp_id', '-')
+
+    @app.route('/logout')
+    def logout():
+        session.clear()
+        return 'bye'
+
+    return app
+
+
+def session_cookie(client):
+    cookie = client.get_cookie('session')
+    return cookie.value if cookie else None
+
+
+def test_session_data_kept_on_server(app, store):
+    client = app.test_client()
+    assert [client.get('/visit').text for _ in range(2)] == ['1', '2']
+    sid = session_cookie(client)
+    # الكوكي يحمل رقم الجلسة فقط
+    assert store.get("session:" + sid) == {'visits': 2}
+
+
+def test_login_regenerates_session_id(app, store):
+    client = app.test_client()
+    client.get('/visit')
+    before = session_cookie(client)
+    client.get('/login')
+    after = session_cookie(client)
+    assert after != before
+    assert store.get("session:" + before) is None
+    assert store.get("session:" + after) == {'visits': 1, 'emp_id': '7'}
+    assert client.get('/whoami').text == '7'
+
+    # الكوكي القديم (جلسة مثبتة قبل الدخول) لا يفتح الجلسة الجديدة
+    attacker = app.test_client()
+    attacker.set_cookie('session', before)
+    assert attacker.get('/whoami').text == '-'
+
+
+def test_logout_deletes_session(app, store):
+    client = app.test_client()
+    client.get('/login')
+    sid = session_cookie(client)
+    client.get('/logout')
+    assert store.get("session:" + sid) is None
+    assert session_cookie(client) is None
+    assert client.get('/whoami').text == '-'
+
+
+def test_expired_session_starts_fresh(app, store, clock):
+    client = app.test_client()
+    client.get('/login')
+    clock[0] += 3601
+    assert client.get('/whoami').text == '-'
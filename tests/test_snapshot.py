@@ -0,0 +1,128 @@
+import os
+from decimal import Decimal
+
+import pytest
+
+from payroll_summary import month_stamp, refresh_month_summary
+from snapshot import PayslipSnapshots, Snapshot, write_snapshot
+
+COLUMNS = ['EmployeeID', 'EmployeeName', 'BasicSalary', 'NetSalary', 'Grade', 'Notes']
+ROWS = [
+    ('10', 'موظف 10', Decimal('1000.00'), Decimal('1250.50'), 3, None),
+    ('2', 'موظف 2', Decimal('900.00'), Decimal('-15.25'), 1, 'ملاحظة'),
+    ('2', 'مكرر', Decimal('1.00'), Decimal('1.00'), 1, None),
+    ('1', 'موظف 1', None, Decimal('0'), 0, ''),
+]
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "month.snap")
+    assert write_snapshot(path, COLUMNS, ROWS, money_columns={'BasicSalary', 'NetSalary', 'Missing'}) == 3
+    snapshot = Snapshot(path)
+    try:
+        assert snapshot.columns == tuple(COLUMNS)
+        assert snapshot.money_columns == {'BasicSalary', 'NetSalary'}
+        # أول صف لكل رقم موظف هو المعتمد، والأنواع تعود كما كُتبت
+        for row in (ROWS[0], ROWS[1], ROWS[3]):
+            assert snapshot.get(row[0]) == dict(zip(COLUMNS, row))
+        assert snapshot.get('3') is None
+        assert snapshot.get('1000000') is None
+    finally:
+        snapshot.close()
+
+
+def test_replaced_snapshot_closed_after_last_reader(tmp_path):
+    snapshots = PayslipSnapshots(str(tmp_path / "snapshots"))
+    with snapshots.reading(2025, '1') as snapshot:
+        assert snapshot is None
+    snapshots.publish(2025, '1', COLUMNS, ROWS[:1])
+
+    with snapshots.reading(2025, '1') as old:
+        old_mm = old._mm
+        os.utime(snapshots.path(2025, '1'), ns=(1, 1))
+        snapshots.publish(2025, '1', COLUMNS, ROWS[1:2])
+        with snapshots.reading(2025, '1') as new:
+            assert new is not old
+            assert new.get('2')['EmployeeName'] == 'موظف 2'
+        # القراءة الجارية تكمل على اللقطة القديمة حتى نهايتها
+        assert old.retired and not old_mm.closed
+        assert old.get('10')['NetSalary'] == Decimal('1250.50')
+    assert old_mm.closed
+
+    assert snapshots.unpublish(2025, '1')
+    with snapshots.reading(2025, '1') as snapshot:
+        assert snapshot is None
+    assert new._mm.closed
+
+
+def test_stamp_kept_in_header(tmp_path):
+    snapshots = PayslipSnapshots(str(tmp_path / "snapshots"))
+    snapshots.publish(2025, '1', COLUMNS, ROWS[:1], stamp='3|1250.50|2025-02-01 10:00:00')
+    with snapshots.reading(2025, '1') as snapshot:
+        assert snapshot.stamp == '3|1250.50|2025-02-01 10:00:00'
+    write_snapshot(snapshots.path(2025, '2'), COLUMNS, ROWS[:1])
+    with snapshots.reading(2025, '2') as snapshot:
+        assert snapshot.stamp is None
+
+
+# --- قراءة القسيمة من اللقطة في صفحة الموظف ---
+
+@pytest.fixture
+def employee_client(app_module):
+    with app_module.db_pool.connection() as conn:
+        conn.execute("INSERT INTO Payslips (EmployeeID, EmployeeName, NetSalary, PayYear, PayMonth) "
+                     "VALUES ('7', 'من قاعدة البيانات', 100, 2025, '1')")
+        conn.commit()
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['employee_id'] = '7'
+        session['role'] = 'employee'
+    return client
+
+
+def served_name(app_module, client):
+    assert client.get('/my_payslips/2025/1').status_code == 200
+    return app_module.payslip_cache.get_payslip('7', 2025, '1')['raw_data']['EmployeeName']
+
+
+def publish(app_module, stamp):
+    app_module.payslip_snapshots.publish(2025, '1', ['EmployeeID', 'EmployeeName', 'NetSalary'],
+                                         [('7', 'من اللقطة', 100)], stamp=stamp)
+
+
+def refresh_summary(app_module):
+    with app_module.db_pool.connection() as conn:
+        refresh_month_summary(conn.cursor(), 2025, '1', [])
+        conn.commit()
+        return month_stamp(conn, 2025, '1')
+
+
+def test_snapshot_served_when_stamp_matches(app_module, employee_client):
+    publish(app_module, refresh_summary(app_module))
+    assert served_name(app_module, employee_client) == 'من اللقطة'
+
+
+@pytest.mark.parametrize('stamp', ['1|100|2000-01-01 00:00:00', None])
+def test_stale_or_unstamped_snapshot_falls_back_to_database(app_module, employee_client, stamp):
+    # لقطة من قاعدة أخرى أو من قبل تغيير الشهر (أو لقطة قديمة بلا بصمة) لا تُقرأ
+    refresh_summary(app_module)
+    publish(app_module, stamp)
+    assert served_name(app_module, employee_client) == 'من قاعدة البيانات'
+
+
+def test_month_without_summary_falls_back_to_database(app_module, employee_client):
+    publish(app_module, None)
+    assert served_name(app_module, employee_client) == 'من قاعدة البيانات'
+
+
+def test_publish_after_change_records_new_stamp(app_module, employee_client):
+    first = refresh_summary(app_module)
+    with app_module.db_pool.connection() as conn:
+        conn.execute("UPDATE Payslips SET NetSalary = 200")
+        conn.commit()
+    second = refresh_summary(app_module)
+    assert first != second
+    app_module.publish_month(2025, '1')
+    with app_module.payslip_snapshots.reading(2025, '1') as snapshot:
+        assert snapshot.stamp == second
+    assert served_name(app_module, employee_client) == 'من قاعدة البيانات'
@@ -0,0 +1,37 @@
+from upload_pipeline import run_upload, upload_message
+
+
+def month_rows(pool, year, month):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT EmployeeID, NetSalary FROM Payslips WHERE PayYear = ? AND PayMonth = ? "
+                       "ORDER BY EmployeeID", (year, month))
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def test_full_upload_inserts_employees_and_payslips(pool, schema, write_sheet, employee_row):
+    phases = []
+    path = write_sheet([employee_row(emp, 1000 + emp) for emp in (1, 2, 3)])
+    report = run_upload(pool, schema, path, 2025, '1', progress=lambda phase=None, **kw: phases.append(phase))
+    assert (report['rows'], report['employees_inserted'], report['payslips_inserted']) == (3, 3, 3)
+    assert month_rows(pool, 2025, '1') == [('1', 1001), ('2', 1002), ('3', 1003)]
+    assert [p for p in phases if p] == ['parse', 'schema_sync', 'stage', 'employees_upsert', 'payslips_insert',
+                                        'summary']
+    assert upload_message(report).startswith("✅")
+
+
+def test_stream_mode_matches_full_mode(pool, schema, write_sheet, employee_row):
+    path = write_sheet([employee_row(emp, 1000 + emp) for emp in range(1, 8)])
+    run_upload(pool, schema, path, 2025, '1')
+    report = run_upload(pool, schema, path, 2025, '2', stream_mode=True, batch_size=3)
+    assert report['rows'] == 7
+    assert month_rows(pool, 2025, '2') == month_rows(pool, 2025, '1')
+
+
+def test_dry_run_plans_schema_changes_only(pool, schema, write_sheet, employee_row):
+    path = write_sheet([employee_row(1, 1000, {'مكافئة': '50'})])
+    report = run_upload(pool, schema, path, 2025, '1', dry_run=True)
+    assert report['dry_run'] and report['schema_plan']['payslip_additions'] == ['Bonus']
+    with pool.connection() as conn:
+        assert 'Bonus' not in schema.column_set(conn, 'Payslips')
+    assert month_rows(pool, 2025, '1') == []
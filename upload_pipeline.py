@@ -0,0 +1,118 @@
+# --- خط معالجة رفع شيت الرواتب ---
+# قراءة الملف ثم مزامنة هيكل الجداول ثم الإدخال المجمّع، ويُستدعى من مهمة خلفية
+# حتى لا ينتظر طلب HTTP انتهاء المعالجة.
+import pandas as pd
+
+from bulk_ingest import ingest_batches, ingest_month, new_report, phase
+from excel_stream import ExcelBatchReader
+from normalize import normalize_money_columns, prepare_upload_frame, sheet_money_columns
+from payroll_summary import refresh_month_summary, summary_dimensions
+from schema_sync import sync_schema
+
+
+def _no_progress(phase=None, rows_processed=None, rows_total=None):
+    pass
+
+
+def run_upload(pool, schema, path, pay_year, pay_month, stream_mode=False, batch_size=5000,
+               dry_run=False, progress=None, incremental=False, preview=False):
+    # dry_run: قراءة الشيت وحساب تعديلات الهيكل المطلوبة فقط، بدون تنفيذ أي تعديل أو إدخال
+    # incremental: تطبيق الموظفين الجدد والمعدلين والمحذوفين فقط بدلاً من استبدال الشهر كاملاً
+    # preview: حساب ملخص الفروق مع الشهر المحفوظ بدون أي تعديل (يُعرض قبل التأكيد)
+    progress = progress or _no_progress
+    report = new_report()
+    reader = None
+    try:
+        progress(phase='parse')
+        with phase(report, 'parse'):
+            if stream_mode:
+                # قراءة رؤوس الأعمدة فقط الآن، والصفوف تُقرأ على دفعات أثناء الإدخال
+                reader = ExcelBatchReader(path, batch_size=batch_size)
+                sheet_columns = reader.columns
+                rows_total = reader.total_rows
+                money_columns = sheet_money_columns(sheet_columns)
+                # التحقق من مبالغ الدفعة الأولى قبل أي ALTER (باقي الدفعات تُتحقق أثناء الإدخال)
+                if reader.peek() is not None:
+                    normalize_money_columns(reader.peek(), money_columns)
+            else:
+                df = pd.read_excel(path, header=0, dtype=str).fillna('')
+                # ترجمة الأعمدة وتوحيد أرقام الهواتف على الأعمدة كاملة (بدون المرور صفًا صفًا)
+                df = prepare_upload_frame(df)
+                sheet_columns = list(df.columns)
+                rows_total = len(df)
+                money_columns = sheet_money_columns(sheet_columns)
+                # رفض الشيت الذي به مبالغ غير رقمية قبل أن يضيف تعديل الهيكل أي عمود
+                df = normalize_money_columns(df, money_columns)
+        progress(rows_total=rows_total)
+
+        def ingest(conn, employee_columns, payslip_columns, money, preview_only=False):
+            if stream_mode:
+                ingest_batches(conn, sheet_columns, reader, pay_year, pay_month, employee_columns,
+                               payslip_columns, report, progress, money, incremental, preview_only)
+            else:
+                ingest_month(conn, df, pay_year, pay_month, employee_columns, payslip_columns,
+                             report, progress, batch_size, money, incremental, preview_only)
+
+        with pool.connection() as conn:
+            progress(phase='schema_sync')
+            with phase(report, 'schema_sync'):
+                db_employee_columns, db_payslip_columns, plan = sync_schema(conn, schema, sheet_columns,
+                                                                            dry_run or preview)
+                # أعمدة المبالغ الفعلية في الجدول (الأعمدة القديمة تتحول عبر الترحيل 0004)
+                db_money_columns = schema.typed_columns(conn, 'Payslips', 'decimal')
+            report['schema_plan'] = plan.as_dict()
+            if dry_run:
+                report['dry_run'] = True
+                return report
+
+            if preview:
+                # المعاينة تقارن الشيت كما سيكون بعد إضافة الأعمدة الجديدة
+                report['preview'] = True
+                try:
+                    ingest(conn, db_employee_columns | set(plan.employee_additions),
+                           db_payslip_columns | set(plan.payslip_additions),
+                           db_money_columns | set(plan.money_additions), preview_only=True)
+                finally:
+                    conn.rollback()
+                return report
+
+            # رفع الشيت للجدول المؤقت ثم تحديث/إضافة الموظفين والرواتب كعمليات مجمّعة
+            ingest(conn, db_employee_columns, db_payslip_columns, db_money_columns)
+
+            # تحديث ملخص الشهر داخل نفس المعاملة حتى لا يختلف عن الرواتب المرفوعة
+            progress(phase='summary')
+            with phase(report, 'summary'):
+                refresh_month_summary(conn.cursor(), pay_year, pay_month, summary_dimensions(db_employee_columns))
+            conn.commit()
+    finally:
+        if reader:
+            reader.close()
+    return report
+
+
+def diff_message(diff):
+    message = (f"جديد: {diff['inserted']}، معدل: {diff['updated']}، "
+               f"محذوف: {diff['deleted']}، بدون تغيير: {diff['unchanged']}")
+    if diff.get('duplicates'):
+        message += f" (يوجد {diff['duplicates']} رقم موظف مكرر، سيتم استبدال الشهر كاملاً)"
+    return message
+
+
+def upload_message(report):
+    if report.get('preview'):
+        message = "🔎 معاينة التغييرات على الشهر: " + diff_message(report['diff'])
+        statements = report['schema_plan']['statements']
+        if statements:
+            message += "\nتعديلات الهيكل:\n" + "\n".join(statements)
+        return message
+    if report.get('dry_run'):
+        statements = report['schema_plan']['statements']
+        if not statements:
+            return "🔎 معاينة: لا توجد أعمدة جديدة، هيكل الجداول مطابق للشيت."
+        return "🔎 معاينة: سيتم تنفيذ التعديلات التالية على الهيكل:\n" + "\n".join(statements)
+    total_time = sum(report['timings'].values())
+    if report.get('incremental'):
+        return f"✅ تم تطبيق التغييرات فقط ({diff_message(report['diff'])}، الوقت: {total_time:.1f} ثانية)"
+    return (f"✅ تمت معالجة ورفع بيانات {report['payslips_inserted']} موظفًا بنجاح! "
+            f"(موظفين جدد: {report['employees_inserted']}، تم تحديث: {report['employees_updated']}، "
+            f"الوقت: {total_time:.1f} ثانية)")